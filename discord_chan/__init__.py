@@ -5,11 +5,13 @@ from .bot import DiscordChan
 from .context import SubContext
 from .converters import *
 from .database import Database
+from .memory_storage import MemoryStorage
 from .features import Feature, FeatureManager
 from .games import *
 from .help import *
 from .menus import *
 from .safebooru_api import *
 from .snipe import Snipe, SnipeMode
+from .storage import Storage, StorageBackend
 
 logger.disable("discord_chan")
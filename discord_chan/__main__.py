@@ -9,6 +9,15 @@ from loguru import logger
 from loguru_logging_intercept import setup_loguru_logging_intercept
 
 import discord_chan
+from discord_chan.database import (
+    DEFAULT_POOL_MAX_INACTIVE_LIFETIME,
+    DEFAULT_POOL_MAX_SIZE,
+    DEFAULT_POOL_MIN_SIZE,
+    DEFAULT_POOL_STATEMENT_CACHE_SIZE,
+    PoolConfig,
+)
+from discord_chan.storage import StorageBackend
+from discord_chan.word_track import DEFAULT_BACKFILL_CONCURRENCY
 
 # only works on linux
 try:
@@ -39,7 +48,89 @@ os.environ["JISHAKU_RETAIN"] = "true"
     type=click.Path(dir_okay=False, path_type=Path),
     default="exaroton.secret",
 )
-def main(debug: bool, secret: Path, exaroton: Path):
+@click.option(
+    "--pool-min-size",
+    help="Minimum number of database connections",
+    type=click.IntRange(min=0),
+    default=DEFAULT_POOL_MIN_SIZE,
+    envvar="DISCORD_CHAN_POOL_MIN_SIZE",
+    show_envvar=True,
+    show_default=True,
+)
+@click.option(
+    "--pool-max-size",
+    help="Maximum number of database connections",
+    type=click.IntRange(min=1),
+    default=DEFAULT_POOL_MAX_SIZE,
+    envvar="DISCORD_CHAN_POOL_MAX_SIZE",
+    show_envvar=True,
+    show_default=True,
+)
+@click.option(
+    "--pool-max-inactive-lifetime",
+    help="Seconds before an idle database connection is closed, 0 to never close them",
+    type=click.FloatRange(min=0),
+    default=DEFAULT_POOL_MAX_INACTIVE_LIFETIME,
+    envvar="DISCORD_CHAN_POOL_MAX_INACTIVE_LIFETIME",
+    show_envvar=True,
+    show_default=True,
+)
+@click.option(
+    "--pool-command-timeout",
+    help="Seconds before a database query times out",
+    type=click.FloatRange(min=0, min_open=True),
+    default=None,
+    envvar="DISCORD_CHAN_POOL_COMMAND_TIMEOUT",
+    show_envvar=True,
+)
+@click.option(
+    "--pool-acquire-timeout",
+    help="Seconds to wait for a free database connection",
+    type=click.FloatRange(min=0, min_open=True),
+    default=None,
+    envvar="DISCORD_CHAN_POOL_ACQUIRE_TIMEOUT",
+    show_envvar=True,
+)
+@click.option(
+    "--pool-statement-cache-size",
+    help="Number of statements kept prepared per database connection",
+    type=click.IntRange(min=0),
+    default=DEFAULT_POOL_STATEMENT_CACHE_SIZE,
+    envvar="DISCORD_CHAN_POOL_STATEMENT_CACHE_SIZE",
+    show_envvar=True,
+    show_default=True,
+)
+@click.option(
+    "--backfill-concurrency",
+    help="Number of channels word track backfills read at once",
+    type=click.IntRange(min=1),
+    default=DEFAULT_BACKFILL_CONCURRENCY,
+    envvar="DISCORD_CHAN_BACKFILL_CONCURRENCY",
+    show_envvar=True,
+    show_default=True,
+)
+@click.option(
+    "--storage",
+    help="Where to store data, memory doesn't persist anything and is for load testing",
+    type=click.Choice([backend.value for backend in StorageBackend]),
+    default=StorageBackend.postgres.value,
+    envvar="DISCORD_CHAN_STORAGE",
+    show_envvar=True,
+    show_default=True,
+)
+def main(
+    debug: bool,
+    secret: Path,
+    exaroton: Path,
+    pool_min_size: int,
+    pool_max_size: int,
+    pool_max_inactive_lifetime: float,
+    pool_command_timeout: float | None,
+    pool_acquire_timeout: float | None,
+    pool_statement_cache_size: int,
+    backfill_concurrency: int,
+    storage: str,
+):
     setup_loguru_logging_intercept(
         level=logging.DEBUG,
         modules=("discord"),
@@ -66,18 +157,47 @@ def main(debug: bool, secret: Path, exaroton: Path):
     with open(secret) as fp:
         discord_token = fp.read().strip("\n")
 
+    if pool_min_size > pool_max_size:
+        raise click.BadParameter(
+            "can't be more than --pool-max-size", param_hint="--pool-min-size"
+        )
+
+    pool_config = PoolConfig(
+        min_size=pool_min_size,
+        max_size=pool_max_size,
+        max_inactive_connection_lifetime=pool_max_inactive_lifetime,
+        command_timeout=pool_command_timeout,
+        acquire_timeout=pool_acquire_timeout,
+        statement_cache_size=pool_statement_cache_size,
+    )
+
     asyncio.run(
         run_bot(
-            discord_token=discord_token, debug_mode=debug, exaroton_token=exaroton_token
+            discord_token=discord_token,
+            debug_mode=debug,
+            exaroton_token=exaroton_token,
+            pool_config=pool_config,
+            backfill_concurrency=backfill_concurrency,
+            storage=StorageBackend(storage),
         )
     )
 
 
 async def run_bot(
-    *, discord_token: str, debug_mode: bool, exaroton_token: str | None
+    *,
+    discord_token: str,
+    debug_mode: bool,
+    exaroton_token: str | None,
+    pool_config: PoolConfig,
+    backfill_concurrency: int,
+    storage: StorageBackend,
 ) -> None:
     bot = await discord_chan.DiscordChan.create(
-        exaroton_token=exaroton_token, debug_mode=debug_mode
+        exaroton_token=exaroton_token,
+        debug_mode=debug_mode,
+        pool_config=pool_config,
+        backfill_concurrency=backfill_concurrency,
+        storage=storage,
     )
 
     async with bot:
@@ -1,19 +1,25 @@
 import pathlib
 import typing
 from datetime import datetime
-from collections.abc import Iterable
+from collections.abc import Callable, Coroutine, Hashable, Iterable
 
 import discord
-from discord.ext import commands
+from discord.ext import commands, menus
 from loguru import logger
 from aexaroton import Client as AexarotonClient
 
 from .context import SubContext
-from .database import Database
+from .database import Database, PoolConfig
 from .features import FeatureManager
 from .help import Minimal
+from .memory_storage import MemoryStorage
+from .storage import Storage, StorageBackend
+from .waiters import WaiterRegistry
+from .word_track import DEFAULT_BACKFILL_CONCURRENCY
 
 DEFAULT_PREFIXES = ["dc/", "DC/"]
+# events menus wait on, they only ever match reactions on the menu's message
+MENU_EVENTS = ("raw_reaction_add", "raw_reaction_remove")
 ROOT = pathlib.Path(__file__).parent
 
 
@@ -21,9 +27,10 @@ class DiscordChan(commands.AutoShardedBot):
     def __init__(
         self,
         *,
-        database: Database,
+        database: Storage,
         exaroton_client: AexarotonClient | None = None,
         debug_mode: bool = False,
+        backfill_concurrency: int = DEFAULT_BACKFILL_CONCURRENCY,
     ):
         super().__init__(
             command_prefix=self.get_command_prefix,
@@ -38,12 +45,15 @@ class DiscordChan(commands.AutoShardedBot):
             intents=discord.Intents.all(),
         )
         self.debug_mode: bool = debug_mode
+        # channels word track backfills read at once
+        self.backfill_concurrency = backfill_concurrency
         self.exaroton_client = exaroton_client
         self.database = database
         self.context = SubContext
         self.ready_once = False
         self.uptime = datetime.now()
         self.feature_manager = FeatureManager(self.database)
+        self.waiters = WaiterRegistry()
 
         self._owners_cache: int | list[int] | None = None
 
@@ -51,17 +61,83 @@ class DiscordChan(commands.AutoShardedBot):
 
     @classmethod
     async def create(
-        cls, *, exaroton_token: str | None = None, debug_mode: bool = False
+        cls,
+        *,
+        exaroton_token: str | None = None,
+        debug_mode: bool = False,
+        pool_config: PoolConfig | None = None,
+        backfill_concurrency: int = DEFAULT_BACKFILL_CONCURRENCY,
+        storage: StorageBackend = StorageBackend.postgres,
     ):
-        database: Database = await Database.create(debug_mode=debug_mode)
+        match storage:
+            case StorageBackend.postgres:
+                database: Storage = await Database.create(
+                    debug_mode=debug_mode, pool_config=pool_config
+                )
+            case StorageBackend.memory:
+                logger.warning("Using in-memory storage, nothing will be saved")
+                database = MemoryStorage()
+
         if exaroton_token is not None:
             exaroton_client = await AexarotonClient.from_token(exaroton_token)
         else:
             exaroton_client = None
         return cls(
-            database=database, exaroton_client=exaroton_client, debug_mode=debug_mode
+            database=database,
+            exaroton_client=exaroton_client,
+            debug_mode=debug_mode,
+            backfill_concurrency=backfill_concurrency,
         )
 
+    async def setup_hook(self):
+        # listeners check features synchronously so they have to be loaded before any events
+        await self.feature_manager.load()
+
+    async def close(self):
+        # cogs flush their buffers on unload so the pool has to outlive them
+        await super().close()
+        await self.database.close()
+
+    def dispatch(self, event_name: str, /, *args, **kwargs):
+        super().dispatch(event_name, *args, **kwargs)
+        self.waiters.dispatch(event_name, *args)
+
+    def wait_for(
+        self,
+        event: str,
+        /,
+        *,
+        check: Callable[..., bool] | None = None,
+        timeout: float | None = None,
+    ) -> Coroutine[typing.Any, typing.Any, typing.Any]:
+        # menus pass their bound reaction_check so they can be waited on by message id
+        menu = getattr(check, "__self__", None)
+        if (
+            isinstance(menu, menus.Menu)
+            and menu.message is not None
+            and event in MENU_EVENTS
+        ):
+            return self.wait_for_key(
+                event, menu.message.id, check=check, timeout=timeout
+            )
+
+        return super().wait_for(event, check=check, timeout=timeout)
+
+    def wait_for_key(
+        self,
+        event: str,
+        key: Hashable,
+        *,
+        check: Callable[..., bool] | None = None,
+        timeout: float | None = None,
+    ) -> Coroutine[typing.Any, typing.Any, typing.Any]:
+        """
+        Like wait_for but only checked against events with key, see waiters.EVENT_KEYS
+
+        prefer this to wait_for for events that happen a lot
+        """
+        return self.waiters.wait_for(event, key, check=check, timeout=timeout)
+
     async def _get_owners(self) -> int | list[int]:
         if self._owners_cache is not None:
             return self._owners_cache
@@ -49,7 +49,7 @@ def feature_enabled(feature: "Feature"):
         if ctx.guild is None:
             raise commands.NoPrivateMessage()
 
-        if not await ctx.bot.feature_manager.is_enabled(feature, ctx.guild.id):
+        if not ctx.bot.feature_manager.is_enabled(feature, ctx.guild.id):
             raise commands.CheckFailure(
                 f'Feature "{feature.name}" must be enabled to use this command'
             )
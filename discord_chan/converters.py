@@ -1,4 +1,5 @@
 import re
+from datetime import timedelta
 from enum import Enum, StrEnum
 
 import discord
@@ -128,6 +129,43 @@ class MaxLengthConverter(commands.Converter):
         return f"<={self.max_size}"
 
 
+class DurationConverter(commands.Converter):
+    """
+    Converts durations like 30m, 12h or 1w2d into a timedelta
+    """
+
+    UNITS = {
+        "s": "seconds",
+        "m": "minutes",
+        "h": "hours",
+        "d": "days",
+        "w": "weeks",
+    }
+    PART_REGEX = re.compile(r"(\d+)([smhdw])")
+
+    async def convert(self, ctx: commands.Context, argument: str) -> timedelta:
+        argument = argument.lower()
+        parts = self.PART_REGEX.findall(argument)
+
+        # the parts have to make up the whole argument
+        if not parts or "".join(amount + unit for amount, unit in parts) != argument:
+            raise commands.BadArgument(
+                f"{argument} is not a valid duration (examples: 30m, 12h, 1w2d)"
+            )
+
+        kwargs: dict[str, int] = {}
+        for amount, unit in parts:
+            kwargs[self.UNITS[unit]] = kwargs.get(self.UNITS[unit], 0) + int(amount)
+
+        try:
+            return timedelta(**kwargs)
+        except OverflowError:
+            raise commands.BadArgument(f"{argument} is too long of a duration")
+
+    def display(self) -> str:
+        return "duration"
+
+
 class BotConverter(commands.Converter):
     async def convert(self, ctx: commands.Context, argument: str) -> discord.Member:
         member = await commands.MemberConverter().convert(ctx, argument)
@@ -1,14 +1,46 @@
+import asyncio
 import os
+import re
 import sys
+import time
+import zlib
+from collections.abc import AsyncIterator, Callable, Iterable, Sequence
+from contextlib import asynccontextmanager
+from datetime import datetime
 from itertools import count
 from typing import NamedTuple, Self
 
 import asyncpg
 import pendulum
-from discord.ext.commands import CommandError
+from discord.ext.commands import BadArgument, CommandError
 from loguru import logger
 
+from discord_chan import metrics, queries
+from discord_chan.export import ExportFormat, ExportOutput
+from discord_chan.heavy_hitters import HeavyHitterScope, HeavyHitterSnapshot
+from discord_chan.migrations import apply_migrations
+from discord_chan.queries import QueryConnection
 from discord_chan.snipe import Snipe, SnipeMode
+from discord_chan.utils import LRU
+from discord_chan.storage import (
+    COIN_OVERFLOW_MESSAGE,
+    BackfillCheckpoint,
+    CacheEvent,
+    CacheOperation,
+    CoinStake,
+    LeaderboardEntry,
+    SnipePartition,
+    StakeExit,
+    StakeUpdate,
+    Storage,
+    UsageResolution,
+    WordRank,
+    WordTrackStats,
+    WordTrackUpdate,
+    WordUsage,
+    word_usage_bucket,
+    word_usage_cutoffs,
+)
 
 try:
     import pwd
@@ -43,117 +75,338 @@ def get_current_username() -> str:
 DATABASE_user = get_current_username()
 DATABASE_name = "discord_chan"
 
-
-class CoinsEntry(NamedTuple):
-    user_id: int
-    coins: int
-
-
-class CoinStake(NamedTuple):
-    bitcoin_price: float
-    coins: float
-
-
-DBSCHEMA = """
-CREATE TABLE IF NOT EXISTS snipes (
-    id BIGINT,
-    mode INT,
-    server BIGINT,
-    author BIGINT,
-    channel BIGINT,
-    time FLOAT,
-    content TEXT
-);
-
-CREATE TABLE IF NOT EXISTS coins (
-    user_id BIGINT PRIMARY KEY,
-    amount BIGINT
-);
-
-CREATE TABLE IF NOT EXISTS enabled_features (
-    guild_id BIGINT,
-    feature_name TEXT,
-    PRIMARY KEY (guild_id, feature_name)
-);
-
-CREATE TABLE IF NOT EXISTS stakes (
-    user_id BIGINT PRIMARY KEY,
-    amount FLOAT,
-    bitcoin_price FLOAT
-);
-
-CREATE TABLE IF NOT EXISTS word_track (
-    server BIGINT,
-    author BIGINT,
-    word TEXT,
-    count INT,
-    PRIMARY KEY (server, author, word)
-);
-
-CREATE TABLE IF NOT EXISTS minecraft_usernames (
-    user_id BIGINT PRIMARY KEY,
-    username TEXT UNIQUE
-);
-
-CREATE TABLE IF NOT EXISTS minecraft_default_servers (
-    guild_id BIGINT PRIMARY KEY,
-    server_id TEXT
-);
-
-CREATE TABLE IF NOT EXISTS minecraft_guild_links (
-    first_guild_id BIGINT,
-    seconrd_guild_id BIGINT,
-    PRIMARY KEY (first_guild_id, seconrd_guild_id)
-);
-""".strip()
+# these match asyncpg's own defaults
+DEFAULT_POOL_MIN_SIZE = 10
+DEFAULT_POOL_MAX_SIZE = 10
+# seconds an idle connection is kept before being closed, 0 keeps them forever
+DEFAULT_POOL_MAX_INACTIVE_LIFETIME = 300.0
+# statements asyncpg keeps prepared per connection, should cover every registered query
+DEFAULT_POOL_STATEMENT_CACHE_SIZE = 256
+
+# number of word: id mappings kept in memory
+DEFAULT_WORD_ID_CACHE_SIZE = 100_000
+
+# the notify_cache_change trigger sends on this channel
+CACHE_NOTIFY_CHANNEL = "discord_chan_cache"
+# max seconds between attempts to reconnect the cache listener
+MAX_LISTEN_RECONNECT_DELAY = 60
+
+# snipe content at least this many bytes is stored compressed, compressed content
+# can't be searched so this is over the 16000 bytes a 4000 character message
+# can take, anything a member can send stays searchable
+SNIPE_COMPRESSION_THRESHOLD = 16_384
+SNIPE_COMPRESSION_LEVEL = 6
+# rows rewritten per statement when rewriting existing snipes
+SNIPE_COMPRESSION_BATCH_SIZE = 1000
+
+# partitions created by create_snipe_partition are named snipes_pYYYYMM
+SNIPE_PARTITION_REGEX = re.compile(r"^snipes_p(?P<year>\d{4})(?P<month>\d{2})$")
+
+
+def escape_like(text: str) -> str:
+    """
+    Escape the LIKE wildcards in text so it matches literally
+    """
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+@asynccontextmanager
+async def invalid_regex_errors():
+    """
+    Turn postgres rejecting a user supplied regex into a command error
+    """
+    try:
+        yield
+    except asyncpg.InvalidRegularExpressionError as exc:
+        raise BadArgument(f"Invalid regex: {exc}")
+
+
+@asynccontextmanager
+async def coin_overflow_errors():
+    """
+    Turn a coin balance leaving int64 into a command error
+    """
+    try:
+        yield
+    # also covers asyncpg refusing to encode an argument outside of int64
+    except asyncpg.DataError:
+        raise CommandError(COIN_OVERFLOW_MESSAGE)
+
+
+def compress_snipe_content(content: str) -> tuple[str | None, bytes | None]:
+    """
+    Split content into the (content, content_compressed) columns, one of them is None
+    """
+    encoded = content.encode()
+
+    if len(encoded) < SNIPE_COMPRESSION_THRESHOLD:
+        return content, None
+
+    compressed = zlib.compress(encoded, SNIPE_COMPRESSION_LEVEL)
+
+    if len(compressed) >= len(encoded):
+        return content, None
+
+    return None, compressed
+
+
+def parse_cache_event(payload: str) -> CacheEvent:
+    """
+    Parse a notify_cache_change payload, table:operation:key[:value]
+    """
+    table, operation, key, *value = payload.split(":", 3)
+    return CacheEvent(
+        table, CacheOperation(operation), int(key), value[0] if value else None
+    )
+
+
+class SnipeFilter(NamedTuple):
+    # names of the filters used, every combination maps to one registered query
+    shape: str
+    where: str
+    args: list[int | str | float | Sequence[int]]
+
+
+class PoolConfig(NamedTuple):
+    min_size: int = DEFAULT_POOL_MIN_SIZE
+    max_size: int = DEFAULT_POOL_MAX_SIZE
+    max_inactive_connection_lifetime: float = DEFAULT_POOL_MAX_INACTIVE_LIFETIME
+    # seconds, None waits forever
+    command_timeout: float | None = None
+    acquire_timeout: float | None = None
+    statement_cache_size: int = DEFAULT_POOL_STATEMENT_CACHE_SIZE
+
+
+class PoolStats(NamedTuple):
+    size: int
+    min_size: int
+    max_size: int
+    idle: int
+    in_use: int
+    waiting: int
 
 
 # TODO: this class is dog
-class Database:
-    def __init__(self, pool: asyncpg.Pool):
+class Database(Storage):
+    def __init__(
+        self,
+        pool: asyncpg.Pool,
+        pool_config: PoolConfig | None = None,
+        *,
+        connect_kwargs: dict | None = None,
+    ):
         self.pool = pool
+        self.pool_config = pool_config or PoolConfig()
+        # for connections outside of the pool
+        self.connect_kwargs = connect_kwargs or {}
+
+        # a dedicated connection since LISTEN only lasts as long as its session
+        self._listen_connection: asyncpg.Connection | None = None
+        self._listen_reconnect_task: asyncio.Task | None = None
+        self._cache_listeners: dict[str, list[Callable[[CacheEvent], None]]] = {}
+        self._closing = False
+        self.cache_notifications = metrics.counter("db.cache_notifications")
+
+        # ids never change once a word has one so this never needs invalidating
+        self._word_ids: LRU = LRU(maxsize=DEFAULT_WORD_ID_CACHE_SIZE)
+        self.word_id_hits = metrics.counter("db.word_ids.hits")
+        self.word_id_misses = metrics.counter("db.word_ids.misses")
+
+        self._waiting = 0
+        self.acquire_wait = metrics.histogram("db.pool.acquire_wait")
+        self.acquire_timeouts = metrics.counter("db.pool.acquire_timeouts")
+        metrics.gauge("db.pool.size", self.pool.get_size)
+        metrics.gauge("db.pool.idle", self.pool.get_idle_size)
+        metrics.gauge("db.pool.in_use", lambda: self.get_pool_stats().in_use)
+        metrics.gauge("db.pool.waiting", lambda: self._waiting)
 
     @classmethod
-    async def create(cls, debug_mode: bool = False) -> Self:
-        password = "a" if debug_mode else None
+    async def create(
+        cls, debug_mode: bool = False, pool_config: PoolConfig | None = None
+    ) -> Self:
+        connect_kwargs = {
+            "user": DATABASE_user,
+            "database": DATABASE_name,
+            "password": "a" if debug_mode else None,
+        }
+        pool_config = pool_config or PoolConfig()
+
+        # migrate before the pool exists so no connection caches statements against the old schema
+        connection = await asyncpg.connect(**connect_kwargs)
+        try:
+            await apply_migrations(connection)
+        finally:
+            await connection.close()
+
+        async def init_connection(connection: QueryConnection):
+            connection.set_statement_cache_size(pool_config.statement_cache_size)
 
         pool = await asyncpg.create_pool(
-            user=DATABASE_user, database=DATABASE_name, password=password
+            **connect_kwargs,
+            connection_class=QueryConnection,
+            init=init_connection,
+            min_size=pool_config.min_size,
+            max_size=pool_config.max_size,
+            max_inactive_connection_lifetime=pool_config.max_inactive_connection_lifetime,
+            command_timeout=pool_config.command_timeout,
+            statement_cache_size=pool_config.statement_cache_size,
+            # registered queries are a fixed set, so keep them prepared for the
+            # connection's lifetime instead of re-preparing every 5 minutes
+            max_cached_statement_lifetime=0,
+        )
+        logger.info(f"Created database pool with {pool_config}")
+
+        database = cls(pool, pool_config, connect_kwargs=connect_kwargs)
+        await database.start_listening()
+        return database
+
+    async def close(self):
+        self._closing = True
+
+        if self._listen_reconnect_task is not None:
+            self._listen_reconnect_task.cancel()
+
+        if self._listen_connection is not None:
+            await self._listen_connection.close()
+
+        await self.pool.close()
+
+    def add_cache_listener(self, table: str, callback: Callable[[CacheEvent], None]):
+        """
+        Call callback when a row of table is written by any process, including this one
+
+        only tables with a notify_cache_change trigger send events
+        """
+        self._cache_listeners.setdefault(table, []).append(callback)
+
+    async def start_listening(self):
+        """
+        Open the connection that receives cache notifications
+        """
+        connection = await asyncpg.connect(**self.connect_kwargs)
+        await connection.add_listener(CACHE_NOTIFY_CHANNEL, self._on_cache_notification)
+        connection.add_termination_listener(self._on_listen_connection_lost)
+        self._listen_connection = connection
+
+    def _on_cache_notification(
+        self, connection: asyncpg.Connection, pid: int, channel: str, payload: str
+    ):
+        self.cache_notifications.inc()
+
+        try:
+            event = parse_cache_event(payload)
+        except ValueError:
+            logger.warning(f"Invalid cache notification: {payload!r}")
+            return
+
+        self._dispatch_cache_event(event)
+
+    def _dispatch_cache_event(self, event: CacheEvent):
+        for callback in self._cache_listeners.get(event.table, []):
+            try:
+                callback(event)
+            except Exception:
+                logger.exception(f"Cache listener failed on {event}")
+
+    def _on_listen_connection_lost(self, connection: asyncpg.Connection):
+        if self._closing:
+            return
+
+        logger.warning("Lost the cache notification connection, reconnecting")
+        self._listen_connection = None
+        self._listen_reconnect_task = asyncio.create_task(self._reconnect_listener())
+
+    async def _reconnect_listener(self):
+        delay = 1
+
+        while True:
+            try:
+                await self.start_listening()
+            except (OSError, asyncpg.PostgresError) as exc:
+                logger.warning(
+                    f"Cache listener reconnect failed, retrying in {delay}s: {exc}"
+                )
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_LISTEN_RECONNECT_DELAY)
+            else:
+                break
+
+        logger.info("Reconnected the cache notification connection")
+
+        # anything written while disconnected was missed
+        for table in self._cache_listeners:
+            self._dispatch_cache_event(
+                CacheEvent(table, CacheOperation.reset, None, None)
+            )
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[QueryConnection]:
+        """
+        pool.acquire that records how long callers wait for a connection
+        """
+        self._waiting += 1
+        start = time.perf_counter()
+
+        try:
+            connection = await self.pool.acquire(
+                timeout=self.pool_config.acquire_timeout
+            )
+        except asyncio.TimeoutError:
+            self.acquire_timeouts.inc()
+            raise
+        finally:
+            self._waiting -= 1
+
+        self.acquire_wait.observe(time.perf_counter() - start)
+
+        try:
+            # the pool hands out proxies that forward to a QueryConnection
+            yield connection  # type: ignore
+        finally:
+            await self.pool.release(connection)
+
+    def get_pool_stats(self) -> PoolStats:
+        size = self.pool.get_size()
+        idle = self.pool.get_idle_size()
+
+        return PoolStats(
+            size=size,
+            min_size=self.pool.get_min_size(),
+            max_size=self.pool.get_max_size(),
+            idle=idle,
+            in_use=size - idle,
+            waiting=self._waiting,
         )
-        await pool.execute(DBSCHEMA)
-        return cls(pool)
 
     async def update_guild_default_minecraft_server(
         self, *, guild_id: int, server_id: str
     ):
-        async with self.pool.acquire() as connection:
-            await connection.execute(
-                "INSERT INTO minecraft_default_servers (guild_id, server_id) VALUES ($1, $2) ON CONFLICT (guild_id) DO UPDATE SET server_id = EXCLUDED.server_id;",
-                guild_id,
-                server_id,
+        async with self.acquire() as connection:
+            await connection.execute_query(
+                queries.UPDATE_DEFAULT_MINECRAFT_SERVER, guild_id, server_id
             )
 
     async def get_guild_default_minecraft_server(self, *, guild_id: int) -> str | None:
-        if record := await self.pool.fetchrow(
-            "SELECT guild_id, server_id FROM minecraft_default_servers where guild_id = $1;",
-            guild_id,
-        ):
+        async with self.acquire() as connection:
+            record = await connection.fetchrow_query(
+                queries.GET_DEFAULT_MINECRAFT_SERVER, guild_id
+            )
+
+        if record is not None:
             return record["server_id"]
 
         return None
 
     async def update_minecraft_username(self, *, user_id: int, username: str):
-        async with self.pool.acquire() as connection:
-            await connection.execute(
-                "INSERT INTO minecraft_usernames (user_id, username) VALUES ($1, $2) ON CONFLICT (user_id) DO UPDATE SET username = EXCLUDED.username;",
-                user_id,
-                username,
+        async with self.acquire() as connection:
+            await connection.execute_query(
+                queries.UPDATE_MINECRAFT_USERNAME, user_id, username
             )
 
     async def get_minecraft_usernames(self) -> dict[int, str]:
-        async with self.pool.acquire() as connection:
-            records: list[asyncpg.Record] = await connection.fetch(
-                "SELECT user_id, username FROM minecraft_usernames;"
+        async with self.acquire() as connection:
+            records: list[asyncpg.Record] = await connection.fetch_query(
+                queries.GET_MINECRAFT_USERNAMES
             )
 
         result: dict[int, str] = {}
@@ -164,10 +417,9 @@ class Database:
         return result
 
     async def get_minecraft_username(self, user_id: int) -> str | None:
-        async with self.pool.acquire() as connection:
-            record: asyncpg.Record | None = await connection.fetchrow(
-                "SELECT user_id, username FROM minecraft_usernames WHERE user_id = $1;",
-                user_id,
+        async with self.acquire() as connection:
+            record: asyncpg.Record | None = await connection.fetchrow_query(
+                queries.GET_MINECRAFT_USERNAME, user_id
             )
 
         if record is not None:
@@ -175,119 +427,373 @@ class Database:
 
         return None
 
-    async def update_word_track_word(
-        self, *, server_id: int, author_id: int, word: str, amount: int
+    async def update_word_track_words(self, updates: Sequence[WordTrackUpdate]):
+        """
+        Add to the counts of many (server, author, word) rows in one statement
+
+        updates should not contain the same (server, author, word) twice
+        """
+        if not updates:
+            return
+
+        server_ids, author_ids, words, amounts = zip(*updates)
+        word_ids = await self.get_word_ids(words)
+
+        async with self.acquire() as connection:
+            await connection.execute_query(
+                queries.UPDATE_WORD_TRACK_WORDS,
+                server_ids,
+                author_ids,
+                [word_ids[word] for word in words],
+                amounts,
+            )
+
+    async def create_word_track_backfill(
+        self, *, server_id: int, channel_ids: Sequence[int], before: int
     ):
-        async with self.pool.acquire() as connection:
-            await connection.execute(
-                "INSERT INTO word_track (server, author, word, count) VALUES ($1, $2, $3, $4) ON CONFLICT (server, author, word) DO UPDATE SET count = EXCLUDED.count + word_track.count;",
-                server_id,
-                author_id,
-                word,
-                amount,
+        async with self.acquire() as connection:
+            await connection.execute_query(
+                queries.CREATE_WORD_TRACK_BACKFILL, server_id, channel_ids, before
             )
 
+    async def get_word_track_backfill(
+        self, *, server_id: int | None = None
+    ) -> list[BackfillCheckpoint]:
+        async with self.acquire() as connection:
+            if server_id is not None:
+                records = await connection.fetch_query(
+                    queries.GET_WORD_TRACK_BACKFILL, server_id
+                )
+            else:
+                records = await connection.fetch_query(
+                    queries.GET_UNFINISHED_WORD_TRACK_BACKFILLS
+                )
+
+        return [BackfillCheckpoint(*record) for record in records]
+
+    async def backfill_word_track(
+        self, updates: Sequence[WordTrackUpdate], checkpoint: BackfillCheckpoint
+    ):
+        """
+        Add backfilled counts with a COPY and move the checkpoint in the same transaction
+        """
+        word_ids = await self.get_word_ids(update.word for update in updates)
+
+        async with self.acquire() as connection:
+            async with connection.transaction():
+                if updates:
+                    # the temp table lives as long as the connection, emptied on commit
+                    await connection.execute(queries.CREATE_WORD_TRACK_BACKFILL_INPUT)
+                    await connection.copy_records_to_table(
+                        "word_track_backfill_input",
+                        records=[
+                            (server_id, author_id, word_ids[word], amount)
+                            for server_id, author_id, word, amount in updates
+                        ],
+                        columns=("server", "author", "word_id", "amount"),
+                    )
+                    await connection.execute_query(queries.BACKFILL_WORD_TRACK_WORDS)
+
+                await connection.execute_query(
+                    queries.UPDATE_WORD_TRACK_BACKFILL, *checkpoint
+                )
+
+    async def get_word_ids(self, words: Iterable[str]) -> dict[str, int]:
+        """
+        Get the ids of words, giving new words one
+
+        ids are cached so only words not seen recently are sent to the database,
+        all of them in one statement
+        """
+        word_ids: dict[str, int] = {}
+        missing: set[str] = set()
+
+        for word in words:
+            word_id = self._word_ids.get(word)
+
+            if word_id is None:
+                missing.add(word)
+                continue
+
+            self._word_ids.move_to_end(word)
+            word_ids[word] = word_id
+
+        self.word_id_hits.inc(len(word_ids))
+        self.word_id_misses.inc(len(missing))
+
+        # a word inserted by another process after the statement started isn't
+        # visible to it, asking again picks those up
+        while missing:
+            async with self.acquire() as connection:
+                records = await connection.fetch_query(
+                    queries.GET_OR_CREATE_WORD_IDS, list(missing)
+                )
+
+            for record in records:
+                self._word_ids[record["text"]] = word_ids[record["text"]] = record["id"]
+                missing.discard(record["text"])
+
+        return word_ids
+
     async def get_server_word_track_leaderboard(
         self, *, server_id: int, author_id: int | None = None
     ) -> dict[str, int]:
-        params = [server_id]
+        async with self.acquire() as connection:
+            if author_id is not None:
+                records: list[asyncpg.Record] = await connection.fetch_query(
+                    queries.GET_MEMBER_WORD_LEADERBOARD, server_id, author_id
+                )
+            else:
+                records = await connection.fetch_query(
+                    queries.GET_SERVER_WORD_LEADERBOARD, server_id
+                )
 
-        if author_id is not None:
-            author_condition = "and author = $2"
-            params.append(author_id)
+        result: dict[str, int] = {}
 
-        else:
-            author_condition = ""
+        for record in records:
+            result[record["word"]] = record["count"]
 
-        async with self.pool.acquire() as connection:
-            records: list[asyncpg.Record] = await connection.fetch(
-                f"SELECT word, sum(count) FROM word_track WHERE server = $1 {author_condition} GROUP BY word ORDER BY sum DESC;",
-                *params,
+        return result
+
+    async def get_member_word_track_stats(
+        self, *, server_id: int, author_id: int
+    ) -> WordTrackStats | None:
+        async with self.acquire() as connection:
+            record = await connection.fetchrow_query(
+                queries.GET_MEMBER_WORD_STATS, server_id, author_id
             )
 
-        result: dict[str, int] = {}
+        if record is None:
+            return None
 
-        for record in records:
-            result[record["word"]] = record["sum"]
+        return WordTrackStats(record["unique_words"], record["total_words"])
 
-        return result
+    async def get_member_word_counts(
+        self, *, server_id: int, author_id: int, words: Sequence[str]
+    ) -> dict[str, int]:
+        async with self.acquire() as connection:
+            records: list[asyncpg.Record] = await connection.fetch_query(
+                queries.GET_MEMBER_WORD_COUNTS, server_id, author_id, list(words)
+            )
 
-    async def get_member_bound_word_rank(
-        self, *, server_id: int, word: str
-    ) -> list[tuple[int, int]]:
-        async with self.pool.acquire() as connection:
-            records: list[asyncpg.Record] = await connection.fetch(
-                "SELECT author, count FROM word_track WHERE server = $1 AND word = $2 ORDER BY count DESC;",
-                server_id,
-                word,
+        return {record["word"]: record["count"] for record in records}
+
+    async def get_word_rank(
+        self, *, server_id: int, word: str, limit: int
+    ) -> WordRank | None:
+        async with self.acquire() as connection:
+            records: list[asyncpg.Record] = await connection.fetch_query(
+                queries.GET_WORD_RANK, server_id, word, limit
             )
 
-        result: list[tuple[int, int]] = []
+        if not records:
+            return None
 
-        for record in records:
-            result.append((record["author"], record["count"]))
+        return WordRank(
+            records[0]["server_count"],
+            records[0]["server_rank"],
+            [
+                LeaderboardEntry(record["author"], record["count"])
+                for record in records
+                if record["author"] is not None
+            ],
+        )
 
-        return result
+    @staticmethod
+    def _leaderboard_page(
+        records: list[asyncpg.Record],
+    ) -> tuple[list[LeaderboardEntry], int]:
+        # every row carries the total, an empty page is a single row with a NULL key
+        entries = [
+            LeaderboardEntry(record["key"], record["count"])
+            for record in records
+            if record["key"] is not None
+        ]
+        return entries, records[0]["total"]
+
+    async def get_server_word_leaderboard_page(
+        self, *, server_id: int, limit: int, offset: int = 0
+    ) -> tuple[list[LeaderboardEntry], int]:
+        """
+        :return: A page of word: count and the number of words used in the server
+        """
+        async with self.acquire() as connection:
+            records = await connection.fetch_query(
+                queries.GET_SERVER_WORD_LEADERBOARD_PAGE, server_id, limit, offset
+            )
+
+        return self._leaderboard_page(records)
 
-    # user_id: unique words
     async def get_word_track_unique_word_leaderboard(
-        self,
-        *,
-        server_id: int | None = None,
-    ):
-        params: list[int] = []
+        self, *, server_id: int | None = None, limit: int, offset: int = 0
+    ) -> tuple[list[LeaderboardEntry], int]:
+        """
+        :return: A page of user_id: unique words and the number of users
+        """
+        async with self.acquire() as connection:
+            if server_id is not None:
+                records = await connection.fetch_query(
+                    queries.GET_SERVER_UNIQUE_WORD_LEADERBOARD_PAGE,
+                    server_id,
+                    limit,
+                    offset,
+                )
+            else:
+                records = await connection.fetch_query(
+                    queries.GET_UNIQUE_WORD_LEADERBOARD_PAGE, limit, offset
+                )
 
-        if server_id is not None:
-            server_clause = "WHERE server = $1"
-            params.append(server_id)
-        else:
-            server_clause = ""
+        return self._leaderboard_page(records)
 
-        async with self.pool.acquire() as connection:
-            records: list[asyncpg.Record] = await connection.fetch(
-                f"SELECT author, count(word) FROM word_track {server_clause} GROUP BY author ORDER BY count DESC;",
-                *params,
+    async def get_word_track_total_word_leaderboard(
+        self, *, server_id: int | None = None, limit: int, offset: int = 0
+    ) -> tuple[list[LeaderboardEntry], int]:
+        """
+        :return: A page of user_id: total words and the number of users
+        """
+        async with self.acquire() as connection:
+            if server_id is not None:
+                records = await connection.fetch_query(
+                    queries.GET_SERVER_TOTAL_WORD_LEADERBOARD_PAGE,
+                    server_id,
+                    limit,
+                    offset,
+                )
+            else:
+                records = await connection.fetch_query(
+                    queries.GET_TOTAL_WORD_LEADERBOARD_PAGE, limit, offset
+                )
+
+        return self._leaderboard_page(records)
+
+    async def get_word_usage(
+        self, *, server_id: int, word: str, since: datetime
+    ) -> list[WordUsage]:
+        since = word_usage_bucket(since, pendulum.now("UTC"))
+
+        async with self.acquire() as connection:
+            records = await connection.fetch_query(
+                queries.GET_WORD_USAGE, server_id, word, since
             )
 
-        result: list[tuple[int, int]] = []
+        return [
+            WordUsage(
+                record["bucket"], UsageResolution(record["resolution"]), record["count"]
+            )
+            for record in records
+        ]
 
-        for record in records:
-            result.append((record["author"], record["count"]))
+    async def get_word_usage_leaderboard(
+        self, *, server_id: int, since: datetime, limit: int, offset: int = 0
+    ) -> tuple[list[LeaderboardEntry], int]:
+        since = word_usage_bucket(since, pendulum.now("UTC"))
 
-        return result
+        async with self.acquire() as connection:
+            records = await connection.fetch_query(
+                queries.GET_WORD_USAGE_LEADERBOARD_PAGE, server_id, since, limit, offset
+            )
 
-    # user_id: total words
-    async def get_word_track_total_word_leaderboard(
-        self,
-        *,
-        server_id: int | None = None,
-    ):
-        params: list[int] = []
+        return self._leaderboard_page(records)
 
-        if server_id is not None:
-            server_clause = "WHERE server = $1"
-            params.append(server_id)
-        else:
-            server_clause = ""
+    async def get_author_usage_leaderboard(
+        self, *, server_id: int, since: datetime, limit: int, offset: int = 0
+    ) -> tuple[list[LeaderboardEntry], int]:
+        since = word_usage_bucket(since, pendulum.now("UTC"))
 
-        async with self.pool.acquire() as connection:
-            records: list[asyncpg.Record] = await connection.fetch(
-                f"SELECT author, sum(count) FROM word_track {server_clause} GROUP BY author ORDER BY sum DESC;",
-                *params,
+        async with self.acquire() as connection:
+            records = await connection.fetch_query(
+                queries.GET_AUTHOR_USAGE_LEADERBOARD_PAGE,
+                server_id,
+                since,
+                limit,
+                offset,
             )
 
-        result: list[tuple[int, int]] = []
+        return self._leaderboard_page(records)
 
-        for record in records:
-            result.append((record["author"], record["sum"]))
+    async def compact_word_usage(self):
+        hourly_cutoff, daily_cutoff = word_usage_cutoffs(pendulum.now("UTC"))
 
-        return result
+        async with self.acquire() as connection:
+            async with connection.transaction():
+                for query in (queries.COMPACT_WORD_USAGE, queries.COMPACT_AUTHOR_USAGE):
+                    await connection.execute_query(
+                        query,
+                        UsageResolution.hour.value,
+                        UsageResolution.day.value,
+                        hourly_cutoff,
+                    )
+                    await connection.execute_query(
+                        query,
+                        UsageResolution.day.value,
+                        UsageResolution.month.value,
+                        daily_cutoff,
+                    )
+
+    async def get_heavy_hitter_snapshots(self) -> list[HeavyHitterSnapshot]:
+        async with self.acquire() as connection:
+            records = await connection.fetch_query(queries.GET_HEAVY_HITTER_SNAPSHOTS)
+
+        return [
+            HeavyHitterSnapshot(
+                HeavyHitterScope(record["scope"]),
+                record["scope_id"],
+                record["data"],
+                record["expires"],
+            )
+            for record in records
+        ]
+
+    async def save_heavy_hitter_snapshots(
+        self, snapshots: Sequence[HeavyHitterSnapshot]
+    ):
+        scopes, scope_ids, data, expires = zip(*snapshots) if snapshots else ([],) * 4
+
+        async with self.acquire() as connection:
+            async with connection.transaction():
+                await connection.execute_query(
+                    queries.SAVE_HEAVY_HITTER_SNAPSHOTS,
+                    [scope.value for scope in scopes],
+                    scope_ids,
+                    data,
+                    expires,
+                )
+                await connection.execute_query(
+                    queries.DELETE_EXPIRED_HEAVY_HITTER_SNAPSHOTS
+                )
+
+    async def _copy_export(
+        self, query: str, export_format: ExportFormat, output: ExportOutput, *args
+    ):
+        async with self.acquire() as connection:
+            match export_format:
+                case ExportFormat.csv:
+                    await connection.copy_from_query(
+                        query, *args, output=output, format="csv", header=True
+                    )
+                case ExportFormat.ndjson:
+                    # json never contains these characters raw so nothing is quoted
+                    # or escaped and every row is the json as postgres built it
+                    await connection.copy_from_query(
+                        f"SELECT row_to_json(export) FROM ({query}) AS export",
+                        *args,
+                        output=output,
+                        format="csv",
+                        quote="\x01",
+                        delimiter="\x02",
+                    )
+
+    async def export_word_track(
+        self, *, server_id: int, export_format: ExportFormat, output: ExportOutput
+    ):
+        await self._copy_export(
+            queries.EXPORT_WORD_TRACK, export_format, output, server_id
+        )
 
     async def get_guild_enabled_features(self, guild_id: int) -> list[str]:
-        async with self.pool.acquire() as connection:
-            records: list[asyncpg.Record] = await connection.fetch(
-                "SELECT feature_name FROM enabled_features WHERE guild_id = $1;",
-                guild_id,
+        async with self.acquire() as connection:
+            records: list[asyncpg.Record] = await connection.fetch_query(
+                queries.GET_GUILD_ENABLED_FEATURES, guild_id
             )
 
             result: list[str] = []
@@ -297,93 +803,113 @@ class Database:
 
         return result
 
+    async def get_all_enabled_features(self) -> dict[int, list[str]]:
+        """
+        :return: guild_id: enabled feature names, for every guild with any enabled
+        """
+        async with self.acquire() as connection:
+            records: list[asyncpg.Record] = await connection.fetch_query(
+                queries.GET_ALL_ENABLED_FEATURES
+            )
+
+        result: dict[int, list[str]] = {}
+
+        for record in records:
+            result.setdefault(record["guild_id"], []).append(record["feature_name"])
+
+        return result
+
     async def enable_guild_enabled_feature(self, guild_id: int, feature_name: str):
-        async with self.pool.acquire() as connection:
-            await connection.execute(
-                "INSERT INTO enabled_features (guild_id, feature_name) VALUES ($1, $2);",
-                guild_id,
-                feature_name,
+        async with self.acquire() as connection:
+            await connection.execute_query(
+                queries.ENABLE_GUILD_FEATURE, guild_id, feature_name
             )
 
     async def disable_guild_enabled_feature(self, guild_id: int, feature_name: str):
-        async with self.pool.acquire() as connection:
-            await connection.execute(
-                "DELETE FROM enabled_features WHERE guild_id = $1 AND feature_name = $2;",
-                guild_id,
-                feature_name,
+        async with self.acquire() as connection:
+            await connection.execute_query(
+                queries.DISABLE_GUILD_FEATURE, guild_id, feature_name
             )
 
     async def purge_feature(self, feature_name: str):
-        async with self.pool.acquire() as connection:
-            await connection.execute(
-                "DELETE FROM enabled_features WHERE feature_name = $1;",
-                feature_name,
-            )
+        async with self.acquire() as connection:
+            await connection.execute_query(queries.PURGE_FEATURE, feature_name)
 
     async def delete_coin_account(self, user_id: int):
-        async with self.pool.acquire() as connection:
-            await connection.execute("DELETE FROM coins WHERE user_id = $1;", user_id)
+        async with self.acquire() as connection:
+            await connection.execute_query(queries.DELETE_COIN_ACCOUNT, user_id)
 
         logger.info(f"Deleted coin account {user_id}")
 
     async def get_coin_balance(self, user_id: int) -> int:
-        async with self.pool.acquire() as connection:
-            row = await connection.fetchrow(
-                "SELECT * FROM coins WHERE user_id = $1;", user_id
-            )
+        async with self.acquire() as connection:
+            row = await connection.fetchrow_query(queries.GET_COIN_BALANCE, user_id)
 
             if row is not None:
                 return row["amount"]
 
             return 0
 
-    async def get_all_coin_balances(self) -> list[CoinsEntry]:
-        async with self.pool.acquire() as connection:
-            rows = await connection.fetch(
-                "SELECT user_id, amount FROM coins ORDER BY amount DESC;"
+    async def get_coin_balances(
+        self, *, limit: int, offset: int = 0
+    ) -> tuple[list[LeaderboardEntry], int]:
+        """
+        Get a page of balances sorted by amount
+
+        :return: A page of user_id: coins and the number of accounts
+        """
+        async with self.acquire() as connection:
+            records = await connection.fetch_query(
+                queries.GET_COIN_BALANCES_PAGE, limit, offset
             )
 
-            result: list[CoinsEntry] = []
-            for row in rows:
-                result.append(CoinsEntry(row["user_id"], row["amount"]))
-
-            return result
+        return self._leaderboard_page(records)
 
     async def set_coins(self, user_id: int, amount: int):
-        async with self.pool.acquire() as connection:
-            await connection.execute(
-                "INSERT INTO coins (user_id, amount) VALUES ($1, $2) ON CONFLICT (user_id) DO UPDATE SET amount = EXCLUDED.amount;",
-                user_id,
-                amount,
-            )
+        async with self.acquire() as connection:
+            await connection.execute_query(queries.SET_COINS, user_id, amount)
 
         logger.info(f"Set coin account {user_id} to {amount}")
 
-    async def add_coins(self, user_id: int, amount: int):
-        current = await self.get_coin_balance(user_id)
-        new_balance = current + amount
-        if new_balance.bit_length() >= 64:
-            raise CommandError(
-                "New balance would be over int64, are you sure you need that many coins?"
+    async def add_coins(self, user_id: int, amount: int) -> int:
+        async with self.acquire() as connection, coin_overflow_errors():
+            return await connection.fetchval_query(queries.ADD_COINS, user_id, amount)
+
+    async def add_coins_if_funded(
+        self, user_id: int, amount: int, *, required: int
+    ) -> int | None:
+        """
+        Add amount (which can be negative) only if the balance is at least required
+
+        returns the new balance or None if the account didn't have enough
+        """
+        async with self.acquire() as connection, coin_overflow_errors():
+            return await connection.fetchval_query(
+                queries.ADD_COINS_IF_FUNDED, user_id, amount, required
             )
-        await self.set_coins(user_id, new_balance)
-        return new_balance
 
-    async def remove_coins(self, user_id: int, amount: int):
-        current = await self.get_coin_balance(user_id)
-        new_balance = current - amount
-        if new_balance.bit_length() >= 64:
-            raise CommandError(
-                "New balance would be over int64, are you sure you need that many coins?"
+    async def transfer_coins(self, from_id: int, to_id: int, amount: int) -> int | None:
+        """
+        Move coins between accounts in one statement
+
+        returns the sender's new balance or None if they didn't have enough
+        """
+        if from_id == to_id:
+            raise ValueError("Cannot transfer coins to the same account")
+
+        async with self.acquire() as connection, coin_overflow_errors():
+            new_balance = await connection.fetchval_query(
+                queries.TRANSFER_COINS, from_id, to_id, amount
             )
-        await self.set_coins(user_id, new_balance)
+
+        if new_balance is not None:
+            logger.info(f"Transferred {amount} coins from {from_id} to {to_id}")
+
         return new_balance
 
     async def get_coin_stake(self, user_id: int) -> CoinStake | None:
-        async with self.pool.acquire() as connection:
-            row = await connection.fetchrow(
-                "SELECT * FROM stakes WHERE user_id = $1;", user_id
-            )
+        async with self.acquire() as connection:
+            row = await connection.fetchrow_query(queries.GET_COIN_STAKE, user_id)
 
             if row is not None:
                 return CoinStake(
@@ -394,9 +920,9 @@ class Database:
             return None
 
     async def set_coin_stake(self, user_id: int, amount: float, bitcoin_price: float):
-        async with self.pool.acquire() as connection:
-            await connection.execute(
-                "INSERT INTO stakes (user_id, amount, bitcoin_price) VALUES ($1, $2, $3) ON CONFLICT (user_id) DO UPDATE SET amount = EXCLUDED.amount, bitcoin_price = EXCLUDED.bitcoin_price;",
+        async with self.acquire() as connection:
+            await connection.execute_query(
+                queries.SET_COIN_STAKE,
                 user_id,
                 amount,
                 bitcoin_price,
@@ -404,122 +930,372 @@ class Database:
 
         logger.info(f"Set coin stake for {user_id}: {amount=} {bitcoin_price=}")
 
-    async def clear_coin_stake(self, user_id: int):
-        async with self.pool.acquire() as connection:
-            await connection.execute(
-                "DELETE FROM stakes WHERE user_id = $1;",
-                user_id,
+    async def stake_coins(
+        self, user_id: int, amount: int, bitcoin_price: float
+    ) -> StakeUpdate | None:
+        """
+        Move coins from a balance into a stake in one statement
+
+        an existing stake is adjusted to the new price before adding to it
+        returns None if the account didn't have enough coins
+        """
+        async with self.acquire() as connection:
+            row = await connection.fetchrow_query(
+                queries.STAKE_COINS, user_id, amount, bitcoin_price
             )
 
-        logger.info(f"Cleared coin stake for {user_id}")
-
-    async def add_coin_stake(self, user_id: int, amount: float, bitcoin_price: float):
-        current = await self.get_coin_stake(user_id)
+        if row is None:
+            return None
 
-        if current is None:
-            new_balance = amount
-        else:
-            new_balance = current.coins + amount
+        logger.info(f"Staked {amount} coins for {user_id} at {bitcoin_price=}")
+        return StakeUpdate(coins=row["amount"], created=row["created"])
 
-        # TODO: are python floats bit limited?
+    async def exit_coin_stake(
+        self, user_id: int, bitcoin_price: float
+    ) -> StakeExit | None:
+        """
+        Remove a stake and pay it out at bitcoin_price in one statement
 
-        await self.set_coin_stake(user_id, new_balance, bitcoin_price)
-        return new_balance
+        returns None if there was no stake
+        """
+        async with self.acquire() as connection, coin_overflow_errors():
+            row = await connection.fetchrow_query(
+                queries.EXIT_COIN_STAKE, user_id, bitcoin_price
+            )
 
-    async def remove_coin_stakes(
-        self, user_id: int, amount: float, bitcoin_price: float
-    ):
-        current = await self.get_coin_stake(user_id)
+        if row is None:
+            return None
 
-        if current is None:
-            new_balance = amount
-        else:
-            new_balance = current.coins - amount
+        logger.info(f"Exited coin stake for {user_id} at {bitcoin_price=}")
+        return StakeExit(staked=row["staked"], coins=row["payout"])
 
-        await self.set_coin_stake(user_id, new_balance, bitcoin_price)
-        return new_balance
+    async def add_snipes(self, snipes: Sequence[Snipe]):
+        """
+        Write many snipes with a single COPY
+        """
+        if not snipes:
+            return
 
-    async def add_snipe(self, snipe: Snipe):
-        async with self.pool.acquire() as connection:
-            await connection.execute(
-                "INSERT INTO snipes(id, server, author, channel, mode, time, content) VALUES ($1, $2, $3, $4, $5, $6, $7)",
+        records = [
+            (
                 snipe.id,
                 snipe.server,
                 snipe.author,
                 snipe.channel,
                 snipe.mode.value,
                 snipe.time.timestamp(),
-                snipe.content,
+                *compress_snipe_content(snipe.content),
+            )
+            for snipe in snipes
+        ]
+
+        async with self.acquire() as connection:
+            await connection.copy_records_to_table(
+                "snipes",
+                records=records,
+                columns=(
+                    "id",
+                    "server",
+                    "author",
+                    "channel",
+                    "mode",
+                    "time",
+                    "content",
+                    "content_compressed",
+                ),
             )
 
-    async def get_snipes(
-        self,
+    @staticmethod
+    def _snipe_from_record(record: asyncpg.Record) -> Snipe:
+        # only the rows being shown are fetched so this is the only place to decompress
+        if record["content_compressed"] is not None:
+            content = zlib.decompress(record["content_compressed"]).decode()
+        else:
+            content = record["content"]
+
+        return Snipe(
+            id=record["id"],
+            mode=SnipeMode(record["mode"]),
+            author=record["author"],
+            content=content,
+            server=record["server"],
+            channel=record["channel"],
+            time=pendulum.from_timestamp(record["time"]),
+        )
+
+    async def rewrite_snipe_content(
+        self, *, batch_size: int = SNIPE_COMPRESSION_BATCH_SIZE, pause: float = 1
+    ) -> int:
+        """
+        Store existing snipes the way add_snipes would now, a batch at a time
+
+        content over the threshold is compressed and compressed content under it
+        is stored as text again; progress is saved after every batch and once
+        it's done this returns straight away
+
+        waits pause seconds between batches so it doesn't hog the database
+
+        :return: Number of snipes rewritten
+        """
+        async with self.acquire() as connection:
+            last_snipe_id, done = await connection.fetchrow_query(
+                queries.GET_SNIPE_CONTENT_REWRITE
+            )
+
+        rewritten_count = 0
+
+        while not done:
+            async with self.acquire() as connection, connection.transaction():
+                records = await connection.fetch_query(
+                    queries.GET_SNIPES_TO_REWRITE,
+                    last_snipe_id,
+                    SNIPE_COMPRESSION_THRESHOLD,
+                    batch_size,
+                )
+
+                done = len(records) < batch_size
+                snipe_ids: list[int] = []
+                times: list[float] = []
+                contents: list[str | None] = []
+                compressed_contents: list[bytes | None] = []
+
+                for record in records:
+                    if record["content_compressed"] is not None:
+                        content = zlib.decompress(record["content_compressed"]).decode()
+                    else:
+                        content = record["content"]
+
+                    rewritten = compress_snipe_content(content)
+
+                    if rewritten == (record["content"], record["content_compressed"]):
+                        continue
+
+                    snipe_ids.append(record["snipe_id"])
+                    times.append(record["time"])
+                    contents.append(rewritten[0])
+                    compressed_contents.append(rewritten[1])
+
+                if snipe_ids:
+                    await connection.execute_query(
+                        queries.SET_SNIPE_CONTENT,
+                        snipe_ids,
+                        times,
+                        contents,
+                        compressed_contents,
+                    )
+                    rewritten_count += len(snipe_ids)
+
+                if records:
+                    last_snipe_id = records[-1]["snipe_id"]
+
+                await connection.execute_query(
+                    queries.SET_SNIPE_CONTENT_REWRITE, last_snipe_id, done
+                )
+
+            if not done:
+                await asyncio.sleep(pause)
+
+        return rewritten_count
+
+    @staticmethod
+    def _build_snipe_filter(
         *,
         server: int | None = None,
         author: int | None = None,
         channel: int | None = None,
         contains: str | None = None,
+        regex: str | None = None,
+        channels: Sequence[int] | None = None,
         mode: SnipeMode | None = None,
-        limit: int | None = None,
-        negative: bool = False,
-    ) -> tuple[list[Snipe], int]:
-        args: list[int | str] = []
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> SnipeFilter:
+        """
+        Build the WHERE clause shared by the snipe queries
+
+        since and until are compared against the partition key so only
+        the partitions in that window get scanned
+        """
+        args: list[int | str | float | Sequence[int]] = []
         query_parts: list[str] = []
-        row_limit = ""
+        shape: list[str] = []
         counter = count(start=1, step=1)
 
         if server is not None:
             query_parts.append(f"server = ${next(counter)}")
             args.append(server)
+            shape.append("server")
 
         if author is not None:
             query_parts.append(f"author = ${next(counter)}")
             args.append(author)
+            shape.append("author")
 
         if channel is not None:
             query_parts.append(f"channel = ${next(counter)}")
             args.append(channel)
+            shape.append("channel")
 
+        if channels is not None:
+            query_parts.append(f"channel = ANY(${next(counter)}::BIGINT[])")
+            args.append(channels)
+            shape.append("channels")
+
+        # both of these can use the trigram index on content, compressed content
+        # is NULL but only content longer than any message is compressed
         if contains is not None:
-            # the position function returns 1 or above if the substring is within content
-            query_parts.append(f"position(${next(counter)} in content) > 0")
-            args.append(contains)
+            query_parts.append(f"content ILIKE ${next(counter)}")
+            args.append(f"%{escape_like(contains)}%")
+            shape.append("contains")
+
+        if regex is not None:
+            query_parts.append(f"content ~* ${next(counter)}")
+            args.append(regex)
+            shape.append("regex")
 
         if mode is not None:
             query_parts.append(f"mode = ${next(counter)}")
             args.append(mode.value)
+            shape.append("mode")
+
+        if since is not None:
+            query_parts.append(f"time >= ${next(counter)}")
+            args.append(since.timestamp())
+            shape.append("since")
+
+        if until is not None:
+            query_parts.append(f"time < ${next(counter)}")
+            args.append(until.timestamp())
+            shape.append("until")
 
         if query_parts:
-            query = "WHERE " + " and ".join(query_parts) + " "
+            where = "WHERE " + " and ".join(query_parts) + " "
         else:
-            query = ""
+            where = ""
 
-        if limit is not None:
-            if limit > 10_000_000:
-                raise RuntimeError(
-                    f"requested limit of {limit} when the max is 10,000,000"
-                )
+        return SnipeFilter(",".join(shape), where, args)
+
+    @staticmethod
+    def _register_snipe_query(
+        kind: str, snipe_filter: SnipeFilter, sql: str
+    ) -> queries.Query:
+        """
+        Register a filtered snipe query under its filter shape
+
+        the filters that can be combined are fixed so this is a bounded set of
+        statements, each is prepared on a connection the first time it's used there
+        """
+        return queries.register(f"snipes.{kind}[{snipe_filter.shape}]", sql)
+
+    async def get_snipe(
+        self,
+        *,
+        index: int,
+        server: int | None = None,
+        author: int | None = None,
+        channel: int | None = None,
+        contains: str | None = None,
+        regex: str | None = None,
+        mode: SnipeMode | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> tuple[Snipe | None, int]:
+        """
+        Get a single snipe by index along with the total matching the filters
+
+        index 0 is the newest snipe and -1 is the oldest
+
+        :return: The snipe, or None if index is out of range, and the total
+        """
+        snipe_filter = self._build_snipe_filter(
+            server=server,
+            author=author,
+            channel=channel,
+            contains=contains,
+            regex=regex,
+            mode=mode,
+            since=since,
+            until=until,
+        )
+
+        if index < 0:
+            order = "ASC"
+            offset = abs(index) - 1
+        else:
+            order = "DESC"
+            offset = index
+
+        where, args = snipe_filter.where, snipe_filter.args
+        # the count always returns a row, so the total comes back even when
+        # the offset is past the last snipe
+        query = self._register_snipe_query(
+            f"get_snipe.{order.lower()}",
+            snipe_filter,
+            "SELECT snipe_count.total, target.* "
+            f"FROM (SELECT count(*) AS total FROM snipes {where}) AS snipe_count "
+            f"LEFT JOIN LATERAL (SELECT * FROM snipes {where}"
+            f"ORDER BY time {order} OFFSET ${len(args) + 1} LIMIT 1) AS target ON true;",
+        )
+
+        async with self.acquire() as connection, invalid_regex_errors():
+            record = await connection.fetchrow_query(query, *args, offset)
+
+        # unreachable, aggregates without GROUP BY always return a row
+        assert record is not None
+
+        if record["id"] is None:
+            return None, record["total"]
+
+        return self._snipe_from_record(record), record["total"]
+
+    async def get_snipes(
+        self,
+        *,
+        server: int | None = None,
+        author: int | None = None,
+        channel: int | None = None,
+        contains: str | None = None,
+        regex: str | None = None,
+        mode: SnipeMode | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        limit: int | None = None,
+        negative: bool = False,
+    ) -> tuple[list[Snipe], int]:
+        snipe_filter = self._build_snipe_filter(
+            server=server,
+            author=author,
+            channel=channel,
+            contains=contains,
+            regex=regex,
+            mode=mode,
+            since=since,
+            until=until,
+        )
+        where, args = snipe_filter.where, snipe_filter.args
 
-            row_limit = f"LIMIT {limit}"
+        if limit is not None and limit > 10_000_000:
+            raise RuntimeError(f"requested limit of {limit} when the max is 10,000,000")
 
         if negative:
             order = "ASC"
         else:
             order = "DESC"
 
-        async with self.pool.acquire() as connection:
-            snipe_records = await connection.fetch(
-                "SELECT * FROM snipes "
-                + query
-                + f"ORDER BY time {order} "
-                + row_limit
-                + ";",
-                *args,
-            )
+        # the limit is a parameter so it doesn't make a new statement, LIMIT NULL is no limit
+        snipes_query = self._register_snipe_query(
+            f"get_snipes.{order.lower()}",
+            snipe_filter,
+            f"SELECT * FROM snipes {where}ORDER BY time {order} LIMIT ${len(args) + 1};",
+        )
+        count_query = self._register_snipe_query(
+            "count", snipe_filter, f"SELECT count(*) FROM snipes {where};"
+        )
 
-            snipe_count_record = await connection.fetchrow(
-                "SELECT count(*) FROM snipes " + query + ";", *args
-            )
+        async with self.acquire() as connection, invalid_regex_errors():
+            snipe_records = await connection.fetch_query(snipes_query, *args, limit)
+
+            snipe_count_record = await connection.fetchrow_query(count_query, *args)
             if snipe_count_record is None:
                 snipe_count = 0
             else:
@@ -527,39 +1303,268 @@ class Database:
 
             snipes: list[Snipe] = []
             for snipe_record in snipe_records:
-                snipes.append(
-                    Snipe(
-                        id=snipe_record["id"],
-                        mode=SnipeMode(snipe_record["mode"]),
-                        author=snipe_record["author"],
-                        content=snipe_record["content"],
-                        server=snipe_record["server"],
-                        channel=snipe_record["channel"],
-                        time=pendulum.from_timestamp(snipe_record["time"]),
-                    )
-                )
+                snipes.append(self._snipe_from_record(snipe_record))
 
             return snipes, snipe_count
 
+    async def get_snipes_before(
+        self,
+        *,
+        before: Snipe | None = None,
+        limit: int,
+        server: int | None = None,
+        author: int | None = None,
+        channel: int | None = None,
+        contains: str | None = None,
+        regex: str | None = None,
+        mode: SnipeMode | None = None,
+        since: datetime | None = None,
+    ) -> list[Snipe]:
+        """
+        Get up to limit snipes older than before, newest first
+
+        this pages with a (time, id) keyset instead of an offset so every
+        page costs the same no matter how far back it is
+        """
+        snipe_filter = self._build_snipe_filter(
+            server=server,
+            author=author,
+            channel=channel,
+            contains=contains,
+            regex=regex,
+            mode=mode,
+            since=since,
+        )
+        where, args = snipe_filter.where, snipe_filter.args
+        next_arg = len(args) + 1
+
+        if before is not None:
+            keyset = f"(time, id) < (${next_arg}, ${next_arg + 1})"
+            where = f"{where}and {keyset} " if where else f"WHERE {keyset} "
+            args = [*args, before.time.timestamp(), before.id]
+            next_arg += 2
+
+        query = self._register_snipe_query(
+            "before" if before is not None else "newest",
+            snipe_filter,
+            f"SELECT * FROM snipes {where}ORDER BY time DESC, id DESC LIMIT ${next_arg};",
+        )
+
+        async with self.acquire() as connection, invalid_regex_errors():
+            records = await connection.fetch_query(query, *args, limit)
+
+        return [self._snipe_from_record(record) for record in records]
+
+    async def search_snipes(
+        self,
+        *,
+        server: int,
+        query: str,
+        regex: bool = False,
+        channels: Sequence[int] | None = None,
+        since: datetime | None = None,
+        limit: int = 10,
+        offset: int = 0,
+    ) -> tuple[list[Snipe], int]:
+        """
+        Search a server's snipes, best matches first
+
+        query is matched case-insensitively, as a regex if regex is True
+        and as a substring otherwise
+
+        :return: The requested page of matches and the total number of matches
+        """
+        snipe_filter = self._build_snipe_filter(
+            server=server,
+            channels=channels,
+            since=since,
+            contains=None if regex else query,
+            regex=query if regex else None,
+        )
+        where, args = snipe_filter.where, snipe_filter.args
+        search_query = self._register_snipe_query(
+            "search",
+            snipe_filter,
+            f"SELECT *, count(*) OVER () AS total FROM snipes {where}"
+            f"ORDER BY word_similarity(${len(args) + 1}, content) DESC, time DESC "
+            f"LIMIT ${len(args) + 2} OFFSET ${len(args) + 3};",
+        )
+
+        async with self.acquire() as connection, invalid_regex_errors():
+            records = await connection.fetch_query(
+                search_query, *args, query, limit, offset
+            )
+
+        if not records:
+            return [], 0
+
+        snipes = [self._snipe_from_record(record) for record in records]
+        return snipes, records[0]["total"]
+
     async def get_snipe_leaderboard(
-        self, server_id: int | None = None
-    ) -> dict[int, int]:
-        if server_id:
-            where = "where server = $1"
-            params = [server_id]
-        else:
-            where = ""
-            params = []
+        self, server_id: int | None = None, *, limit: int, offset: int = 0
+    ) -> tuple[list[LeaderboardEntry], int]:
+        """
+        :return: A page of author_id: snipe count and the number of authors
+        """
+        async with self.acquire() as connection:
+            if server_id:
+                records = await connection.fetch_query(
+                    queries.GET_SERVER_SNIPE_LEADERBOARD_PAGE, server_id, limit, offset
+                )
+            else:
+                records = await connection.fetch_query(
+                    queries.GET_SNIPE_LEADERBOARD_PAGE, limit, offset
+                )
+
+        return self._leaderboard_page(records)
 
-        async with self.pool.acquire() as connection:
-            records: list[asyncpg.Record] = await connection.fetch(
-                f"SELECT author, count(author) from snipes {where} group by author order by count desc;",
-                *params,
+    async def count_snipes(
+        self,
+        *,
+        server: int | None = None,
+        author: int | None = None,
+        channel: int | None = None,
+        mode: SnipeMode | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> int:
+        snipe_filter = self._build_snipe_filter(
+            server=server,
+            author=author,
+            channel=channel,
+            mode=mode,
+            since=since,
+            until=until,
+        )
+        count_query = self._register_snipe_query(
+            "count", snipe_filter, f"SELECT count(*) FROM snipes {snipe_filter.where};"
+        )
+
+        async with self.acquire() as connection:
+            return await connection.fetchval_query(count_query, *snipe_filter.args)
+
+    async def export_snipes(
+        self, *, server_id: int, export_format: ExportFormat, output: ExportOutput
+    ):
+        await self._copy_export(queries.EXPORT_SNIPES, export_format, output, server_id)
+
+    async def get_snipe_retentions(self) -> dict[int, int]:
+        """
+        :return: guild_id: number of days snipes are kept
+        """
+        async with self.acquire() as connection:
+            records: list[asyncpg.Record] = await connection.fetch_query(
+                queries.GET_SNIPE_RETENTIONS
             )
 
-            result: dict[int, int] = {}
+        result: dict[int, int] = {}
 
-            for record in records:
-                result[record["author"]] = record["count"]
+        for record in records:
+            result[record["guild_id"]] = record["days"]
 
         return result
+
+    async def set_snipe_retention(self, guild_id: int, days: int | None):
+        """
+        Set how many days of snipes a guild keeps, None keeps them forever
+        """
+        async with self.acquire() as connection:
+            if days is None:
+                await connection.execute_query(queries.DELETE_SNIPE_RETENTION, guild_id)
+            else:
+                await connection.execute_query(
+                    queries.SET_SNIPE_RETENTION, guild_id, days
+                )
+
+    async def create_snipe_partitions(self, *, months_ahead: int = 2) -> list[str]:
+        """
+        Make sure the partitions for this month and the next months_ahead exist
+
+        :return: Names of the partitions
+        """
+        this_month = pendulum.now("UTC").start_of("month")
+        names: list[str] = []
+
+        async with self.acquire() as connection:
+            for offset in range(months_ahead + 1):
+                names.append(
+                    await connection.fetchval_query(
+                        queries.CREATE_SNIPE_PARTITION, this_month.add(months=offset)
+                    )
+                )
+
+        return names
+
+    async def get_snipe_partitions(self) -> list[SnipePartition]:
+        async with self.acquire() as connection:
+            records: list[asyncpg.Record] = await connection.fetch_query(
+                queries.GET_SNIPE_PARTITIONS
+            )
+
+        partitions: list[SnipePartition] = []
+
+        for record in records:
+            # skip the default partition
+            if (match := SNIPE_PARTITION_REGEX.match(record["relname"])) is None:
+                continue
+
+            start = pendulum.datetime(int(match["year"]), int(match["month"]), 1)
+            partitions.append(
+                SnipePartition(record["relname"], start, start.add(months=1))
+            )
+
+        partitions.sort(key=lambda partition: partition.start)
+        return partitions
+
+    async def drop_expired_snipe_partitions(
+        self, *, default_retention_days: int | None = None
+    ) -> list[str]:
+        """
+        Drop monthly partitions where every snipe is past its guild's retention
+
+        Guilds without a retention use default_retention_days,
+        None means they keep snipes forever and block their partitions from being dropped
+
+        :return: Names of the dropped partitions
+        """
+        now = pendulum.now("UTC")
+        dropped: list[str] = []
+
+        async with self.acquire() as connection:
+            shortest_retention: int | None = await connection.fetchval_query(
+                queries.GET_SHORTEST_SNIPE_RETENTION
+            )
+
+            if default_retention_days is not None:
+                shortest_retention = min(
+                    shortest_retention or default_retention_days,
+                    default_retention_days,
+                )
+
+            if shortest_retention is None:
+                return dropped
+
+            for partition in await self.get_snipe_partitions():
+                # nothing in a partition newer than this can have expired yet
+                if partition.end > now.subtract(days=shortest_retention):
+                    break
+
+                # names are matched against SNIPE_PARTITION_REGEX so they're safe to format,
+                # these aren't registered since each partition is its own statement
+                has_live_snipes = await connection.fetchval(
+                    f'SELECT EXISTS (SELECT 1 FROM "{partition.name}" AS partition '
+                    "LEFT JOIN snipe_retention ON snipe_retention.guild_id = partition.server "
+                    "WHERE coalesce(snipe_retention.days, $2::INT) IS NULL "
+                    "OR partition.time >= $1::FLOAT8 - coalesce(snipe_retention.days, $2::INT) * 86400);",
+                    now.timestamp(),
+                    default_retention_days,
+                )
+
+                if has_live_snipes:
+                    continue
+
+                await connection.execute(f'DROP TABLE "{partition.name}";')
+                dropped.append(partition.name)
+
+        return dropped
@@ -669,10 +669,15 @@ class EmoteManager(commands.Cog):
             except ValueError:
                 return False
             else:
-                return message.author == context.author
+                return True
 
         try:
-            message = await self.bot.wait_for("message", check=check, timeout=30)
+            message = await self.bot.wait_for_key(
+                "message",
+                (context.channel.id, context.author.id),
+                check=check,
+                timeout=30,
+            )
         except asyncio.TimeoutError:
             raise commands.UserInputError("Sorry, you took too long. Try again")
 
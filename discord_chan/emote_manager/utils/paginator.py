@@ -81,8 +81,11 @@ class Paginator:
             await self._message.add_reaction(button)  # type: ignore
         while not self._stopped:
             try:
-                reaction: RawReactionActionEvent = await self._client.wait_for(
-                    "raw_reaction_add", check=self.react_check, timeout=self.timeout
+                reaction: RawReactionActionEvent = await self._client.wait_for_key(
+                    "raw_reaction_add",
+                    self._message.id,  # type: ignore
+                    check=self.react_check,
+                    timeout=self.timeout,
                 )
             except asyncio.TimeoutError:
                 await self.stop(delete=self.delete_msg_timeout)
@@ -0,0 +1,251 @@
+import asyncio
+import csv
+import io
+import json
+import zlib
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterable, Sequence
+from enum import Enum
+
+import discord
+
+ExportOutput = Callable[[bytes], Awaitable[None]]
+
+EXPORT_COMPRESSION_LEVEL = 6
+# the most a deflate stream can grow beyond its input, plus the gzip header,
+# trailer and a sync flush marker
+EXPORT_COMPRESSION_OVERHEAD = 64
+# rows formatted before each output call when exporting from python
+EXPORT_ROW_BATCH_SIZE = 1000
+
+SNIPE_EXPORT_COLUMNS = (
+    "id",
+    "mode",
+    "author",
+    "channel",
+    "time",
+    "content",
+    "content_compressed",
+)
+WORD_TRACK_EXPORT_COLUMNS = ("author", "word", "count")
+
+
+class ExportFormat(Enum):
+    csv = "csv"
+    # one json object per line
+    ndjson = "ndjson"
+
+
+def find_records_end(data: bytes, *, quoted: bool) -> int:
+    """
+    Get the index just after the last complete record in data
+
+    data has to start at the start of a record, when quoted is True
+    newlines inside of double quotes don't end a record
+    """
+    if not quoted:
+        return data.rfind(b"\n") + 1
+
+    end = 0
+    start = 0
+    in_quotes = False
+
+    # an escaped quote is two quotes so it never changes whether we're in quotes
+    while (newline := data.find(b"\n", start)) != -1:
+        if data.count(b'"', start, newline) % 2:
+            in_quotes = not in_quotes
+
+        if not in_quotes:
+            end = newline + 1
+
+        start = newline + 1
+
+    return end
+
+
+async def export_rows(
+    output: ExportOutput,
+    export_format: ExportFormat,
+    columns: Sequence[str],
+    rows: Iterable[Sequence],
+):
+    """
+    Format rows the way postgres exports them, for storage without COPY
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+
+    if export_format is ExportFormat.csv:
+        writer.writerow(columns)
+
+    for index, row in enumerate(rows, 1):
+        if export_format is ExportFormat.csv:
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(dict(zip(columns, row))) + "\n")
+
+        if index % EXPORT_ROW_BATCH_SIZE == 0:
+            await output(buffer.getvalue().encode())
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        await output(buffer.getvalue().encode())
+
+
+class ExportWriter:
+    """
+    Gzips exported rows into files of at most part_size bytes
+
+    parts are split between rows so each can be used on its own,
+    csv parts all start with the header row
+    """
+
+    def __init__(self, name: str, export_format: ExportFormat, *, part_size: int):
+        self.name = name
+        self.format = export_format
+        self.part_size = part_size
+        # only one finished part is waiting to be uploaded at a time
+        self.parts: asyncio.Queue[discord.File | None] = asyncio.Queue(maxsize=1)
+
+        self.header: bytes | None = None
+        self.pending = b""
+        self.part_count = 0
+
+        self._out = io.BytesIO()
+        self._compressor = zlib.compressobj(EXPORT_COMPRESSION_LEVEL, wbits=31)
+        self._unflushed = 0
+        self._has_records = False
+
+    def _size_bound(self, size: int) -> int:
+        # what the part could be after adding size bytes, without flushing to find out
+        unflushed = self._unflushed + size
+        return (
+            self._out.tell()
+            + unflushed
+            + unflushed // 1000
+            + EXPORT_COMPRESSION_OVERHEAD
+        )
+
+    def _compress(self, data: bytes):
+        self._out.write(self._compressor.compress(data))
+        self._unflushed += len(data)
+
+    def _start_part(self):
+        self._out = io.BytesIO()
+        self._compressor = zlib.compressobj(EXPORT_COMPRESSION_LEVEL, wbits=31)
+        self._unflushed = 0
+        self._has_records = False
+
+        if self.header is not None:
+            self._compress(self.header)
+
+    async def _finish_part(self):
+        self._out.write(self._compressor.flush())
+        self._out.seek(0)
+        self.part_count += 1
+
+        await self.parts.put(
+            discord.File(
+                self._out, f"{self.name}-{self.part_count}.{self.format.value}.gz"
+            )
+        )
+
+    async def write(self, data: bytes):
+        """
+        Add exported data, which can end partway through a row
+        """
+        data = self.pending + data
+        end = find_records_end(data, quoted=self.format is ExportFormat.csv)
+        self.pending = data[end:]
+
+        if end == 0:
+            return
+
+        records = data[:end]
+
+        # column names never need quoting so the header ends at the first newline
+        if self.format is ExportFormat.csv and self.header is None:
+            header_end = records.index(b"\n") + 1
+            self.header, records = records[:header_end], records[header_end:]
+            self._compress(self.header)
+
+            if not records:
+                return
+
+        await self._add_records(records)
+
+    async def _add_records(self, records: bytes):
+        # split anything that might not fit in a part of its own, this is
+        # rare since exported data comes in chunks much smaller than parts
+        header_size = len(self.header or b"")
+        if header_size + len(records) * 2 > self.part_size:
+            middle = find_records_end(
+                records[: len(records) // 2], quoted=self.format is ExportFormat.csv
+            )
+
+            if middle != 0:
+                await self._add_records(records[:middle])
+                await self._add_records(records[middle:])
+                return
+
+        if self._size_bound(len(records)) > self.part_size:
+            # the real size is only known once the compressor is flushed
+            self._out.write(self._compressor.flush(zlib.Z_SYNC_FLUSH))
+            self._unflushed = 0
+
+            if self._has_records and self._size_bound(len(records)) > self.part_size:
+                await self._finish_part()
+                self._start_part()
+
+        self._compress(records)
+        self._has_records = True
+
+    async def finish(self):
+        """
+        Send the last part, this has to be called after the last write
+        """
+        if self.pending:
+            # exports always end with a newline, this is only an unterminated last row
+            records, self.pending = self.pending + b"\n", b""
+            await self._add_records(records)
+
+        if self._has_records:
+            await self._finish_part()
+
+
+async def stream_export(
+    export: Callable[[ExportOutput], Awaitable[None]],
+    *,
+    name: str,
+    export_format: ExportFormat,
+    part_size: int,
+) -> AsyncIterator[discord.File]:
+    """
+    Run export and yield the compressed parts as they fill up
+
+    the export waits while a part is being handled so only about
+    two parts are ever held in memory
+    """
+    writer = ExportWriter(name, export_format, part_size=part_size)
+
+    async def run_export():
+        # not done on cancellation, nothing is reading parts by then
+        try:
+            await export(writer.write)
+            await writer.finish()
+        except Exception:
+            await writer.parts.put(None)
+            raise
+
+        await writer.parts.put(None)
+
+    task = asyncio.create_task(run_export())
+
+    try:
+        while (part := await writer.parts.get()) is not None:
+            yield part
+
+        # raises whatever stopped the export
+        await task
+    finally:
+        task.cancel()
@@ -0,0 +1,87 @@
+import typing
+
+from discord.ext import commands
+
+import discord_chan
+from discord_chan import DiscordChan, EnumConverter, SubContext
+from discord_chan.export import ExportFormat, ExportOutput, stream_export
+
+ExportFormatArgument = typing.Annotated[ExportFormat, EnumConverter(ExportFormat)]
+
+
+class Export(commands.Cog, name="export"):
+    """
+    Bulk exports of stored server data
+    """
+
+    def __init__(self, bot: DiscordChan):
+        self.bot = bot
+
+    async def send_export(
+        self,
+        ctx: SubContext,
+        name: str,
+        export: typing.Callable[[ExportOutput], typing.Awaitable[None]],
+        export_format: ExportFormat,
+    ):
+        sent = 0
+
+        async with ctx.typing():
+            async for part in stream_export(
+                export,
+                name=f"{name}-{ctx.guild.id}",
+                export_format=export_format,
+                part_size=ctx.guild.filesize_limit,
+            ):
+                await ctx.send(file=part)
+                sent += 1
+
+        if sent == 0:
+            await ctx.send("Nothing to export")
+
+    @commands.group(name="export", invoke_without_command=True)
+    @commands.guild_only()
+    @commands.check_any(commands.is_owner(), discord_chan.checks.guild_owner())
+    @commands.bot_has_permissions(attach_files=True)
+    async def export_command(self, ctx: SubContext):
+        """
+        Export this server's data as gzipped csv or ndjson files
+        """
+        await ctx.send_help("export")
+
+    @export_command.command(name="snipes")
+    async def export_snipes(
+        self, ctx: SubContext, export_format: ExportFormatArgument = ExportFormat.csv
+    ):
+        """
+        Export this server's snipes
+
+        snipes long enough to be stored compressed are exported as base64
+        encoded zlib data in the content_compressed column
+        """
+
+        async def export(output: ExportOutput):
+            await self.bot.database.export_snipes(
+                server_id=ctx.guild.id, export_format=export_format, output=output
+            )
+
+        await self.send_export(ctx, "snipes", export, export_format)
+
+    @export_command.command(name="words")
+    async def export_words(
+        self, ctx: SubContext, export_format: ExportFormatArgument = ExportFormat.csv
+    ):
+        """
+        Export this server's word counts per member
+        """
+
+        async def export(output: ExportOutput):
+            await self.bot.database.export_word_track(
+                server_id=ctx.guild.id, export_format=export_format, output=output
+            )
+
+        await self.send_export(ctx, "words", export, export_format)
+
+
+async def setup(bot: DiscordChan):
+    await bot.add_cog(Export(bot))
@@ -1,18 +1,16 @@
 import asyncio
 import random
 import typing
-from math import floor
 from typing import Literal
 
 import aiohttp
 import discord
 from discord.ext import commands
-from loguru import logger
 
 import discord_chan
 from discord_chan import DiscordChan, SubContext
 from discord_chan.converters import OverConverter
-from discord_chan.menus import DCMenuPages, NormalPageSource
+from discord_chan.menus import DCMenuPages, QueryPageSource
 
 BITCOIN_PRICE_URL = "https://api.binance.us/api/v3/ticker/price?symbol=BTCUSDT"
 
@@ -26,10 +24,6 @@ class Gambling(commands.Cog):
         self._btc_cooldown_task: asyncio.Task | None = None
         self._btc_price_lock = asyncio.Lock()
 
-    async def has_amount(self, user_id: int, amount: int) -> bool:
-        balance = await self.bot.database.get_coin_balance(user_id)
-        return balance >= amount
-
     async def get_btc_price(self) -> float:
         async with self._btc_price_lock:
             if self._btc_cooldown_task is not None:
@@ -83,8 +77,8 @@ class Gambling(commands.Cog):
         amount: typing.Annotated[int, OverConverter(0)],
     ):
         """Give some of your coins to another member"""
-        if not await self.has_amount(ctx.author.id, amount):
-            return await ctx.send(f"You don't have enough coins to give {amount}")
+        if member == ctx.author:
+            return await ctx.send("You can't give coins to yourself")
 
         singular = "" if amount == 1 else "s"
 
@@ -92,8 +86,13 @@ class Gambling(commands.Cog):
             f"Are you sure you want to send {amount} coin{singular} to {member.mention}",
             owner_id=ctx.author.id,
         ):
-            await self.bot.database.remove_coins(ctx.author.id, amount)
-            await self.bot.database.add_coins(member.id, amount)
+            new_balance = await self.bot.database.transfer_coins(
+                ctx.author.id, member.id, amount
+            )
+
+            if new_balance is None:
+                return await ctx.send(f"You don't have enough coins to give {amount}")
+
             await ctx.send("Sent")
         else:
             await ctx.send("Sending canceled")
@@ -103,28 +102,32 @@ class Gambling(commands.Cog):
         """
         View all coins sorted by amount.
         """
-        lb = await self.bot.database.get_all_coin_balances()
 
-        if not lb:
-            return await ctx.send("No one has any coins right now")
+        async def fetch_page(offset: int, limit: int) -> tuple[list[str], int]:
+            balances, total = await self.bot.database.get_coin_balances(
+                limit=limit, offset=offset
+            )
 
-        entries: list[str] = []
-        for user_id, coins in lb:
-            # attempt cache pull first
-            if (member := ctx.guild.get_member(user_id)) is not None:
-                entries.append(f"{member.mention}: {coins}")
-                continue
+            entries: list[str] = []
+            for user_id, coins in balances:
+                # attempt cache pull first
+                if (member := ctx.guild.get_member(user_id)) is None:
+                    try:
+                        member = await ctx.guild.fetch_member(user_id)
+                    except discord.NotFound:
+                        # accounts are global, people outside the guild are shown by id
+                        entries.append(f"{user_id}: {coins}")
+                        continue
 
-            try:
-                member = await ctx.guild.fetch_member(user_id)
                 entries.append(f"{member.mention}: {coins}")
-            except discord.NotFound:
-                # continue if not in guild
-                continue
-            except Exception as exc:
-                logger.critical(f"Unhandled exception in view all: {exc}")
 
-        source = NormalPageSource(entries, per_page=10)
+            return entries, total
+
+        source = await QueryPageSource.create(fetch_page, per_page=10)
+
+        if source.total == 0:
+            return await ctx.send("No one has any coins right now")
+
         menu = DCMenuPages(source)
         await menu.start(ctx)
 
@@ -149,27 +152,23 @@ class Gambling(commands.Cog):
         if amount < 1:
             return await ctx.send("Stake must be positive")
 
-        if not await self.has_amount(ctx.author.id, amount):
-            return await ctx.send(f"You don't have enough coins to stake {amount}")
-
         bitcoin_price = await self.get_btc_price()
 
-        stake = await self.bot.database.get_coin_stake(ctx.author.id)
+        stake = await self.bot.database.stake_coins(
+            ctx.author.id, amount, bitcoin_price
+        )
+
+        if stake is None:
+            return await ctx.send(f"You don't have enough coins to stake {amount}")
 
         singular = "" if amount == 1 else "s"
 
-        if stake is None:
-            await self.bot.database.add_coin_stake(ctx.author.id, amount, bitcoin_price)
-            await self.bot.database.remove_coins(ctx.author.id, amount)
+        if stake.created:
             await ctx.send(f"Staked {amount} coin{singular} at {bitcoin_price}$ BTC")
 
         else:
-            adjusted = await self._adjust_coins(stake.bitcoin_price, stake.coins)
-            total = adjusted + amount
-            await self.bot.database.set_coin_stake(ctx.author.id, total, bitcoin_price)
-            await self.bot.database.remove_coins(ctx.author.id, amount)
             await ctx.send(
-                f"Staked {amount} more coin{singular} for a total of {round(total, 2)}; now at {bitcoin_price}$ BTC"
+                f"Staked {amount} more coin{singular} for a total of {round(stake.coins, 2)}; now at {bitcoin_price}$ BTC"
             )
 
     @coins.command()
@@ -177,16 +176,17 @@ class Gambling(commands.Cog):
         """
         Exit from your stake
         """
-        stake = await self.bot.database.get_coin_stake(ctx.author.id)
+        bitcoin_price = await self.get_btc_price()
 
-        if stake is None:
-            return ctx.send("You have no staked coins")
+        stake_exit = await self.bot.database.exit_coin_stake(
+            ctx.author.id, bitcoin_price
+        )
 
-        exit_coins = floor(await self._adjust_coins(stake.bitcoin_price, stake.coins))
-        change = round(((exit_coins / stake.coins) - 1) * 100, 2)
+        if stake_exit is None:
+            return await ctx.send("You have no staked coins")
 
-        await self.bot.database.add_coins(ctx.author.id, exit_coins)
-        await self.bot.database.clear_coin_stake(ctx.author.id)
+        exit_coins = stake_exit.coins
+        change = round(((exit_coins / stake_exit.staked) - 1) * 100, 2)
 
         singular = "" if exit_coins == 1 else "s"
 
@@ -207,9 +207,6 @@ class Gambling(commands.Cog):
         if bet < 1:
             return await ctx.send("Bet must be positive")
 
-        if not await self.has_amount(ctx.author.id, bet):
-            return await ctx.send(f"You don't have enough coins to bet {bet}")
-
         outcome = random.choice(["h", "t"])
 
         status = "won"
@@ -218,7 +215,13 @@ class Gambling(commands.Cog):
             gain = -bet
             status = "lost"
 
-        await self.bot.database.add_coins(ctx.author.id, gain)
+        # the balance check and update are one statement so concurrent bets can't overdraw
+        new_balance = await self.bot.database.add_coins_if_funded(
+            ctx.author.id, gain, required=bet
+        )
+
+        if new_balance is None:
+            return await ctx.send(f"You don't have enough coins to bet {bet}")
 
         singular = "" if bet == 1 else "s"
 
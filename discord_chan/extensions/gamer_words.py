@@ -720,7 +720,7 @@ class GamerWords(commands.Cog):
         return (
             message.author.bot
             or not message.guild
-            or not await self.bot.feature_manager.is_enabled(
+            or not self.bot.feature_manager.is_enabled(
                 discord_chan.Feature.gamer_words, message.guild.id
             )
         )
@@ -780,7 +780,7 @@ class GamerWords(commands.Cog):
     async def clear_usernames(self):
         await self.bot.wait_until_ready()
         for guild in self.bot.guilds:
-            if not await self.bot.feature_manager.is_enabled(
+            if not self.bot.feature_manager.is_enabled(
                 discord_chan.Feature.gamer_words, guild.id
             ):
                 continue
@@ -811,7 +811,7 @@ class GamerWords(commands.Cog):
         if old_member.display_name == new_member.display_name:
             return
 
-        if not await self.bot.feature_manager.is_enabled(
+        if not self.bot.feature_manager.is_enabled(
             discord_chan.Feature.gamer_words, new_member.guild.id
         ):
             return
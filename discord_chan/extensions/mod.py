@@ -29,7 +29,7 @@ class Mod(commands.Cog, name="mod"):
         """
         Get current feature status
         """
-        enabled, disabled = await self.bot.feature_manager.get_status(ctx.guild.id)
+        enabled, disabled = self.bot.feature_manager.get_status(ctx.guild.id)
         await ctx.send(
             f"enabled: {', '.join(map(attrgetter('name'), enabled))}"
             f"\ndisabled: {', '.join(map(attrgetter('name'), disabled))}"
@@ -48,6 +48,7 @@ class Mod(commands.Cog, name="mod"):
         Toggle a feature
         """
         enabled = await self.bot.feature_manager.toggle(feature, ctx.guild.id)
+        self.bot.dispatch("feature_toggle", ctx.guild, feature, enabled)
 
         if enabled:
             return await ctx.confirm(f"{feature} enabled")
@@ -14,9 +14,11 @@ from loguru import logger
 
 
 import discord_chan
+from discord_chan import metrics
 from discord_chan.typing_helpers import MessageableGuildChannel
 from discord_chan import DiscordChan, SubContext
 from discord_chan.converters import EnumConverter
+from discord_chan.database import Database
 from discord_chan.image import get_bytes
 
 
@@ -169,6 +171,61 @@ class Owner(commands.Cog, name="owner"):
                 )
                 await ctx.prompt("Done?")
 
+    @debug_command.command(name="pool")
+    async def debug_pool(self, ctx: SubContext, queries: int = 10):
+        """
+        Show database pool usage and the queries taking the most total time
+        """
+        database = self.bot.database
+
+        if not isinstance(database, Database):
+            return await ctx.send("Not using a database pool")
+
+        stats = database.get_pool_stats()
+
+        lines = [
+            f"config: {database.pool_config}",
+            f"connections: {stats.size} ({stats.min_size}-{stats.max_size}), "
+            f"{stats.in_use} in use, {stats.idle} idle, {stats.waiting} waiting",
+            database.acquire_wait.render(),
+            database.acquire_timeouts.render(),
+            "",
+        ]
+
+        latencies = [
+            metric
+            for metric in metrics.get_metrics("queries.latency.")
+            if isinstance(metric, metrics.Histogram)
+        ]
+        latencies.sort(key=lambda histogram: histogram.total, reverse=True)
+
+        for histogram in latencies[:queries]:
+            lines.append(histogram.render().removeprefix("queries.latency."))
+
+        paginator = commands.Paginator()
+        for line in lines:
+            paginator.add_line(line)
+
+        for page in paginator.pages:
+            await ctx.send(page)
+
+    @debug_command.command(name="metrics")
+    async def debug_metrics(self, ctx: SubContext, prefix: str = ""):
+        """
+        Show internal metrics, optionally only ones starting with prefix
+        """
+        found = metrics.get_metrics(prefix)
+
+        if not found:
+            return await ctx.send("No metrics found")
+
+        paginator = commands.Paginator()
+        for metric in found:
+            paginator.add_line(metric.render())
+
+        for page in paginator.pages:
+            await ctx.send(page)
+
     @debug_command.command()
     async def error(self, ctx: SubContext):
         raise Exception("test error")
@@ -1,19 +1,24 @@
+import asyncio
 import textwrap
+from datetime import datetime, timedelta
 
 import discord
 import pendulum
 from discord.ext import commands
+from loguru import logger
 
 from discord_chan import DiscordChan, checks
 from discord_chan.context import SubContext
+from discord_chan.converters import DurationConverter
 from discord_chan.menus import (
     DCMenuPages,
     EmbedFieldProxy,
-    EmbedFieldsPageSource,
-    NormalPageSource,
+    QueryEmbedFieldsPageSource,
+    QueryPageSource,
+    StreamEmbedFieldsPageSource,
 )
 from discord_chan.snipe import Snipe as Snipe_obj
-from discord_chan.snipe import SnipeMode
+from discord_chan.snipe import SnipeMode, SnipeWriter
 from discord_chan.features import Feature
 
 
@@ -25,12 +30,90 @@ class SnipeQueryFlags(commands.FlagConverter, delimiter=" ", prefix="--"):
         description="mode (edited/purged/deleted) snipes must have"
     )
     author: discord.Member | None = commands.flag(description="author snipes must have")
-    contains: str | None = commands.flag(description="content snipes must have")
+    contains: str | None = commands.flag(
+        description="text snipes must contain (case-insensitive)"
+    )
+    regex: str | None = commands.flag(
+        description="regex snipes must match (case-insensitive)"
+    )
+    since: timedelta | None = commands.flag(
+        description="how far back snipes can be from (e.g. 12h, 7d)",
+        converter=DurationConverter,
+    )
+
+
+# number of seconds between partition creation and pruning runs
+PARTITION_MAINTENANCE_INTERVAL = 60 * 60 * 12
+# retention for guilds that haven't set one, None keeps snipes forever
+DEFAULT_SNIPE_RETENTION_DAYS: int | None = None
 
 
 class Snipe(commands.Cog, name="snipe"):
     def __init__(self, bot: DiscordChan):
         self.bot = bot
+        self.writer = SnipeWriter(bot.database)
+        # guild_id: days
+        self.retentions: dict[int, int] = {}
+        self._maintenance_task: asyncio.Task | None = None
+        self._compression_task: asyncio.Task | None = None
+
+    async def cog_load(self):
+        self.retentions = await self.bot.database.get_snipe_retentions()
+        self.writer.start()
+        self._maintenance_task = asyncio.create_task(self._partition_maintenance())
+        self._compression_task = asyncio.create_task(self._rewrite_snipe_content())
+
+    async def cog_unload(self):
+        if self._maintenance_task is not None:
+            self._maintenance_task.cancel()
+
+        if self._compression_task is not None:
+            self._compression_task.cancel()
+
+        await self.writer.close()
+
+    async def _partition_maintenance(self):
+        while True:
+            try:
+                await self.bot.database.create_snipe_partitions()
+                dropped = await self.bot.database.drop_expired_snipe_partitions(
+                    default_retention_days=DEFAULT_SNIPE_RETENTION_DAYS
+                )
+            except Exception:
+                logger.exception("Snipe partition maintenance failed")
+            else:
+                if dropped:
+                    logger.info(f"Dropped expired snipe partitions: {dropped}")
+
+            await asyncio.sleep(PARTITION_MAINTENANCE_INTERVAL)
+
+    async def _rewrite_snipe_content(self):
+        try:
+            rewritten = await self.bot.database.rewrite_snipe_content()
+        except Exception:
+            logger.exception("Rewriting existing snipe content failed")
+        else:
+            if rewritten:
+                logger.info(f"Rewrote the content of {rewritten} existing snipes")
+
+    def get_since(self, guild_id: int, since: timedelta | None) -> datetime | None:
+        """
+        Get the oldest time snipes can be from, taking the guild's retention into account
+        """
+        now = pendulum.now("UTC")
+        cutoffs: list[datetime] = []
+
+        if since is not None:
+            cutoffs.append(now - since)
+
+        retention = self.retentions.get(guild_id, DEFAULT_SNIPE_RETENTION_DAYS)
+        if retention is not None:
+            cutoffs.append(now.subtract(days=retention))
+
+        if not cutoffs:
+            return None
+
+        return max(cutoffs)
 
     @commands.Cog.listener("on_message_delete")
     async def snipe_delete(self, message: discord.Message):
@@ -50,9 +133,7 @@ class Snipe(commands.Cog, name="snipe"):
         if message.guild is None:
             return
 
-        if not await self.bot.feature_manager.is_enabled(
-            Feature.snipe, message.guild.id
-        ):
+        if not self.bot.feature_manager.is_enabled(Feature.snipe, message.guild.id):
             return
 
         if message.content:
@@ -66,7 +147,36 @@ class Snipe(commands.Cog, name="snipe"):
                 time=pendulum.now("UTC"),
             )
 
-            await self.bot.database.add_snipe(snipe)
+            await self.writer.put(snipe)
+
+    async def snipe_to_field(
+        self, ctx: commands.Context, snipe: Snipe_obj, *, show_channel: bool = False
+    ) -> EmbedFieldProxy:
+        if ctx.guild is not None:
+            target_author = ctx.guild.get_member(snipe.author)
+        else:
+            target_author = self.bot.get_user(snipe.author)
+
+        if target_author is None:
+            try:
+                target_author = await self.bot.fetch_user(snipe.author)
+            except discord.NotFound:
+                target_author = "[User unreadable]"
+
+        # embed field value's max at 1024 characters
+        if len(snipe.content) >= 1024:
+            content = textwrap.wrap(snipe.content, 1024 - 3)[0] + "..."
+        else:
+            content = snipe.content
+
+        name = f"[{snipe.mode.name}] {target_author} {snipe.discord_timestamp}"
+
+        # field names can't render channel mentions
+        if show_channel and ctx.guild is not None:
+            channel = ctx.guild.get_channel(snipe.channel)
+            name += f" #{channel.name if channel is not None else snipe.channel}"
+
+        return EmbedFieldProxy(name=name, value=content, inline=False)
 
     @commands.bot_has_permissions(embed_links=True)
     @commands.group(name="snipe", invoke_without_command=True)
@@ -83,8 +193,6 @@ class Snipe(commands.Cog, name="snipe"):
         ),
     ):
         """Snipe messages"""
-        negative = index < 0
-
         if abs(index) > 10_000_000:
             return await ctx.send(
                 f"{index} is over the index cap of (-)10,000,000; do you really have that many snipes?"
@@ -100,31 +208,25 @@ class Snipe(commands.Cog, name="snipe"):
         else:
             snipe_channel = ctx.channel
 
-        snipes, snipe_count = await self.bot.database.get_snipes(
+        # make sure snipes still waiting in the queue are visible
+        await self.writer.flush()
+
+        target_snipe, snipe_count = await self.bot.database.get_snipe(
+            index=index,
             server=ctx.guild.id if ctx.guild else 0,
             channel=snipe_channel.id,
             contains=query_flags.contains,
-            limit=abs(index) + 1,
-            negative=negative,
+            regex=query_flags.regex,
             author=query_flags.author.id if query_flags.author else None,
             mode=query_flags.mode,
+            since=self.get_since(ctx.guild.id if ctx.guild else 0, query_flags.since),
         )
-        # snipe_count is the total snipes returned from the quary and total_snipes is
-        # the limit adjusted amount returned
-        total_snipes = len(snipes)
 
-        if total_snipes == 0:
+        if snipe_count == 0:
             return await ctx.send("No snipes found for this query")
 
-        if negative and abs(index) > (total_snipes + 1):
-            return await ctx.send(f"Only {total_snipes} snipes found for this query")
-        elif not negative and index > (total_snipes - 1):
-            return await ctx.send(f"Only {total_snipes} snipes found for this query")
-
-        if negative:
-            target_snipe = snipes[abs(index) - 1]
-        else:
-            target_snipe = snipes[index]
+        if target_snipe is None:
+            return await ctx.send(f"Only {snipe_count} snipes found for this query")
 
         if ctx.guild is not None:
             target_author = ctx.guild.get_member(target_snipe.author)
@@ -163,85 +265,167 @@ class Snipe(commands.Cog, name="snipe"):
         else:
             snipe_channel = ctx.channel
 
-        snipes, _ = await self.bot.database.get_snipes(
-            server=ctx.guild.id if ctx.guild else 0,
-            channel=snipe_channel.id,
-            contains=query_flags.contains,
-            author=query_flags.author.id if query_flags.author else None,
-            mode=query_flags.mode,
+        await self.writer.flush()
+
+        server = ctx.guild.id if ctx.guild else 0
+        since = self.get_since(server, query_flags.since)
+
+        # pages are streamed as they're reached so the first one shows
+        # just as fast no matter how many snipes the channel has
+        async def fetch_after(before: Snipe_obj | None, limit: int) -> list[Snipe_obj]:
+            return await self.bot.database.get_snipes_before(
+                before=before,
+                limit=limit,
+                server=server,
+                channel=snipe_channel.id,
+                contains=query_flags.contains,
+                regex=query_flags.regex,
+                author=query_flags.author.id if query_flags.author else None,
+                mode=query_flags.mode,
+                since=since,
+            )
+
+        async def to_field(snipe: Snipe_obj) -> EmbedFieldProxy:
+            return await self.snipe_to_field(ctx, snipe)
+
+        source = await StreamEmbedFieldsPageSource.create(
+            fetch_after, per_page=4, to_field=to_field
         )
-        total_snipes = len(snipes)
 
-        if total_snipes == 0:
+        if source.is_empty:
             return await ctx.send("No snipes found for this query")
 
-        field_proxies: list[EmbedFieldProxy] = []
+        menu = DCMenuPages(source)
 
-        for snipe in snipes:
-            # TODO: add lazy loading of usernames
-            if ctx.guild is not None:
-                target_author = ctx.guild.get_member(snipe.author)
-            else:
-                target_author = self.bot.get_user(snipe.author)
+        await menu.start(ctx)
 
-            if target_author is None:
-                try:
-                    target_author = await self.bot.fetch_user(snipe.author)
-                except discord.NotFound:
-                    target_author = "[User unreadable]"
+    async def search(self, ctx: SubContext, query: str, *, regex: bool):
+        # only search channels the author could read the messages of
+        channels = [
+            channel.id
+            for channel in ctx.guild.text_channels
+            if channel.permissions_for(ctx.author).read_message_history
+            and (not channel.nsfw or getattr(ctx.channel, "nsfw", False))
+        ]
+        since = self.get_since(ctx.guild.id, None)
+        per_page = 4
+
+        await self.writer.flush()
+
+        async def fetch_page(
+            offset: int, limit: int
+        ) -> tuple[list[EmbedFieldProxy], int]:
+            snipes, total = await self.bot.database.search_snipes(
+                server=ctx.guild.id,
+                query=query,
+                regex=regex,
+                channels=channels,
+                since=since,
+                limit=limit,
+                offset=offset,
+            )
+            fields = [
+                await self.snipe_to_field(ctx, snipe, show_channel=True)
+                for snipe in snipes
+            ]
+            return fields, total
 
-            # embed field value's max at 1024 characters
-            if len(snipe.content) >= 1024:
-                content = textwrap.wrap(snipe.content, 1024 - 3)[0] + "..."
-            else:
-                content = snipe.content
+        source = await QueryEmbedFieldsPageSource.create(fetch_page, per_page=per_page)
 
-            field_proxies.append(
-                EmbedFieldProxy(
-                    name=f"[{snipe.mode.name}] {target_author} {snipe.discord_timestamp}",
-                    value=content,
-                    inline=False,
-                )
-            )
+        if source.total == 0:
+            return await ctx.send("No snipes found for this query")
 
-        source = EmbedFieldsPageSource(field_proxies, per_page=4)
+        source.title = f"{source.total} match(es)"
         menu = DCMenuPages(source)
 
         await menu.start(ctx)
 
+    @snipe_command.group(name="search", invoke_without_command=True)
+    @commands.guild_only()
+    async def snipe_command_search(self, ctx: SubContext, *, query: str):
+        """
+        Search snipes from every channel you can see, best matches first
+
+        very long snipes are stored compressed and can't be searched
+        """
+        await self.search(ctx, query, regex=False)
+
+    @snipe_command_search.command(name="regex")
+    async def snipe_command_search_regex(self, ctx: SubContext, *, pattern: str):
+        """
+        Search snipes with a case-insensitive regex
+        """
+        await self.search(ctx, pattern, regex=True)
+
     @snipe_command.command(name="stat")
     @commands.guild_only()
     async def snipe_command_stat(self, ctx: SubContext):
         """
         Get stats on who has the most snipes
         """
-        leaderboard = await self.bot.database.get_snipe_leaderboard(ctx.guild.id)
+        await self.writer.flush()
 
-        entries: list[str] = []
-
-        for author_id, count in leaderboard.items():
-            author = ctx.guild.get_member(author_id)
+        async def fetch_page(offset: int, limit: int) -> tuple[list[str], int]:
+            entries, total = await self.bot.database.get_snipe_leaderboard(
+                ctx.guild.id, limit=limit, offset=offset
+            )
 
-            if author is None:
-                try:
-                    author = await self.bot.fetch_user(author_id)
+            lines: list[str] = []
+            for author_id, count in entries:
+                author = ctx.guild.get_member(author_id)
+
+                if author is None:
+                    try:
+                        author = await self.bot.fetch_user(author_id)
+                        author_name = author.display_name
+                    except discord.NotFound:
+                        author_name = f"[Unresolvable ID ({author_id})]"
+                else:
                     author_name = author.display_name
-                except discord.NotFound:
-                    author_name = f"[Unresolvable ID ({author_id})]"
-            else:
-                author_name = author.display_name
 
-            entries.append(f"- {author_name}: {count}")
+                lines.append(f"- {author_name}: {count}")
 
-        _, total = await self.bot.database.get_snipes(server=ctx.guild.id)
+            return lines, total
 
-        entries = [f"total = {total}", ""] + entries
-
-        source = NormalPageSource(entries, per_page=10)
+        total = await self.bot.database.count_snipes(server=ctx.guild.id)
+        source = await QueryPageSource.create(
+            fetch_page, per_page=10, header=f"total = {total}"
+        )
         menu = DCMenuPages(source)
 
         await menu.start(ctx)
 
+    @snipe_command.group(name="retention", invoke_without_command=True)
+    @commands.guild_only()
+    async def snipe_command_retention(self, ctx: SubContext):
+        """
+        Show how long snipes are kept for this server
+        """
+        retention = self.retentions.get(ctx.guild.id, DEFAULT_SNIPE_RETENTION_DAYS)
+
+        if retention is None:
+            return await ctx.send("Snipes are kept forever")
+
+        await ctx.send(f"Snipes are kept for {retention} day(s)")
+
+    @snipe_command_retention.command(name="set")
+    @checks.guild_owner()
+    async def snipe_command_retention_set(self, ctx: SubContext, days: int):
+        """
+        Set how many days snipes are kept for, 0 keeps them forever
+        """
+        if days < 0:
+            raise commands.BadArgument("Retention can't be negative")
+
+        if days == 0:
+            await self.bot.database.set_snipe_retention(ctx.guild.id, None)
+            self.retentions.pop(ctx.guild.id, None)
+        else:
+            await self.bot.database.set_snipe_retention(ctx.guild.id, days)
+            self.retentions[ctx.guild.id] = days
+
+        await ctx.confirm("Retention updated")
+
 
 async def setup(bot):
     await bot.add_cog(Snipe(bot))
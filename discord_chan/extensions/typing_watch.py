@@ -29,7 +29,7 @@ class TypingWatch(commands.Cog, name="typing_watch"):
         # should only have members in a TextChannel
         assert isinstance(user, discord.Member)
 
-        if not await self.bot.feature_manager.is_enabled(
+        if not self.bot.feature_manager.is_enabled(
             discord_chan.Feature.typing_watch, channel.guild.id
         ):
             return
@@ -47,11 +47,8 @@ class TypingWatch(commands.Cog, name="typing_watch"):
     async def _typing_wait_task(
         self, user: discord.Member, channel: discord.TextChannel
     ):
-        def _predicate(message: discord.Message):
-            return message.author.id == user.id and message.channel.id == channel.id
-
         try:
-            await self.bot.wait_for("message", check=_predicate, timeout=300)
+            await self.bot.wait_for_key("message", (channel.id, user.id), timeout=300)
         except asyncio.TimeoutError:
             # TODO: make this send an image showing them typing instead
             await channel.send(f"{user.display_name} typed without sending a message")
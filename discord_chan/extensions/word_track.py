@@ -1,51 +1,177 @@
 import asyncio
-import contextlib
-import re
+import functools
+from collections.abc import Awaitable, Callable
+from datetime import timedelta
 
 import discord
+import pendulum
 from discord.ext import commands
+from loguru import logger
 
 import discord_chan
 from discord_chan import DiscordChan
 from discord_chan.context import SubContext
-from discord_chan.menus import DCMenuPages, NormalPageSource
+from discord_chan.converters import DurationConverter
+from discord_chan.storage import LeaderboardEntry, UsageResolution, word_usage_cutoffs
+from discord_chan.menus import DCMenuPages, NormalPageSource, QueryPageSource
 from discord_chan.checks import feature_enabled
 from discord_chan.features import Feature
+from discord_chan.heavy_hitters import HeavyHitter, HeavyHitters
+from discord_chan.tokenizer import TokenizerMode, tokenize, tokenize_many
+from discord_chan.word_track import (
+    EditWindow,
+    PendingMessage,
+    WordTrackBackfill,
+    WordTrackBuffer,
+)
 
 # number of seconds to wait for edits to messages before consuming
 EDIT_GRACE_TIME = 15
 WORD_SIZE_LIMIT = 20
+# words already counted were split with the mode in use then, changing it
+# means the same text can be counted as different words
+TOKENIZER_MODE = TokenizerMode.ascii
+# number of seconds between compacting old word usage buckets
+USAGE_COMPACTION_INTERVAL = 60 * 60
+TREND_BAR_WIDTH = 20
+# members listed under a word's rank
+RANK_TOP_AUTHORS = 5
+# number of seconds between saving heavy hitter snapshots
+HEAVY_HITTER_SNAPSHOT_INTERVAL = 5 * 60
+HEAVY_HITTER_LIMIT = 50
+
+
+def countable_words(words: list[str]) -> list[str]:
+    # most words are under 15 characters
+    return [word for word in set(words) if len(word) <= WORD_SIZE_LIMIT]
+
+
+def split_messages(contents: list[str]) -> list[list[str]]:
+    return [countable_words(words) for words in tokenize_many(contents, TOKENIZER_MODE)]
+
+
+class WordsTopFlags(commands.FlagConverter, delimiter=" ", prefix="--"):
+    since: timedelta = commands.flag(
+        default=timedelta(days=7),
+        description="how far back to count words from (e.g. 12h, 7d)",
+        converter=DurationConverter,
+    )
+    authors: bool = commands.flag(
+        default=False, description="rank members instead of words"
+    )
 
 
 class WordTrack(commands.Cog):
     def __init__(self, bot: DiscordChan):
         self.bot = bot
+        self.buffer = WordTrackBuffer(bot.database)
+        self.edit_window = EditWindow(EDIT_GRACE_TIME, self.consume_message)
+        self.heavy_hitters = HeavyHitters()
+        self.backfill = WordTrackBackfill(
+            bot.database,
+            bot.get_channel,
+            split_messages,
+            is_enabled=lambda server_id: bot.feature_manager.is_enabled(
+                Feature.word_track, server_id
+            ),
+            concurrency=bot.backfill_concurrency,
+        )
+        self._compaction_task: asyncio.Task | None = None
+        self._snapshot_task: asyncio.Task | None = None
+        self._resume_task: asyncio.Task | None = None
 
-    async def consume_message(self, message: discord.Message):
-        words = self.split_words(message.content)
+    async def cog_load(self):
+        self.heavy_hitters.restore(await self.bot.database.get_heavy_hitter_snapshots())
 
-        # if their message was just "?" we'd get an empty list
-        if not words:
-            return
+        self.buffer.start()
+        self.edit_window.start()
+        self._compaction_task = asyncio.create_task(self._compact_word_usage())
+        self._snapshot_task = asyncio.create_task(self._save_heavy_hitters())
+        self._resume_task = asyncio.create_task(self._resume_backfills())
+
+    async def cog_unload(self):
+        if self._compaction_task is not None:
+            self._compaction_task.cancel()
+
+        if self._snapshot_task is not None:
+            self._snapshot_task.cancel()
+
+        if self._resume_task is not None:
+            self._resume_task.cancel()
+
+        await self.backfill.close()
+
+        # messages still in their grace time are counted as they are now
+        self.edit_window.close()
+        await self.buffer.close()
+
+        await self.bot.database.save_heavy_hitter_snapshots(
+            self.heavy_hitters.snapshots()
+        )
 
-        assert message.guild is not None
+    async def _compact_word_usage(self):
+        while True:
+            try:
+                await self.bot.database.compact_word_usage()
+            except Exception:
+                logger.exception("Compacting word usage failed")
 
-        for word in set(words):
-            # most words are under 15 characters
-            if len(word) > WORD_SIZE_LIMIT:
-                continue
+            await asyncio.sleep(USAGE_COMPACTION_INTERVAL)
 
-            await self.bot.database.update_word_track_word(
-                server_id=message.guild.id,
-                author_id=message.author.id,
-                word=word,
-                amount=1,
+    async def _save_heavy_hitters(self):
+        while True:
+            await asyncio.sleep(HEAVY_HITTER_SNAPSHOT_INTERVAL)
+
+            try:
+                await self.bot.database.save_heavy_hitter_snapshots(
+                    self.heavy_hitters.snapshots()
+                )
+            except Exception:
+                logger.exception("Saving heavy hitter snapshots failed")
+
+    async def _resume_backfills(self):
+        # channels can only be found once the guilds are loaded
+        await self.bot.wait_until_ready()
+
+        try:
+            checkpoints = await self.bot.database.get_word_track_backfill()
+        except Exception:
+            return logger.exception("Loading word track backfills failed")
+
+        self.backfill.resume(
+            checkpoint
+            for checkpoint in checkpoints
+            if self.bot.feature_manager.is_enabled(
+                Feature.word_track, checkpoint.server_id
             )
+        )
 
-    @staticmethod
-    def split_words(entry: str) -> list[str]:
-        entry = re.sub(r"[^a-zA-Z _']", " ", entry.lower())
-        return [e for e in entry.split(" ") if len(e) > 0]
+    @commands.Cog.listener("on_feature_toggle")
+    async def feature_toggle_event(
+        self, guild: discord.Guild, feature: Feature, enabled: bool
+    ):
+        if feature is not Feature.word_track or not enabled:
+            return
+
+        # everything sent from here on is counted live
+        before = discord.utils.time_snowflake(discord.utils.utcnow())
+        channel_ids = [
+            channel.id
+            for channel in guild.text_channels
+            if channel.permissions_for(guild.me).read_message_history
+        ]
+
+        await self.backfill.start(guild.id, channel_ids, before)
+
+    def consume_message(self, message: PendingMessage):
+        words = countable_words(tokenize(message.content, TOKENIZER_MODE))
+
+        # if their message was just "?" we'd get an empty list
+        if not words:
+            return
+
+        self.buffer.add(message.server_id, message.author_id, words)
+        self.heavy_hitters.add(message.server_id, message.channel_id, words)
 
     @commands.Cog.listener("on_message")
     async def message_event(self, message: discord.Message):
@@ -56,24 +182,38 @@ class WordTrack(commands.Cog):
         if message.guild is None:
             return
 
-        if not await self.bot.feature_manager.is_enabled(
+        if not self.bot.feature_manager.is_enabled(
             discord_chan.Feature.word_track, message.guild.id
         ):
             return
 
-        async def _wait_for_edits():
-            edited_message = message
+        # the last edit made within the grace time is what gets counted
+        self.edit_window.add(
+            message.id,
+            PendingMessage(
+                message.guild.id,
+                message.channel.id,
+                message.author.id,
+                message.content,
+            ),
+        )
 
-            with contextlib.suppress(asyncio.CancelledError):
-                while True:
-                    edited_message = await self.bot.wait_for(
-                        "message", check=lambda m: m.id == message.id
-                    )
+    # raw events so edits and deletes of uncached messages are seen too,
+    # only messages still in the edit window are affected
+    @commands.Cog.listener("on_raw_message_edit")
+    async def message_edit_event(self, payload: discord.RawMessageUpdateEvent):
+        self.edit_window.edit(payload.message_id, payload.message.content)
 
-            return edited_message
+    @commands.Cog.listener("on_raw_message_delete")
+    async def message_delete_event(self, payload: discord.RawMessageDeleteEvent):
+        self.edit_window.remove(payload.message_id)
 
-        message = await asyncio.wait_for(_wait_for_edits(), timeout=EDIT_GRACE_TIME)
-        await self.consume_message(message)
+    @commands.Cog.listener("on_raw_bulk_message_delete")
+    async def bulk_message_delete_event(
+        self, payload: discord.RawBulkMessageDeleteEvent
+    ):
+        for message_id in payload.message_ids:
+            self.edit_window.remove(message_id)
 
     @commands.group(name="words", invoke_without_command=True, aliases=["word"])
     @commands.guild_only()
@@ -82,19 +222,18 @@ class WordTrack(commands.Cog):
         """
         Get word count leaderboard for the server
         """
-        leaderboard = await self.bot.database.get_server_word_track_leaderboard(
-            server_id=ctx.guild.id
-        )
 
-        if not leaderboard:
-            return await ctx.send("No results found")
+        async def fetch_page(offset: int, limit: int) -> tuple[list[str], int]:
+            entries, total = await self.bot.database.get_server_word_leaderboard_page(
+                server_id=ctx.guild.id, limit=limit, offset=offset
+            )
+            return [f"- {word}: {count}" for word, count in entries], total
 
-        entries: list[str] = []
+        source = await QueryPageSource.create(fetch_page, per_page=10)
 
-        for word, count in leaderboard.items():
-            entries.append(f"- {word}: {count}")
+        if source.total == 0:
+            return await ctx.send("No results found")
 
-        source = NormalPageSource(entries, per_page=10)
         menu = DCMenuPages(source)
 
         await menu.start(ctx)
@@ -104,23 +243,25 @@ class WordTrack(commands.Cog):
         self, ctx: SubContext, member: discord.Member = commands.Author, *words: str
     ):
         """
-        Get word count leaderboard for a member
+        Get word count leaderboard for a member, or only some words
         """
-        leaderboard = await self.bot.database.get_server_word_track_leaderboard(
-            server_id=ctx.guild.id,
-            author_id=member.id,
-        )
+        if words:
+            # we only store lowercase versions of words
+            leaderboard = await self.bot.database.get_member_word_counts(
+                server_id=ctx.guild.id,
+                author_id=member.id,
+                words=[word.lower() for word in words],
+            )
+        else:
+            leaderboard = await self.bot.database.get_server_word_track_leaderboard(
+                server_id=ctx.guild.id,
+                author_id=member.id,
+            )
 
         if not leaderboard:
             return await ctx.send("No results found")
 
-        entries: list[str] = []
-
-        for word, count in leaderboard.items():
-            if words and word not in words:
-                continue
-
-            entries.append(f"- {word}: {count}")
+        entries = [f"- {word}: {count}" for word, count in leaderboard.items()]
 
         source = NormalPageSource(entries, per_page=10)
         menu = DCMenuPages(source)
@@ -134,16 +275,15 @@ class WordTrack(commands.Cog):
         """
         Get word count stats for a member
         """
-        leaderboard = await self.bot.database.get_server_word_track_leaderboard(
+        stats = await self.bot.database.get_member_word_track_stats(
             server_id=ctx.guild.id,
             author_id=member.id,
         )
 
-        if not leaderboard:
+        if stats is None:
             return await ctx.send("No results found")
 
-        unique_words = len(leaderboard.keys())
-        total_words = sum(leaderboard.values())
+        unique_words, total_words = stats
 
         word_density = unique_words / total_words
 
@@ -161,83 +301,225 @@ class WordTrack(commands.Cog):
         # we only store lowercase versions of words
         word = word.lower()
 
-        server_leaderboard = await self.bot.database.get_server_word_track_leaderboard(
-            server_id=ctx.guild.id
+        rank = await self.bot.database.get_word_rank(
+            server_id=ctx.guild.id, word=word, limit=RANK_TOP_AUTHORS
         )
 
-        if not server_leaderboard:
-            return await ctx.send("word has not been used in server")
-
-        try:
-            server_count = server_leaderboard[word]
-        except KeyError:
+        if rank is None:
             return await ctx.send("word has not been used in server")
 
-        server_rank = list(server_leaderboard.keys()).index(word) + 1
-
-        member_loaderboard = await self.bot.database.get_member_bound_word_rank(
-            server_id=ctx.guild.id, word=word
-        )
-
-        # this shouldn't be possible
-        if not member_loaderboard:
-            raise RuntimeError("somehow word was not found for member lookup")
-
         message_parts = [
-            f"server count: {server_count}",
-            f"server rank: {server_rank}",
+            f"server count: {rank.server_count}",
+            f"server rank: {rank.server_rank}",
             "",
         ]
 
-        for user_id, count in member_loaderboard[:5]:
+        for user_id, count in rank.top_authors:
             user_name = await ctx.bot.get_member_reference(ctx, user_id)
             message_parts.append(f"{user_name}: {count}")
 
         await ctx.send("\n".join(message_parts))
 
-    @words_command.command(name="unique")
-    async def words_unique(self, ctx: SubContext):
-        unique_leaderboard = (
-            await self.bot.database.get_word_track_unique_word_leaderboard(
-                server_id=ctx.guild.id
+    @words_command.command(name="trend")
+    async def words_trend(
+        self, ctx: SubContext, word: str, days: commands.Range[int, 1, 365] = 14
+    ):
+        """
+        Get how often a word was used each day
+
+        days older than a few months are only kept as whole months
+        """
+        word = word.lower()
+        now = pendulum.now("UTC")
+        start = now.start_of("day").subtract(days=days - 1)
+
+        usage = await self.bot.database.get_word_usage(
+            server_id=ctx.guild.id, word=word, since=start
+        )
+
+        if not usage:
+            return await ctx.send("word has not been used in that time")
+
+        # every day in the range gets a line, even ones without any uses
+        _, daily_cutoff = word_usage_cutoffs(now)
+        counts: dict[str, int] = {}
+        for day in range(days):
+            date = start.add(days=day)
+
+            if date < daily_cutoff:
+                counts[date.format("YYYY-MM")] = 0
+            else:
+                counts[date.format("YYYY-MM-DD")] = 0
+
+        for bucket, resolution, count in usage:
+            if resolution is UsageResolution.month:
+                label = bucket.strftime("%Y-%m")
+            else:
+                label = bucket.strftime("%Y-%m-%d")
+
+            # the since bound is moved back to the start of its month
+            if label in counts:
+                counts[label] += count
+
+        peak = max(counts.values()) or 1
+        entries = [
+            f"`{label:<10}` {'█' * round(count / peak * TREND_BAR_WIDTH)} {count}"
+            for label, count in counts.items()
+        ]
+
+        menu = DCMenuPages(NormalPageSource(entries, per_page=15))
+        await menu.start(ctx)
+
+    @words_command.command(name="top")
+    async def words_top(self, ctx: SubContext, *, flags: WordsTopFlags):
+        """
+        Get the most used words over a recent period, or the members using the most with --authors
+        """
+        since = pendulum.now("UTC") - flags.since
+
+        if flags.authors:
+            menu = await self.author_leaderboard(
+                ctx,
+                functools.partial(
+                    self.bot.database.get_author_usage_leaderboard, since=since
+                ),
+            )
+
+            if menu is None:
+                return await ctx.send("No words used in that time")
+
+            return await menu.start(ctx)
+
+        async def fetch_page(offset: int, limit: int) -> tuple[list[str], int]:
+            entries, total = await self.bot.database.get_word_usage_leaderboard(
+                server_id=ctx.guild.id, since=since, limit=limit, offset=offset
             )
+            return [f"- {word}: {count}" for word, count in entries], total
+
+        source = await QueryPageSource.create(fetch_page, per_page=10)
+
+        if source.total == 0:
+            return await ctx.send("No words used in that time")
+
+        await DCMenuPages(source).start(ctx)
+
+    async def author_leaderboard(
+        self,
+        ctx: SubContext,
+        get_leaderboard: Callable[..., Awaitable[tuple[list[LeaderboardEntry], int]]],
+    ) -> DCMenuPages | None:
+        async def fetch_page(offset: int, limit: int) -> tuple[list[str], int]:
+            entries, total = await get_leaderboard(
+                server_id=ctx.guild.id, limit=limit, offset=offset
+            )
+
+            # only the members on the shown page get resolved
+            lines: list[str] = []
+            for user_id, count in entries:
+                user_name = await ctx.bot.get_member_reference(ctx, user_id)
+                lines.append(f"{user_name}: {count}")
+
+            return lines, total
+
+        source = await QueryPageSource.create(fetch_page, per_page=10)
+
+        if source.total == 0:
+            return None
+
+        return DCMenuPages(source)
+
+    @staticmethod
+    async def send_heavy_hitters(ctx: SubContext, hitters: list[HeavyHitter]):
+        if not hitters:
+            return await ctx.send("No words used in that time")
+
+        # counts are estimates, a word's count can be up to its error too high
+        entries = [
+            f"- {word}: {count}" + (f" (±{error})" if error else "")
+            for word, count, error in hitters
+        ]
+
+        await DCMenuPages(NormalPageSource(entries, per_page=10)).start(ctx)
+
+    @words_command.command(name="hot")
+    async def words_hot(
+        self,
+        ctx: SubContext,
+        channel: discord.TextChannel | discord.Thread = commands.CurrentChannel,
+    ):
+        """
+        Get the most used words in a channel over the last hour
+
+        counts are approximate and only cover messages since the bot last started tracking the channel
+        """
+        await self.send_heavy_hitters(
+            ctx, self.heavy_hitters.top_channel(channel.id, HEAVY_HITTER_LIMIT)
         )
 
-        if len(unique_leaderboard) == 0:
-            return await ctx.send("Unique leaderboard is empty")
+    @words_command.command(name="today")
+    async def words_today(self, ctx: SubContext):
+        """
+        Get the most used words in the server over the last day
 
-        entries: list[str] = []
+        counts are approximate, see words top for exact ones
+        """
+        await self.send_heavy_hitters(
+            ctx, self.heavy_hitters.top_server(ctx.guild.id, HEAVY_HITTER_LIMIT)
+        )
 
-        for user_id, count in unique_leaderboard:
-            user_name = await ctx.bot.get_member_reference(ctx, user_id)
-            entries.append(f"{user_name}: {count}")
+    @words_command.command(name="global")
+    @commands.is_owner()
+    async def words_global(self, ctx: SubContext):
+        """
+        Get the most used words over every server
 
-        source = NormalPageSource(entries, per_page=10)
-        menu = DCMenuPages(source)
+        counts are approximate
+        """
+        await self.send_heavy_hitters(
+            ctx, self.heavy_hitters.top_all(HEAVY_HITTER_LIMIT)
+        )
+
+    @words_command.command(name="backfill")
+    async def words_backfill(self, ctx: SubContext):
+        """
+        Get the progress of counting the server's messages from before word track was enabled
+        """
+        checkpoints = await self.bot.database.get_word_track_backfill(
+            server_id=ctx.guild.id
+        )
+
+        if not checkpoints:
+            return await ctx.send("No backfill for this server")
+
+        done = sum(checkpoint.done for checkpoint in checkpoints)
+        messages = sum(checkpoint.messages for checkpoint in checkpoints)
+
+        await ctx.send(
+            f"channels done: {done}/{len(checkpoints)}\n"
+            f"channels running: {self.backfill.running(ctx.guild.id)}\n"
+            f"messages read: {messages}"
+        )
+
+    @words_command.command(name="unique")
+    async def words_unique(self, ctx: SubContext):
+        menu = await self.author_leaderboard(
+            ctx, self.bot.database.get_word_track_unique_word_leaderboard
+        )
+
+        if menu is None:
+            return await ctx.send("Unique leaderboard is empty")
 
         await menu.start(ctx)
 
-    # TODO: combine this and unique
     @words_command.command(name="total")
     async def words_total(self, ctx: SubContext):
-        total_leaderboard = (
-            await self.bot.database.get_word_track_total_word_leaderboard(
-                server_id=ctx.guild.id
-            )
+        menu = await self.author_leaderboard(
+            ctx, self.bot.database.get_word_track_total_word_leaderboard
         )
 
-        if len(total_leaderboard) == 0:
+        if menu is None:
             return await ctx.send("Total leaderboard is empty")
 
-        entries: list[str] = []
-
-        for user_id, count in total_leaderboard:
-            user_name = await ctx.bot.get_member_reference(ctx, user_id)
-            entries.append(f"{user_name}: {count}")
-
-        source = NormalPageSource(entries, per_page=10)
-        menu = DCMenuPages(source)
-
         await menu.start(ctx)
 
 
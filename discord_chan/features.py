@@ -1,8 +1,9 @@
+import asyncio
 from enum import Enum
 
 from loguru import logger
 
-from .database import Database
+from .storage import CacheEvent, CacheOperation, Storage
 
 
 class Feature(Enum):
@@ -18,51 +19,88 @@ REMOVED_FEATURES: list[Feature] = [Feature.cope]
 
 
 class FeatureManager:
-    def __init__(self, database: Database) -> None:
+    def __init__(self, database: Storage) -> None:
         self.database = database
 
-        self.cache: dict[int, list[str]] = {}
+        # guild_id: bitmask of enabled features, see feature_bit
+        # every row is loaded up front so a missing guild has nothing enabled
+        self.cache: dict[int, int] = {}
+        self._reload_task: asyncio.Task | None = None
+
+        # keeps the cache current when another process changes features
+        self.database.add_cache_listener("enabled_features", self._on_cache_event)
+
+    @staticmethod
+    def feature_bit(feature: Feature) -> int:
+        return 1 << feature.value
+
+    @classmethod
+    def to_bitmask(cls, feature_names: list[str]) -> int:
+        bitmask = 0
+
+        for feature_name in feature_names:
+            try:
+                bitmask |= cls.feature_bit(Feature[feature_name])
+            except KeyError:
+                logger.warning(f'unknown feature "{feature_name}" in enabled features')
+
+        return bitmask
+
+    async def load(self):
+        """
+        Load the enabled features of every guild
+        """
+        enabled_features = await self.database.get_all_enabled_features()
+        self.cache = {
+            guild_id: self.to_bitmask(feature_names)
+            for guild_id, feature_names in enabled_features.items()
+        }
+        logger.info(f"Loaded enabled features for {len(self.cache)} guilds")
+
+    def _on_cache_event(self, event: CacheEvent):
+        if event.key is not None and event.operation in (
+            CacheOperation.insert,
+            CacheOperation.delete,
+        ):
+            bitmask = self.cache.get(event.key, 0)
+            bit = self.to_bitmask([event.value or ""])
+
+            if event.operation is CacheOperation.insert:
+                self.cache[event.key] = bitmask | bit
+            else:
+                self.cache[event.key] = bitmask & ~bit
 
-    async def _refresh_cache(self, guild_id: int):
-        # note: empty list is accepted
-        self.cache[guild_id] = await self.database.get_guild_enabled_features(guild_id)
+            return
 
-    async def _drop_cache(self):
-        self.cache = {}
+        # updates don't say what the old feature was and resets mean events were missed
+        if self._reload_task is None or self._reload_task.done():
+            self._reload_task = asyncio.create_task(self.load())
 
-    async def is_enabled(self, feature: Feature, guild_id: int) -> bool:
+    def is_enabled(self, feature: Feature, guild_id: int) -> bool:
         # in theory this shouldn't pass
         if feature in REMOVED_FEATURES:
             logger.warning(f'removed feature "{feature}" requested')
             return False
 
-        feature_string = feature.name
-
-        if self.cache.get(guild_id):
-            return feature_string in self.cache[guild_id]
-
-        await self._refresh_cache(guild_id)
-        return feature_string in self.cache[guild_id]
+        return (self.cache.get(guild_id, 0) & self.feature_bit(feature)) != 0
 
     async def set_enabled(self, feature: Feature, guild_id: int):
         await self.database.enable_guild_enabled_feature(guild_id, feature.name)
-        await self._refresh_cache(guild_id)
+        self.cache[guild_id] = self.cache.get(guild_id, 0) | self.feature_bit(feature)
 
     async def set_disabled(self, feature: Feature, guild_id: int):
         await self.database.disable_guild_enabled_feature(guild_id, feature.name)
-        await self._refresh_cache(guild_id)
+        self.cache[guild_id] = self.cache.get(guild_id, 0) & ~self.feature_bit(feature)
 
     async def toggle(self, feature: Feature, guild_id: int):
-        if await self.is_enabled(feature, guild_id):
+        if self.is_enabled(feature, guild_id):
             await self.set_disabled(feature, guild_id)
             return False
         else:
             await self.set_enabled(feature, guild_id)
             return True
 
-    async def get_status(self, guild_id: int) -> tuple[list[Feature], list[Feature]]:
-        await self._refresh_cache(guild_id)
-
+    def get_status(self, guild_id: int) -> tuple[list[Feature], list[Feature]]:
         enabled: list[Feature] = []
         disabled: list[Feature] = []
 
@@ -70,7 +108,7 @@ class FeatureManager:
             if feature in REMOVED_FEATURES:
                 continue
 
-            if feature.name in self.cache[guild_id]:
+            if self.is_enabled(feature, guild_id):
                 enabled.append(feature)
             else:
                 disabled.append(feature)
@@ -79,4 +117,7 @@ class FeatureManager:
 
     async def purge_feature(self, feature: Feature):
         await self.database.purge_feature(feature.name)
-        await self._drop_cache()
+
+        bit = self.feature_bit(feature)
+        for guild_id, bitmask in self.cache.items():
+            self.cache[guild_id] = bitmask & ~bit
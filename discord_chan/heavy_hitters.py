@@ -0,0 +1,342 @@
+import heapq
+import json
+import time
+from collections.abc import Iterable
+from enum import Enum
+from typing import NamedTuple
+
+from . import metrics
+from .utils import LRU
+
+# words kept per sketch, counts are exact for any word counted more than
+# total / capacity times in a sketch
+CHANNEL_CAPACITY = 50
+SERVER_CAPACITY = 200
+GLOBAL_CAPACITY = 1000
+# channels are kept for the last hour in 10 minute windows
+CHANNEL_WINDOW_SECONDS = 10 * 60
+CHANNEL_WINDOWS = 6
+# servers for the last day in hour windows
+SERVER_WINDOW_SECONDS = 60 * 60
+SERVER_WINDOWS = 24
+# least recently used channels are dropped past this
+MAX_TRACKED_CHANNELS = 2_000
+
+
+class HeavyHitterScope(Enum):
+    channel = "channel"
+    server = "server"
+    # scope_id is always 0
+    all = "all"
+
+
+class HeavyHitter(NamedTuple):
+    word: str
+    count: int
+    # count can be up to this much higher than the real count
+    error: int
+
+
+class HeavyHitterSnapshot(NamedTuple):
+    scope: HeavyHitterScope
+    scope_id: int
+    # json of a sketch's to_dict
+    data: str
+    # when every window in the snapshot is too old to be read, None never expires
+    expires: float | None
+
+
+class SpaceSaving:
+    """
+    Approximate top-k counter that never holds more than capacity words
+
+    a new word replaces the lowest counted one and takes over its count,
+    see Metwally et al. "Efficient Computation of Frequent and Top-k Elements in Data Streams"
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts: dict[str, int] = {}
+        self.errors: dict[str, int] = {}
+        # (count, word) for every counted word, counts here are only updated when
+        # looking for the minimum, counts only go up so a stale one is always too low
+        self._heap: list[tuple[int, str]] = []
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def _pop_min(self) -> tuple[int, str]:
+        while True:
+            count, word = heapq.heappop(self._heap)
+
+            if self.counts[word] == count:
+                return count, word
+
+            heapq.heappush(self._heap, (self.counts[word], word))
+
+    @property
+    def min_count(self) -> int:
+        """
+        The most a word that isn't counted could have been seen
+        """
+        if len(self.counts) < self.capacity:
+            return 0
+
+        count, word = self._pop_min()
+        heapq.heappush(self._heap, (count, word))
+        return count
+
+    def add(self, word: str, amount: int = 1):
+        count = self.counts.get(word)
+
+        if count is not None:
+            self.counts[word] = count + amount
+            return
+
+        if len(self.counts) < self.capacity:
+            self.counts[word] = amount
+            self.errors[word] = 0
+            heapq.heappush(self._heap, (amount, word))
+            return
+
+        min_count, evicted = self._pop_min()
+        del self.counts[evicted]
+        del self.errors[evicted]
+
+        self.counts[word] = min_count + amount
+        self.errors[word] = min_count
+        heapq.heappush(self._heap, (min_count + amount, word))
+
+    def top(self, limit: int) -> list[HeavyHitter]:
+        return heapq.nlargest(
+            limit,
+            (
+                HeavyHitter(word, count, self.errors[word])
+                for word, count in self.counts.items()
+            ),
+            key=lambda hitter: (hitter.count, hitter.word),
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "words": [
+                [word, count, self.errors[word]] for word, count in self.counts.items()
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict, capacity: int):
+        sketch = cls(capacity)
+
+        # a sketch saved with a bigger capacity only keeps its top words
+        words = sorted(data["words"], key=lambda word: word[1], reverse=True)
+        for word, count, error in words[: sketch.capacity]:
+            sketch.counts[word] = count
+            sketch.errors[word] = error
+            sketch._heap.append((count, word))
+
+        heapq.heapify(sketch._heap)
+        return sketch
+
+
+class WindowedSpaceSaving:
+    """
+    SpaceSaving sketches for consecutive windows of time, reads merge the unexpired ones
+    """
+
+    def __init__(self, capacity: int, *, window_seconds: int, windows: int):
+        self.capacity = capacity
+        self.window_seconds = window_seconds
+        self.windows = windows
+        # window start: sketch, oldest first
+        self.sketches: dict[int, SpaceSaving] = {}
+
+    def _expire(self, now: float):
+        oldest = self._window_start(now) - (self.windows - 1) * self.window_seconds
+
+        for start in list(self.sketches):
+            if start >= oldest:
+                break
+
+            del self.sketches[start]
+
+    def _window_start(self, now: float) -> int:
+        # aligned to the epoch so windows line up across restarts
+        return int(now // self.window_seconds * self.window_seconds)
+
+    @property
+    def expires(self) -> float | None:
+        if not self.sketches:
+            return None
+
+        return max(self.sketches) + self.windows * self.window_seconds
+
+    def add(self, words: Iterable[str], now: float):
+        start = self._window_start(now)
+        sketch = self.sketches.get(start)
+
+        if sketch is None:
+            self._expire(now)
+            sketch = self.sketches[start] = SpaceSaving(self.capacity)
+
+        for word in words:
+            sketch.add(word)
+
+    def top(self, limit: int, now: float) -> list[HeavyHitter]:
+        self._expire(now)
+
+        counts: dict[str, int] = {}
+        errors: dict[str, int] = {}
+
+        for sketch in self.sketches.values():
+            for word, count in sketch.counts.items():
+                counts[word] = counts.get(word, 0) + count
+                errors[word] = errors.get(word, 0) + sketch.errors[word]
+
+        # a word missing from a full window could have been counted up to its minimum there
+        for sketch in self.sketches.values():
+            min_count = sketch.min_count
+
+            if min_count == 0:
+                continue
+
+            for word in counts.keys() - sketch.counts.keys():
+                counts[word] += min_count
+                errors[word] += min_count
+
+        return heapq.nlargest(
+            limit,
+            (HeavyHitter(word, count, errors[word]) for word, count in counts.items()),
+            key=lambda hitter: (hitter.count, hitter.word),
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "windows": [
+                [start, sketch.to_dict()] for start, sketch in self.sketches.items()
+            ]
+        }
+
+    def restore(self, data: dict, now: float):
+        for start, sketch in data["windows"]:
+            self.sketches[start] = SpaceSaving.from_dict(sketch, self.capacity)
+
+        self._expire(now)
+
+
+class HeavyHitters:
+    """
+    The most used words per channel over the last hour, per server over the
+    last day and over all servers for all time, in bounded memory
+    """
+
+    def __init__(self):
+        self.channels: LRU = LRU(maxsize=MAX_TRACKED_CHANNELS)
+        self.servers: dict[int, WindowedSpaceSaving] = {}
+        self.all = SpaceSaving(GLOBAL_CAPACITY)
+
+        metrics.gauge("heavy_hitters.channels", lambda: len(self.channels))
+
+    @staticmethod
+    def _new_channel() -> WindowedSpaceSaving:
+        return WindowedSpaceSaving(
+            CHANNEL_CAPACITY,
+            window_seconds=CHANNEL_WINDOW_SECONDS,
+            windows=CHANNEL_WINDOWS,
+        )
+
+    @staticmethod
+    def _new_server() -> WindowedSpaceSaving:
+        return WindowedSpaceSaving(
+            SERVER_CAPACITY,
+            window_seconds=SERVER_WINDOW_SECONDS,
+            windows=SERVER_WINDOWS,
+        )
+
+    def add(
+        self,
+        server_id: int,
+        channel_id: int,
+        words: Iterable[str],
+        *,
+        now: float | None = None,
+    ):
+        now = now or time.time()
+        words = list(words)
+
+        channel = self.channels.get(channel_id)
+        if channel is None:
+            channel = self.channels[channel_id] = self._new_channel()
+        else:
+            self.channels.move_to_end(channel_id)
+
+        channel.add(words, now)
+
+        server = self.servers.get(server_id)
+        if server is None:
+            server = self.servers[server_id] = self._new_server()
+
+        server.add(words, now)
+
+        for word in words:
+            self.all.add(word)
+
+    def top_channel(self, channel_id: int, limit: int) -> list[HeavyHitter]:
+        channel = self.channels.get(channel_id)
+
+        if channel is None:
+            return []
+
+        return channel.top(limit, time.time())
+
+    def top_server(self, server_id: int, limit: int) -> list[HeavyHitter]:
+        server = self.servers.get(server_id)
+
+        if server is None:
+            return []
+
+        return server.top(limit, time.time())
+
+    def top_all(self, limit: int) -> list[HeavyHitter]:
+        return self.all.top(limit)
+
+    def snapshots(self) -> list[HeavyHitterSnapshot]:
+        snapshots = [
+            HeavyHitterSnapshot(
+                HeavyHitterScope.all, 0, json.dumps(self.all.to_dict()), None
+            )
+        ]
+
+        for scope, sketches in (
+            (HeavyHitterScope.channel, self.channels),
+            (HeavyHitterScope.server, self.servers),
+        ):
+            for scope_id, sketch in sketches.items():
+                if sketch.sketches:
+                    snapshots.append(
+                        HeavyHitterSnapshot(
+                            scope,
+                            scope_id,
+                            json.dumps(sketch.to_dict()),
+                            sketch.expires,
+                        )
+                    )
+
+        return snapshots
+
+    def restore(self, snapshots: Iterable[HeavyHitterSnapshot]):
+        now = time.time()
+
+        for scope, scope_id, data, _ in snapshots:
+            data = json.loads(data)
+
+            match scope:
+                case HeavyHitterScope.all:
+                    self.all = SpaceSaving.from_dict(data, GLOBAL_CAPACITY)
+                case HeavyHitterScope.channel:
+                    channel = self.channels[scope_id] = self._new_channel()
+                    channel.restore(data, now)
+                case HeavyHitterScope.server:
+                    server = self.servers[scope_id] = self._new_server()
+                    server.restore(data, now)
@@ -0,0 +1,858 @@
+import bisect
+import heapq
+import math
+import re
+import time
+from collections import Counter
+from collections.abc import Callable, Hashable, Iterable, Sequence
+from datetime import datetime
+from typing import Generic, TypeVar
+
+import pendulum
+from discord.ext.commands import BadArgument, CommandError
+
+from discord_chan.export import (
+    SNIPE_EXPORT_COLUMNS,
+    WORD_TRACK_EXPORT_COLUMNS,
+    ExportFormat,
+    ExportOutput,
+    export_rows,
+)
+from discord_chan.heavy_hitters import HeavyHitterScope, HeavyHitterSnapshot
+from discord_chan.snipe import Snipe, SnipeMode
+from discord_chan.storage import (
+    COIN_OVERFLOW_MESSAGE,
+    BackfillCheckpoint,
+    CoinStake,
+    LeaderboardEntry,
+    SnipePartition,
+    StakeExit,
+    StakeUpdate,
+    Storage,
+    UsageResolution,
+    WordRank,
+    WordTrackStats,
+    WordTrackUpdate,
+    WordUsage,
+    word_usage_bucket,
+    word_usage_cutoffs,
+)
+
+INT64_MIN = -(2**63)
+INT64_MAX = 2**63 - 1
+
+Key = TypeVar("Key", bound=Hashable)
+Value = TypeVar("Value")
+
+UsageBuckets = Counter[tuple[pendulum.DateTime, UsageResolution]]
+
+
+class SortedIndex(Generic[Value]):
+    """
+    Values kept in key order so ranges can be found with bisect
+
+    keys are tuples so a shorter tuple can be used as a bound,
+    (10,) sorts before every key starting with 10
+    """
+
+    def __init__(self):
+        self.keys: list[tuple] = []
+        self.values: list[Value] = []
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def insert(self, key: tuple, value: Value):
+        # bisect_right keeps values with equal keys in insertion order
+        position = bisect.bisect_right(self.keys, key)
+        self.keys.insert(position, key)
+        self.values.insert(position, value)
+
+    def bounds(self, start: tuple | None, end: tuple | None) -> tuple[int, int]:
+        """
+        Positions of the values with start <= key < end, None leaves that side open
+        """
+        low = 0 if start is None else bisect.bisect_left(self.keys, start)
+        high = len(self.keys) if end is None else bisect.bisect_left(self.keys, end)
+        return low, high
+
+    def remove_before(self, end: tuple) -> list[Value]:
+        position = bisect.bisect_left(self.keys, end)
+        removed = self.values[:position]
+        del self.keys[:position]
+        del self.values[:position]
+        return removed
+
+
+def leaderboard_page(
+    counts: dict[Key, int], limit: int, offset: int
+) -> tuple[list[LeaderboardEntry], int]:
+    """
+    Page of counts sorted like the postgres pages, count descending then key
+    """
+    top = heapq.nsmallest(
+        offset + limit, counts.items(), key=lambda item: (-item[1], item[0])
+    )
+    entries = [LeaderboardEntry(key, count) for key, count in top[offset:]]
+    return entries, len(counts)
+
+
+def compact_usage_buckets(buckets: UsageBuckets, cutoffs: tuple[datetime, datetime]):
+    """
+    Compact hour buckets older than the first cutoff into days, days older than the second into months
+    """
+    hourly_cutoff, daily_cutoff = cutoffs
+
+    for resolution, into, cutoff in (
+        (UsageResolution.hour, UsageResolution.day, hourly_cutoff),
+        (UsageResolution.day, UsageResolution.month, daily_cutoff),
+    ):
+        for bucket, bucket_resolution in list(buckets):
+            if bucket_resolution is not resolution or bucket >= cutoff:
+                continue
+
+            count = buckets.pop((bucket, bucket_resolution))
+            buckets[(bucket.start_of(into.value), into)] += count
+
+
+def check_int64(value: int) -> int:
+    if not INT64_MIN <= value <= INT64_MAX:
+        raise CommandError(COIN_OVERFLOW_MESSAGE)
+
+    return value
+
+
+class MemoryStorage(Storage):
+    """
+    Storage kept in dicts and sorted indexes, nothing survives a restart
+
+    this is for load testing the rest of the bot without a database
+    """
+
+    def __init__(self):
+        self.default_minecraft_servers: dict[int, str] = {}
+        self.minecraft_usernames: dict[int, str] = {}
+
+        # (server, author) -> word -> count
+        self.word_track: dict[tuple[int, int], dict[str, int]] = {}
+        # (server, word) -> author -> count, for ranking members on a word
+        self.word_track_word_authors: dict[tuple[int, str], dict[int, int]] = {}
+        # the same aggregates the postgres backend keeps in tables
+        self.word_track_server_words: dict[int, dict[str, int]] = {}
+        self.word_track_server_authors: dict[int, dict[int, WordTrackStats]] = {}
+        # server -> word or author -> (bucket, resolution) -> count
+        self.word_usage: dict[int, dict[str, UsageBuckets]] = {}
+        self.author_usage: dict[int, dict[int, UsageBuckets]] = {}
+
+        self.word_track_backfill: dict[tuple[int, int], BackfillCheckpoint] = {}
+        self.heavy_hitter_snapshots: dict[
+            tuple[HeavyHitterScope, int], HeavyHitterSnapshot
+        ] = {}
+
+        self.enabled_features: dict[int, list[str]] = {}
+
+        self.coins: dict[int, int] = {}
+        self.stakes: dict[int, CoinStake] = {}
+
+        # snipes ordered by time, per server and for all of them
+        self.snipes: SortedIndex[Snipe] = SortedIndex()
+        self.server_snipes: dict[int, SortedIndex[Snipe]] = {}
+        self.snipe_authors: Counter[int] = Counter()
+        self.server_snipe_authors: dict[int, Counter[int]] = {}
+        self.snipe_retentions: dict[int, int] = {}
+
+    async def close(self):
+        pass
+
+    async def update_guild_default_minecraft_server(
+        self, *, guild_id: int, server_id: str
+    ):
+        self.default_minecraft_servers[guild_id] = server_id
+
+    async def get_guild_default_minecraft_server(self, *, guild_id: int) -> str | None:
+        return self.default_minecraft_servers.get(guild_id)
+
+    async def update_minecraft_username(self, *, user_id: int, username: str):
+        self.minecraft_usernames[user_id] = username
+
+    async def get_minecraft_usernames(self) -> dict[int, str]:
+        return dict(self.minecraft_usernames)
+
+    async def get_minecraft_username(self, user_id: int) -> str | None:
+        return self.minecraft_usernames.get(user_id)
+
+    async def update_word_track_words(self, updates: Sequence[WordTrackUpdate]):
+        bucket = (pendulum.now("UTC").start_of("hour"), UsageResolution.hour)
+
+        for server_id, author_id, word, amount in updates:
+            word_usage = self.word_usage.setdefault(server_id, {})
+            word_usage.setdefault(word, Counter())[bucket] += amount
+            author_usage = self.author_usage.setdefault(server_id, {})
+            author_usage.setdefault(author_id, Counter())[bucket] += amount
+
+        self._add_word_track_counts(updates)
+
+    def _add_word_track_counts(self, updates: Sequence[WordTrackUpdate]):
+        for server_id, author_id, word, amount in updates:
+            words = self.word_track.setdefault((server_id, author_id), {})
+            new_word = word not in words
+            words[word] = words.get(word, 0) + amount
+
+            word_authors = self.word_track_word_authors.setdefault(
+                (server_id, word), {}
+            )
+            word_authors[author_id] = words[word]
+
+            server_words = self.word_track_server_words.setdefault(server_id, {})
+            server_words[word] = server_words.get(word, 0) + amount
+
+            server_authors = self.word_track_server_authors.setdefault(server_id, {})
+            unique_words, total_words = server_authors.get(
+                author_id, WordTrackStats(0, 0)
+            )
+            server_authors[author_id] = WordTrackStats(
+                unique_words + int(new_word), total_words + amount
+            )
+
+    async def get_server_word_track_leaderboard(
+        self, *, server_id: int, author_id: int | None = None
+    ) -> dict[str, int]:
+        if author_id is not None:
+            words = self.word_track.get((server_id, author_id), {})
+        else:
+            words = self.word_track_server_words.get(server_id, {})
+
+        return dict(sorted(words.items(), key=lambda item: item[1], reverse=True))
+
+    async def get_member_word_track_stats(
+        self, *, server_id: int, author_id: int
+    ) -> WordTrackStats | None:
+        return self.word_track_server_authors.get(server_id, {}).get(author_id)
+
+    async def get_member_word_counts(
+        self, *, server_id: int, author_id: int, words: Sequence[str]
+    ) -> dict[str, int]:
+        member_words = self.word_track.get((server_id, author_id), {})
+        counts = {word: member_words[word] for word in words if word in member_words}
+        return dict(sorted(counts.items(), key=lambda item: item[1], reverse=True))
+
+    async def get_word_rank(
+        self, *, server_id: int, word: str, limit: int
+    ) -> WordRank | None:
+        server_words = self.word_track_server_words.get(server_id, {})
+        server_count = server_words.get(word)
+
+        if server_count is None:
+            return None
+
+        server_rank = sum(count > server_count for count in server_words.values()) + 1
+
+        authors = self.word_track_word_authors.get((server_id, word), {})
+        top_authors = heapq.nlargest(limit, authors.items(), key=lambda item: item[1])
+
+        return WordRank(
+            server_count,
+            server_rank,
+            [LeaderboardEntry(*author) for author in top_authors],
+        )
+
+    async def get_server_word_leaderboard_page(
+        self, *, server_id: int, limit: int, offset: int = 0
+    ) -> tuple[list[LeaderboardEntry], int]:
+        return leaderboard_page(
+            self.word_track_server_words.get(server_id, {}), limit, offset
+        )
+
+    def _author_word_counts(
+        self,
+        server_id: int | None,
+        get_count: Callable[[WordTrackStats], int],
+    ) -> dict[int, int]:
+        if server_id is not None:
+            servers: Iterable[dict[int, WordTrackStats]] = [
+                self.word_track_server_authors.get(server_id, {})
+            ]
+        else:
+            servers = self.word_track_server_authors.values()
+
+        counts: dict[int, int] = {}
+        for authors in servers:
+            for author_id, stats in authors.items():
+                counts[author_id] = counts.get(author_id, 0) + get_count(stats)
+
+        return counts
+
+    async def get_word_track_unique_word_leaderboard(
+        self, *, server_id: int | None = None, limit: int, offset: int = 0
+    ) -> tuple[list[LeaderboardEntry], int]:
+        counts = self._author_word_counts(server_id, lambda stats: stats.unique_words)
+        return leaderboard_page(counts, limit, offset)
+
+    async def get_word_track_total_word_leaderboard(
+        self, *, server_id: int | None = None, limit: int, offset: int = 0
+    ) -> tuple[list[LeaderboardEntry], int]:
+        counts = self._author_word_counts(server_id, lambda stats: stats.total_words)
+        return leaderboard_page(counts, limit, offset)
+
+    async def get_word_usage(
+        self, *, server_id: int, word: str, since: datetime
+    ) -> list[WordUsage]:
+        since = word_usage_bucket(since, pendulum.now("UTC"))
+        buckets = self.word_usage.get(server_id, {}).get(word, Counter())
+
+        return [
+            WordUsage(bucket, resolution, count)
+            for (bucket, resolution), count in sorted(
+                buckets.items(), key=lambda item: item[0][0]
+            )
+            if bucket >= since
+        ]
+
+    @staticmethod
+    def _usage_since(usage: dict[Key, UsageBuckets], since: datetime) -> dict[Key, int]:
+        since = word_usage_bucket(since, pendulum.now("UTC"))
+
+        counts: dict[Key, int] = {}
+        for key, buckets in usage.items():
+            count = sum(
+                count for (bucket, _), count in buckets.items() if bucket >= since
+            )
+
+            if count:
+                counts[key] = count
+
+        return counts
+
+    async def get_word_usage_leaderboard(
+        self, *, server_id: int, since: datetime, limit: int, offset: int = 0
+    ) -> tuple[list[LeaderboardEntry], int]:
+        counts = self._usage_since(self.word_usage.get(server_id, {}), since)
+        return leaderboard_page(counts, limit, offset)
+
+    async def get_author_usage_leaderboard(
+        self, *, server_id: int, since: datetime, limit: int, offset: int = 0
+    ) -> tuple[list[LeaderboardEntry], int]:
+        counts = self._usage_since(self.author_usage.get(server_id, {}), since)
+        return leaderboard_page(counts, limit, offset)
+
+    async def compact_word_usage(self):
+        cutoffs = word_usage_cutoffs(pendulum.now("UTC"))
+
+        for server_usage in (*self.word_usage.values(), *self.author_usage.values()):
+            for buckets in server_usage.values():
+                compact_usage_buckets(buckets, cutoffs)
+
+    async def create_word_track_backfill(
+        self, *, server_id: int, channel_ids: Sequence[int], before: int
+    ):
+        for channel_id in channel_ids:
+            self.word_track_backfill.setdefault(
+                (server_id, channel_id),
+                BackfillCheckpoint(server_id, channel_id, before, 0, False),
+            )
+
+    async def get_word_track_backfill(
+        self, *, server_id: int | None = None
+    ) -> list[BackfillCheckpoint]:
+        if server_id is not None:
+            return [
+                checkpoint
+                for checkpoint in self.word_track_backfill.values()
+                if checkpoint.server_id == server_id
+            ]
+
+        return [
+            checkpoint
+            for checkpoint in self.word_track_backfill.values()
+            if not checkpoint.done
+        ]
+
+    async def backfill_word_track(
+        self, updates: Sequence[WordTrackUpdate], checkpoint: BackfillCheckpoint
+    ):
+        # usage buckets are for when words were counted, backfills only add totals
+        self._add_word_track_counts(updates)
+        self.word_track_backfill[(checkpoint.server_id, checkpoint.channel_id)] = (
+            checkpoint
+        )
+
+    async def get_heavy_hitter_snapshots(self) -> list[HeavyHitterSnapshot]:
+        now = time.time()
+        return [
+            snapshot
+            for snapshot in self.heavy_hitter_snapshots.values()
+            if snapshot.expires is None or snapshot.expires > now
+        ]
+
+    async def save_heavy_hitter_snapshots(
+        self, snapshots: Sequence[HeavyHitterSnapshot]
+    ):
+        for snapshot in snapshots:
+            self.heavy_hitter_snapshots[(snapshot.scope, snapshot.scope_id)] = snapshot
+
+        now = time.time()
+        for key, snapshot in list(self.heavy_hitter_snapshots.items()):
+            if snapshot.expires is not None and snapshot.expires <= now:
+                del self.heavy_hitter_snapshots[key]
+
+    async def export_word_track(
+        self, *, server_id: int, export_format: ExportFormat, output: ExportOutput
+    ):
+        rows = (
+            (author_id, word, count)
+            for (row_server_id, author_id), words in self.word_track.items()
+            if row_server_id == server_id
+            for word, count in words.items()
+        )
+        await export_rows(output, export_format, WORD_TRACK_EXPORT_COLUMNS, rows)
+
+    async def get_guild_enabled_features(self, guild_id: int) -> list[str]:
+        return list(self.enabled_features.get(guild_id, []))
+
+    async def get_all_enabled_features(self) -> dict[int, list[str]]:
+        return {
+            guild_id: list(features)
+            for guild_id, features in self.enabled_features.items()
+            if features
+        }
+
+    async def enable_guild_enabled_feature(self, guild_id: int, feature_name: str):
+        features = self.enabled_features.setdefault(guild_id, [])
+
+        if feature_name not in features:
+            features.append(feature_name)
+
+    async def disable_guild_enabled_feature(self, guild_id: int, feature_name: str):
+        features = self.enabled_features.get(guild_id, [])
+
+        if feature_name in features:
+            features.remove(feature_name)
+
+    async def purge_feature(self, feature_name: str):
+        for guild_id in self.enabled_features:
+            await self.disable_guild_enabled_feature(guild_id, feature_name)
+
+    async def delete_coin_account(self, user_id: int):
+        self.coins.pop(user_id, None)
+
+    async def get_coin_balance(self, user_id: int) -> int:
+        return self.coins.get(user_id, 0)
+
+    async def get_coin_balances(
+        self, *, limit: int, offset: int = 0
+    ) -> tuple[list[LeaderboardEntry], int]:
+        return leaderboard_page(self.coins, limit, offset)
+
+    async def set_coins(self, user_id: int, amount: int):
+        self.coins[user_id] = check_int64(amount)
+
+    async def add_coins(self, user_id: int, amount: int) -> int:
+        # none of these await between reading and writing so they're atomic
+        balance = check_int64(self.coins.get(user_id, 0) + amount)
+        self.coins[user_id] = balance
+        return balance
+
+    async def add_coins_if_funded(
+        self, user_id: int, amount: int, *, required: int
+    ) -> int | None:
+        balance = self.coins.get(user_id)
+
+        if balance is None or balance < required:
+            return None
+
+        balance = self.coins[user_id] = check_int64(balance + amount)
+        return balance
+
+    async def transfer_coins(self, from_id: int, to_id: int, amount: int) -> int | None:
+        if from_id == to_id:
+            raise ValueError("Cannot transfer coins to the same account")
+
+        balance = self.coins.get(from_id)
+
+        if balance is None or balance < amount:
+            return None
+
+        # check both before writing either so an overflow doesn't lose coins
+        new_balance = check_int64(balance - amount)
+        self.coins[to_id] = check_int64(self.coins.get(to_id, 0) + amount)
+        self.coins[from_id] = new_balance
+        return new_balance
+
+    async def get_coin_stake(self, user_id: int) -> CoinStake | None:
+        return self.stakes.get(user_id)
+
+    async def set_coin_stake(self, user_id: int, amount: float, bitcoin_price: float):
+        self.stakes[user_id] = CoinStake(bitcoin_price=bitcoin_price, coins=amount)
+
+    async def stake_coins(
+        self, user_id: int, amount: int, bitcoin_price: float
+    ) -> StakeUpdate | None:
+        balance = self.coins.get(user_id)
+
+        if balance is None or balance < amount:
+            return None
+
+        self.coins[user_id] = balance - amount
+        stake = self.stakes.get(user_id)
+
+        if stake is None:
+            coins = float(amount)
+        else:
+            coins = stake.coins * (bitcoin_price / stake.bitcoin_price) + amount
+
+        self.stakes[user_id] = CoinStake(bitcoin_price=bitcoin_price, coins=coins)
+        return StakeUpdate(coins=coins, created=stake is None)
+
+    async def exit_coin_stake(
+        self, user_id: int, bitcoin_price: float
+    ) -> StakeExit | None:
+        stake = self.stakes.get(user_id)
+
+        if stake is None:
+            return None
+
+        payout = math.floor(stake.coins * (bitcoin_price / stake.bitcoin_price))
+        self.coins[user_id] = check_int64(self.coins.get(user_id, 0) + payout)
+        del self.stakes[user_id]
+        return StakeExit(staked=stake.coins, coins=payout)
+
+    async def add_snipes(self, snipes: Sequence[Snipe]):
+        for snipe in snipes:
+            # ordered the same as the postgres keyset
+            key = (snipe.time.timestamp(), snipe.id)
+            self.snipes.insert(key, snipe)
+            self.server_snipes.setdefault(snipe.server, SortedIndex()).insert(
+                key, snipe
+            )
+            self.snipe_authors[snipe.author] += 1
+            self.server_snipe_authors.setdefault(snipe.server, Counter())[
+                snipe.author
+            ] += 1
+
+    @staticmethod
+    def _snipe_checks(
+        *,
+        author: int | None = None,
+        channel: int | None = None,
+        contains: str | None = None,
+        regex: str | None = None,
+        channels: Sequence[int] | None = None,
+        mode: SnipeMode | None = None,
+    ) -> list[Callable[[Snipe], bool]]:
+        checks: list[Callable[[Snipe], bool]] = []
+
+        if author is not None:
+            checks.append(lambda snipe: snipe.author == author)
+
+        if channel is not None:
+            checks.append(lambda snipe: snipe.channel == channel)
+
+        if channels is not None:
+            channel_set = set(channels)
+            checks.append(lambda snipe: snipe.channel in channel_set)
+
+        if contains is not None:
+            folded = contains.casefold()
+            checks.append(lambda snipe: folded in snipe.content.casefold())
+
+        if regex is not None:
+            try:
+                pattern = re.compile(regex, re.IGNORECASE)
+            except re.error as exc:
+                raise BadArgument(f"Invalid regex: {exc}")
+
+            checks.append(lambda snipe: pattern.search(snipe.content) is not None)
+
+        if mode is not None:
+            checks.append(lambda snipe: snipe.mode is mode)
+
+        return checks
+
+    def _filter_snipes(
+        self,
+        *,
+        server: int | None = None,
+        author: int | None = None,
+        channel: int | None = None,
+        contains: str | None = None,
+        regex: str | None = None,
+        channels: Sequence[int] | None = None,
+        mode: SnipeMode | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> list[Snipe]:
+        """
+        Snipes matching the filters, oldest first
+
+        the time window is cut out of the sorted index before the other filters run
+        """
+        if server is not None:
+            index = self.server_snipes.get(server)
+
+            if index is None:
+                return []
+        else:
+            index = self.snipes
+
+        low, high = index.bounds(
+            (since.timestamp(),) if since is not None else None,
+            (until.timestamp(),) if until is not None else None,
+        )
+        snipes = index.values[low:high]
+        checks = self._snipe_checks(
+            author=author,
+            channel=channel,
+            contains=contains,
+            regex=regex,
+            channels=channels,
+            mode=mode,
+        )
+
+        if not checks:
+            return snipes
+
+        return [snipe for snipe in snipes if all(check(snipe) for check in checks)]
+
+    async def get_snipe(
+        self,
+        *,
+        index: int,
+        server: int | None = None,
+        author: int | None = None,
+        channel: int | None = None,
+        contains: str | None = None,
+        regex: str | None = None,
+        mode: SnipeMode | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> tuple[Snipe | None, int]:
+        snipes = self._filter_snipes(
+            server=server,
+            author=author,
+            channel=channel,
+            contains=contains,
+            regex=regex,
+            mode=mode,
+            since=since,
+            until=until,
+        )
+
+        # snipes are oldest first but index 0 is the newest
+        position = abs(index) - 1 if index < 0 else len(snipes) - 1 - index
+
+        if not 0 <= position < len(snipes):
+            return None, len(snipes)
+
+        return snipes[position], len(snipes)
+
+    async def get_snipes(
+        self,
+        *,
+        server: int | None = None,
+        author: int | None = None,
+        channel: int | None = None,
+        contains: str | None = None,
+        regex: str | None = None,
+        mode: SnipeMode | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        limit: int | None = None,
+        negative: bool = False,
+    ) -> tuple[list[Snipe], int]:
+        if limit is not None and limit > 10_000_000:
+            raise RuntimeError(f"requested limit of {limit} when the max is 10,000,000")
+
+        snipes = self._filter_snipes(
+            server=server,
+            author=author,
+            channel=channel,
+            contains=contains,
+            regex=regex,
+            mode=mode,
+            since=since,
+            until=until,
+        )
+
+        if negative:
+            ordered = snipes[:limit]
+        else:
+            ordered = snipes[::-1][:limit]
+
+        return ordered, len(snipes)
+
+    async def get_snipes_before(
+        self,
+        *,
+        before: Snipe | None = None,
+        limit: int,
+        server: int | None = None,
+        author: int | None = None,
+        channel: int | None = None,
+        contains: str | None = None,
+        regex: str | None = None,
+        mode: SnipeMode | None = None,
+        since: datetime | None = None,
+    ) -> list[Snipe]:
+        if server is not None:
+            index = self.server_snipes.get(server)
+
+            if index is None:
+                return []
+        else:
+            index = self.snipes
+
+        low, high = index.bounds(
+            (since.timestamp(),) if since is not None else None,
+            (before.time.timestamp(), before.id) if before is not None else None,
+        )
+        checks = self._snipe_checks(
+            author=author, channel=channel, contains=contains, regex=regex, mode=mode
+        )
+
+        # walk back from the cursor and stop once the page is full
+        snipes: list[Snipe] = []
+        for position in range(high - 1, low - 1, -1):
+            if len(snipes) >= limit:
+                break
+
+            snipe = index.values[position]
+            if all(check(snipe) for check in checks):
+                snipes.append(snipe)
+
+        return snipes
+
+    async def search_snipes(
+        self,
+        *,
+        server: int,
+        query: str,
+        regex: bool = False,
+        channels: Sequence[int] | None = None,
+        since: datetime | None = None,
+        limit: int = 10,
+        offset: int = 0,
+    ) -> tuple[list[Snipe], int]:
+        """
+        Search a server's snipes, newest first
+
+        unlike the postgres backend matches aren't ranked by similarity
+        """
+        snipes = self._filter_snipes(
+            server=server,
+            channels=channels,
+            since=since,
+            contains=None if regex else query,
+            regex=query if regex else None,
+        )
+        snipes.reverse()
+        return snipes[offset : offset + limit], len(snipes)
+
+    async def get_snipe_leaderboard(
+        self, server_id: int | None = None, *, limit: int, offset: int = 0
+    ) -> tuple[list[LeaderboardEntry], int]:
+        if server_id:
+            authors = self.server_snipe_authors.get(server_id, Counter())
+        else:
+            authors = self.snipe_authors
+
+        return leaderboard_page(authors, limit, offset)
+
+    async def count_snipes(
+        self,
+        *,
+        server: int | None = None,
+        author: int | None = None,
+        channel: int | None = None,
+        mode: SnipeMode | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> int:
+        return len(
+            self._filter_snipes(
+                server=server,
+                author=author,
+                channel=channel,
+                mode=mode,
+                since=since,
+                until=until,
+            )
+        )
+
+    async def export_snipes(
+        self, *, server_id: int, export_format: ExportFormat, output: ExportOutput
+    ):
+        snipes = self.server_snipes.get(server_id, SortedIndex())
+        rows = (
+            (
+                snipe.id,
+                snipe.mode.value,
+                snipe.author,
+                snipe.channel,
+                snipe.time.isoformat(),
+                snipe.content,
+                None,
+            )
+            for snipe in list(snipes.values)
+        )
+        await export_rows(output, export_format, SNIPE_EXPORT_COLUMNS, rows)
+
+    async def get_snipe_retentions(self) -> dict[int, int]:
+        return dict(self.snipe_retentions)
+
+    async def set_snipe_retention(self, guild_id: int, days: int | None):
+        if days is None:
+            self.snipe_retentions.pop(guild_id, None)
+        else:
+            self.snipe_retentions[guild_id] = days
+
+    async def create_snipe_partitions(self, *, months_ahead: int = 2) -> list[str]:
+        # there are no partitions, every snipe is in the same index
+        return []
+
+    async def get_snipe_partitions(self) -> list[SnipePartition]:
+        return []
+
+    async def drop_expired_snipe_partitions(
+        self, *, default_retention_days: int | None = None
+    ) -> list[str]:
+        """
+        Remove expired snipes right away since there are no partitions to drop
+
+        :return: Always empty
+        """
+        now = pendulum.now("UTC").timestamp()
+        removed = False
+
+        for server, index in self.server_snipes.items():
+            days = self.snipe_retentions.get(server, default_retention_days)
+
+            if days is None:
+                continue
+
+            authors = self.server_snipe_authors[server]
+            for snipe in index.remove_before((now - days * 86400,)):
+                authors[snipe.author] -= 1
+                self.snipe_authors[snipe.author] -= 1
+                removed = True
+
+        if removed:
+            # Counter keeps zero counts which would still show up on the leaderboards
+            for authors in (self.snipe_authors, *self.server_snipe_authors.values()):
+                for author, count in list(authors.items()):
+                    if count <= 0:
+                        del authors[author]
+
+            merged = list(
+                heapq.merge(
+                    *(
+                        zip(index.keys, index.values)
+                        for index in self.server_snipes.values()
+                    ),
+                    key=lambda item: item[0],
+                )
+            )
+            self.snipes = SortedIndex()
+            self.snipes.keys = [key for key, _ in merged]
+            self.snipes.values = [snipe for _, snipe in merged]
+
+        return []
@@ -1,7 +1,8 @@
 import asyncio
+import math
 import random
-from collections.abc import Sequence
-from typing import NamedTuple
+from collections.abc import Awaitable, Callable, Sequence
+from typing import NamedTuple, Self
 
 import discord
 from discord.ext import commands, menus
@@ -89,8 +90,9 @@ class DCMenuPages(menus.MenuPages):
 
     def skip_only_one_page(self):
         max_pages = self._source.get_max_pages()
+        # streamed sources don't know how many pages there are, but there can be more
         if max_pages is None:
-            return True
+            return not self._source.is_paginating()
         return max_pages <= 1
 
     def skip_one_or_two(self):
@@ -187,6 +189,209 @@ class EmbedFieldsPageSource(menus.ListPageSource):
             return base
 
 
+class QueryPageSource[T](menus.PageSource):
+    """
+    Page source that only fetches the entries of the page being shown
+
+    fetch_page is called with (offset, limit)
+    """
+
+    def __init__(
+        self,
+        fetch_page: Callable[[int, int], Awaitable[Sequence[T]]],
+        total: int,
+        *,
+        per_page: int = 10,
+        first_page: Sequence[T] | None = None,
+        header: str | None = None,
+    ):
+        self.fetch_page = fetch_page
+        self.total = total
+        self.per_page = per_page
+        self.header = header
+        self._cache: dict[int, Sequence[T]] = {}
+        self._lock = asyncio.Lock()
+
+        # callers usually fetch the first page to get the total
+        if first_page is not None:
+            self._cache[0] = first_page
+
+    @classmethod
+    async def create(
+        cls,
+        fetch_page: Callable[[int, int], Awaitable[tuple[Sequence[T], int]]],
+        *,
+        per_page: int = 10,
+        **kwargs,
+    ) -> Self:
+        """
+        Fetch the first page to get the total and make a source from it
+
+        fetch_page here returns (entries, total) like the paged Database methods
+        """
+        first_page, total = await fetch_page(0, per_page)
+
+        async def _fetch_entries(offset: int, limit: int) -> Sequence[T]:
+            entries, _ = await fetch_page(offset, limit)
+            return entries
+
+        return cls(
+            _fetch_entries, total, per_page=per_page, first_page=first_page, **kwargs
+        )
+
+    def is_paginating(self):
+        return self.total > self.per_page
+
+    def get_max_pages(self):
+        return max(math.ceil(self.total / self.per_page), 1)
+
+    async def get_page(self, page_number: int) -> Sequence[T]:
+        async with self._lock:
+            if page_number not in self._cache:
+                self._cache[page_number] = await self.fetch_page(
+                    page_number * self.per_page, self.per_page
+                )
+
+        return self._cache[page_number]
+
+    async def format_page(self, menu, page: Sequence[T]):
+        lines = list(map(str, page))
+
+        if self.header is not None:
+            lines = [self.header, ""] + lines
+
+        return "\n".join(lines)
+
+
+class QueryEmbedFieldsPageSource(QueryPageSource[EmbedFieldProxy]):
+    def __init__(
+        self,
+        fetch_page: Callable[[int, int], Awaitable[Sequence[EmbedFieldProxy]]],
+        total: int,
+        *,
+        per_page: int = 4,
+        first_page: Sequence[EmbedFieldProxy] | None = None,
+        title: str | None = None,
+    ):
+        super().__init__(fetch_page, total, per_page=per_page, first_page=first_page)
+        self.title = title
+
+    async def format_page(self, menu: menus.MenuPages, page: Sequence[EmbedFieldProxy]):
+        base = discord.Embed(title=self.title)
+        base.set_footer(text=f"page {menu.current_page + 1}/{self.get_max_pages()}")
+
+        for proxy in page:
+            base.add_field(name=proxy.name, value=proxy.value, inline=proxy.inline)
+
+        return base
+
+
+class StreamPageSource[T](menus.PageSource):
+    """
+    Page source over a stream of unknown length, pages are fetched in order as they're reached
+
+    fetch_after is called with (last entry of the previous page or None, limit)
+    so the stream can continue from there instead of using an offset
+    """
+
+    def __init__(
+        self,
+        fetch_after: Callable[[T | None, int], Awaitable[Sequence[T]]],
+        *,
+        per_page: int = 10,
+        first_page: Sequence[T],
+    ):
+        self.fetch_after = fetch_after
+        self.per_page = per_page
+        self._pages: list[Sequence[T]] = [first_page]
+        self._lock = asyncio.Lock()
+        # set once a short page shows the stream is exhausted
+        self._max_pages: int | None = None
+        self._check_exhausted(first_page)
+
+    @classmethod
+    async def create(
+        cls,
+        fetch_after: Callable[[T | None, int], Awaitable[Sequence[T]]],
+        *,
+        per_page: int = 10,
+        **kwargs,
+    ) -> Self:
+        first_page = await fetch_after(None, per_page)
+        return cls(fetch_after, per_page=per_page, first_page=first_page, **kwargs)
+
+    def _check_exhausted(self, page: Sequence[T]):
+        if len(page) < self.per_page:
+            # an empty page past the end isn't kept, so it isn't counted
+            self._max_pages = max(len(self._pages), 1)
+
+    @property
+    def is_empty(self) -> bool:
+        return len(self._pages[0]) == 0
+
+    def is_paginating(self):
+        return self._max_pages is None or self._max_pages > 1
+
+    def get_max_pages(self):
+        return self._max_pages
+
+    async def get_page(self, page_number: int) -> Sequence[T]:
+        async with self._lock:
+            # pages can only be reached by streaming through the ones before them
+            while page_number >= len(self._pages):
+                if self._max_pages is not None:
+                    # MenuPages treats IndexError as there being no such page
+                    raise IndexError(page_number)
+
+                page = await self.fetch_after(self._pages[-1][-1], self.per_page)
+
+                if page:
+                    self._pages.append(page)
+
+                self._check_exhausted(page)
+
+        return self._pages[page_number]
+
+    async def format_page(self, menu, page: Sequence[T]):
+        return "\n".join(map(str, page))
+
+
+class StreamEmbedFieldsPageSource[T](StreamPageSource[T]):
+    """
+    StreamPageSource that shows each entry as an embed field
+
+    to_field is only called for the entries of the page being shown
+    """
+
+    def __init__(
+        self,
+        fetch_after: Callable[[T | None, int], Awaitable[Sequence[T]]],
+        *,
+        to_field: Callable[[T], Awaitable[EmbedFieldProxy]],
+        per_page: int = 4,
+        first_page: Sequence[T],
+        title: str | None = None,
+    ):
+        super().__init__(fetch_after, per_page=per_page, first_page=first_page)
+        self.to_field = to_field
+        self.title = title
+
+    async def format_page(self, menu: menus.MenuPages, page: Sequence[T]):
+        base = discord.Embed(title=self.title)
+
+        max_pages = self.get_max_pages()
+        if max_pages is None:
+            base.set_footer(text=f"page {menu.current_page + 1}")
+        else:
+            base.set_footer(text=f"page {menu.current_page + 1}/{max_pages}")
+
+        for entry in page:
+            proxy = await self.to_field(entry)
+            base.add_field(name=proxy.name, value=proxy.value, inline=proxy.inline)
+
+        return base
+
+
 class FixedNonePaginator(commands.Paginator):
     @property
     def _max_size_factor(self):
@@ -0,0 +1,134 @@
+import bisect
+from collections.abc import Callable
+
+# upper bounds in seconds, the last bucket catches everything above
+DEFAULT_LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+
+
+class Counter:
+    def __init__(self, name: str):
+        self.name = name
+        self.value = 0
+
+    def inc(self, amount: int = 1):
+        self.value += amount
+
+    def render(self) -> str:
+        return f"{self.name}: {self.value}"
+
+
+class Gauge:
+    def __init__(self, name: str, getter: Callable[[], float | int]):
+        self.name = name
+        self.getter = getter
+
+    @property
+    def value(self) -> float | int:
+        return self.getter()
+
+    def render(self) -> str:
+        return f"{self.name}: {self.value}"
+
+
+class Histogram:
+    def __init__(self, name: str, buckets: tuple[float, ...] = DEFAULT_LATENCY_BUCKETS):
+        self.name = name
+        self.buckets = buckets
+        # one extra slot for observations over the last bound
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    @property
+    def mean(self) -> float:
+        if self.count == 0:
+            return 0.0
+
+        return self.total / self.count
+
+    def quantile(self, quantile: float) -> float:
+        """
+        Estimate a quantile as the upper bound of the bucket it falls in
+        """
+        if self.count == 0:
+            return 0.0
+
+        target = quantile * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target:
+                if index < len(self.buckets):
+                    return self.buckets[index]
+
+                return self.max
+
+        return self.max
+
+    def render(self) -> str:
+        return (
+            f"{self.name}: count={self.count} mean={self.mean * 1000:.2f}ms "
+            f"p50<={self.quantile(0.5) * 1000:g}ms p99<={self.quantile(0.99) * 1000:g}ms "
+            f"max={self.max * 1000:.2f}ms"
+        )
+
+
+Metric = Counter | Gauge | Histogram
+
+_registry: dict[str, Metric] = {}
+
+
+def counter(name: str) -> Counter:
+    metric = _registry.get(name)
+
+    if not isinstance(metric, Counter):
+        metric = _registry[name] = Counter(name)
+
+    return metric
+
+
+def gauge(name: str, getter: Callable[[], float | int]) -> Gauge:
+    # re-registering replaces the getter so reloaded cogs don't keep stale ones
+    metric = _registry[name] = Gauge(name, getter)
+    return metric
+
+
+def histogram(
+    name: str, buckets: tuple[float, ...] = DEFAULT_LATENCY_BUCKETS
+) -> Histogram:
+    metric = _registry.get(name)
+
+    if not isinstance(metric, Histogram):
+        metric = _registry[name] = Histogram(name, buckets)
+
+    return metric
+
+
+def get_metrics(prefix: str = "") -> list[Metric]:
+    return [
+        metric for name, metric in sorted(_registry.items()) if name.startswith(prefix)
+    ]
+
+
+def render(prefix: str = "") -> str:
+    return "\n".join(metric.render() for metric in get_metrics(prefix))
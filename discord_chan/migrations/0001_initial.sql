@@ -0,0 +1,50 @@
+CREATE TABLE IF NOT EXISTS snipes (
+    id BIGINT,
+    mode INT,
+    server BIGINT,
+    author BIGINT,
+    channel BIGINT,
+    time FLOAT,
+    content TEXT
+);
+
+CREATE TABLE IF NOT EXISTS coins (
+    user_id BIGINT PRIMARY KEY,
+    amount BIGINT
+);
+
+CREATE TABLE IF NOT EXISTS enabled_features (
+    guild_id BIGINT,
+    feature_name TEXT,
+    PRIMARY KEY (guild_id, feature_name)
+);
+
+CREATE TABLE IF NOT EXISTS stakes (
+    user_id BIGINT PRIMARY KEY,
+    amount FLOAT,
+    bitcoin_price FLOAT
+);
+
+CREATE TABLE IF NOT EXISTS word_track (
+    server BIGINT,
+    author BIGINT,
+    word TEXT,
+    count INT,
+    PRIMARY KEY (server, author, word)
+);
+
+CREATE TABLE IF NOT EXISTS minecraft_usernames (
+    user_id BIGINT PRIMARY KEY,
+    username TEXT UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS minecraft_default_servers (
+    guild_id BIGINT PRIMARY KEY,
+    server_id TEXT
+);
+
+CREATE TABLE IF NOT EXISTS minecraft_guild_links (
+    first_guild_id BIGINT,
+    seconrd_guild_id BIGINT,
+    PRIMARY KEY (first_guild_id, seconrd_guild_id)
+);
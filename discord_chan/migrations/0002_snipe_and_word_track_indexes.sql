@@ -0,0 +1,11 @@
+-- snipes had no key at all, message ids repeat once per edit so they can't be one
+ALTER TABLE snipes ADD COLUMN snipe_id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY;
+
+-- snipe lookups always filter by server and channel and order by time
+CREATE INDEX snipes_server_channel_time_idx ON snipes (server, channel, time DESC);
+
+-- snipe leaderboards and server wide counts
+CREATE INDEX snipes_server_author_idx ON snipes (server, author);
+
+-- per word member rankings, the primary key only covers (server, author, word)
+CREATE INDEX word_track_server_word_idx ON word_track (server, word);
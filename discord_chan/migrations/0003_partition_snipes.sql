@@ -0,0 +1,87 @@
+-- snipes is rebuilt as a table range partitioned by month on time (epoch seconds)
+-- so old months can be dropped whole instead of deleted row by row
+
+ALTER TABLE snipes RENAME TO snipes_unpartitioned;
+ALTER INDEX snipes_pkey RENAME TO snipes_unpartitioned_pkey;
+DROP INDEX snipes_server_channel_time_idx;
+DROP INDEX snipes_server_author_idx;
+
+CREATE TABLE snipes (
+    snipe_id BIGINT GENERATED ALWAYS AS IDENTITY,
+    id BIGINT,
+    mode INT,
+    server BIGINT,
+    author BIGINT,
+    channel BIGINT,
+    time FLOAT NOT NULL,
+    content TEXT,
+    -- the partition key has to be part of the primary key
+    PRIMARY KEY (snipe_id, time)
+) PARTITION BY RANGE (time);
+
+-- catches anything outside the monthly partitions so inserts never fail
+CREATE TABLE snipes_default PARTITION OF snipes DEFAULT;
+
+CREATE TABLE snipe_retention (
+    guild_id BIGINT PRIMARY KEY,
+    days INT NOT NULL CHECK (days > 0)
+);
+
+-- creates the partition holding the month of month_start (in UTC), named snipes_pYYYYMM
+CREATE FUNCTION create_snipe_partition(month_start TIMESTAMPTZ) RETURNS TEXT AS $$
+DECLARE
+    start_month TIMESTAMPTZ := date_trunc('month', month_start, 'UTC');
+    partition_name TEXT := 'snipes_p' || to_char(start_month AT TIME ZONE 'UTC', 'YYYYMM');
+BEGIN
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF snipes FOR VALUES FROM (%s) TO (%s)',
+        partition_name,
+        extract(epoch FROM start_month),
+        extract(epoch FROM start_month + interval '1 month')
+    );
+
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- time is the partition key and can't be NULL, legacy snipes without one get
+-- the time of their message id's snowflake, or the time of the migration
+UPDATE snipes_unpartitioned
+SET time = coalesce(((id >> 22) + 1420070400000) / 1000.0, extract(epoch FROM now()))
+WHERE time IS NULL;
+
+DO $$
+DECLARE
+    month TIMESTAMPTZ;
+BEGIN
+    -- only months that have snipes, plus the current and next two
+    FOR month IN
+        SELECT DISTINCT date_trunc('month', to_timestamp(time), 'UTC')
+        FROM snipes_unpartitioned
+        UNION
+        SELECT generate_series(
+            date_trunc('month', now(), 'UTC'),
+            now() + interval '2 months',
+            interval '1 month'
+        )
+    LOOP
+        PERFORM create_snipe_partition(month);
+    END LOOP;
+END;
+$$;
+
+INSERT INTO snipes (snipe_id, id, mode, server, author, channel, time, content)
+OVERRIDING SYSTEM VALUE
+SELECT snipe_id, id, mode, server, author, channel, time, content
+FROM snipes_unpartitioned;
+
+DROP TABLE snipes_unpartitioned;
+
+SELECT setval(
+    pg_get_serial_sequence('snipes', 'snipe_id'),
+    coalesce(max(snipe_id), 0) + 1,
+    false
+) FROM snipes;
+
+CREATE INDEX snipes_server_channel_time_idx ON snipes (server, channel, time DESC);
+CREATE INDEX snipes_server_author_idx ON snipes (server, author);
@@ -0,0 +1,4 @@
+-- trigram index so substring (ILIKE) and regex (~*) filters on content don't scan every snipe
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX snipes_content_trgm_idx ON snipes USING GIN (content gin_trgm_ops);
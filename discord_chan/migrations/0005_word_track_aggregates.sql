@@ -0,0 +1,28 @@
+-- per server word totals, what the words leaderboard shows
+CREATE TABLE word_track_server_words (
+    server BIGINT NOT NULL,
+    word TEXT NOT NULL,
+    count BIGINT NOT NULL,
+    PRIMARY KEY (server, word)
+);
+
+CREATE INDEX word_track_server_words_count_idx ON word_track_server_words (server, count DESC);
+
+-- per server member totals, unique_words is the number of word_track rows they have
+CREATE TABLE word_track_server_authors (
+    server BIGINT NOT NULL,
+    author BIGINT NOT NULL,
+    unique_words BIGINT NOT NULL,
+    total_words BIGINT NOT NULL,
+    PRIMARY KEY (server, author)
+);
+
+CREATE INDEX word_track_server_authors_unique_idx ON word_track_server_authors (server, unique_words DESC);
+CREATE INDEX word_track_server_authors_total_idx ON word_track_server_authors (server, total_words DESC);
+
+-- both are kept current by Database.update_word_track_words from here on
+INSERT INTO word_track_server_words (server, word, count)
+SELECT server, word, sum(count) FROM word_track GROUP BY server, word;
+
+INSERT INTO word_track_server_authors (server, author, unique_words, total_words)
+SELECT server, author, count(*), sum(count) FROM word_track GROUP BY server, author;
@@ -0,0 +1,12 @@
+-- leaderboards are paged with LIMIT/OFFSET, the extra column breaks ties
+-- so pages are stable and can be read straight off the index
+DROP INDEX word_track_server_words_count_idx;
+CREATE INDEX word_track_server_words_count_idx ON word_track_server_words (server, count DESC, word);
+
+DROP INDEX word_track_server_authors_unique_idx;
+CREATE INDEX word_track_server_authors_unique_idx ON word_track_server_authors (server, unique_words DESC, author);
+
+DROP INDEX word_track_server_authors_total_idx;
+CREATE INDEX word_track_server_authors_total_idx ON word_track_server_authors (server, total_words DESC, author);
+
+CREATE INDEX coins_amount_idx ON coins (amount DESC, user_id);
@@ -0,0 +1,4 @@
+-- snipe list pages with a (time, id) keyset, id breaks ties between snipes
+-- at the same time so each page can be read straight off the index
+DROP INDEX snipes_server_channel_time_idx;
+CREATE INDEX snipes_server_channel_time_idx ON snipes (server, channel, time DESC, id DESC);
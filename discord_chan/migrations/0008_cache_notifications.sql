@@ -0,0 +1,36 @@
+-- tells every bot process about writes to tables they cache, see Database.add_cache_listener
+-- payloads look like table:operation:key[:value], operation is the first letter of TG_OP
+CREATE FUNCTION notify_cache_change() RETURNS TRIGGER AS $$
+DECLARE
+    row_data JSONB;
+    payload TEXT;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        row_data := to_jsonb(OLD);
+    ELSE
+        row_data := to_jsonb(NEW);
+    END IF;
+
+    payload := TG_TABLE_NAME || ':' || left(TG_OP, 1) || ':' || (row_data ->> TG_ARGV[0]);
+
+    IF TG_NARGS > 1 THEN
+        payload := payload || ':' || coalesce(row_data ->> TG_ARGV[1], '');
+    END IF;
+
+    -- only sent on commit, identical payloads in one transaction are sent once
+    PERFORM pg_notify('discord_chan_cache', payload);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER enabled_features_notify_cache
+AFTER INSERT OR UPDATE OR DELETE ON enabled_features
+FOR EACH ROW EXECUTE FUNCTION notify_cache_change('guild_id', 'feature_name');
+
+CREATE TRIGGER coins_notify_cache
+AFTER INSERT OR UPDATE OR DELETE ON coins
+FOR EACH ROW EXECUTE FUNCTION notify_cache_change('user_id');
+
+CREATE TRIGGER minecraft_default_servers_notify_cache
+AFTER INSERT OR UPDATE OR DELETE ON minecraft_default_servers
+FOR EACH ROW EXECUTE FUNCTION notify_cache_change('guild_id', 'server_id');
@@ -0,0 +1,6 @@
+-- long snipe content is stored zlib compressed, see compress_snipe_content
+-- existing rows are compressed in batches by Database.rewrite_snipe_content
+-- since postgres has no zlib to do it here, progress is kept by migration 0016
+ALTER TABLE snipes ADD COLUMN content_compressed BYTEA;
+ALTER TABLE snipes ADD CONSTRAINT snipes_content_or_compressed
+    CHECK (content IS NULL OR content_compressed IS NULL);
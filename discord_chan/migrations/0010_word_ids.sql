@@ -0,0 +1,47 @@
+-- every distinct word is stored once, word track tables refer to it by id
+CREATE TABLE words (
+    id INT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    text TEXT NOT NULL UNIQUE
+);
+
+INSERT INTO words (text) SELECT DISTINCT word FROM word_track WHERE word IS NOT NULL;
+
+-- rebuilt rather than updated in place so the old rows don't leave the tables bloated
+CREATE TABLE word_track_by_id (
+    server BIGINT NOT NULL,
+    author BIGINT NOT NULL,
+    word_id INT NOT NULL REFERENCES words (id),
+    count INT NOT NULL,
+    PRIMARY KEY (server, author, word_id)
+);
+
+INSERT INTO word_track_by_id (server, author, word_id, count)
+SELECT server, author, words.id, count
+FROM word_track JOIN words ON words.text = word_track.word;
+
+DROP TABLE word_track;
+ALTER TABLE word_track_by_id RENAME TO word_track;
+ALTER INDEX word_track_by_id_pkey RENAME TO word_track_pkey;
+ALTER TABLE word_track RENAME CONSTRAINT word_track_by_id_word_id_fkey TO word_track_word_id_fkey;
+
+-- per word member rankings
+CREATE INDEX word_track_server_word_idx ON word_track (server, word_id);
+
+CREATE TABLE word_track_server_words_by_id (
+    server BIGINT NOT NULL,
+    word_id INT NOT NULL REFERENCES words (id),
+    count BIGINT NOT NULL,
+    PRIMARY KEY (server, word_id)
+);
+
+INSERT INTO word_track_server_words_by_id (server, word_id, count)
+SELECT server, words.id, count
+FROM word_track_server_words JOIN words ON words.text = word_track_server_words.word;
+
+DROP TABLE word_track_server_words;
+ALTER TABLE word_track_server_words_by_id RENAME TO word_track_server_words;
+ALTER INDEX word_track_server_words_by_id_pkey RENAME TO word_track_server_words_pkey;
+ALTER TABLE word_track_server_words
+    RENAME CONSTRAINT word_track_server_words_by_id_word_id_fkey TO word_track_server_words_word_id_fkey;
+
+CREATE INDEX word_track_server_words_count_idx ON word_track_server_words (server, count DESC, word_id);
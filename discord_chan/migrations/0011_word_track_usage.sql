@@ -0,0 +1,26 @@
+-- word track counts over time, written in hour buckets and compacted into
+-- day then month buckets as they age, see Database.compact_word_usage
+-- buckets of different resolutions never overlap so summing every bucket
+-- in a range never counts a word twice
+CREATE TABLE word_track_word_usage (
+    server BIGINT NOT NULL,
+    word_id INT NOT NULL REFERENCES words (id),
+    bucket TIMESTAMPTZ NOT NULL,
+    resolution TEXT NOT NULL CHECK (resolution IN ('hour', 'day', 'month')),
+    count BIGINT NOT NULL,
+    PRIMARY KEY (server, word_id, bucket, resolution)
+);
+
+-- top words since a time, the included columns let it be read off the index alone
+CREATE INDEX word_track_word_usage_bucket_idx ON word_track_word_usage (server, bucket) INCLUDE (word_id, count);
+
+CREATE TABLE word_track_author_usage (
+    server BIGINT NOT NULL,
+    author BIGINT NOT NULL,
+    bucket TIMESTAMPTZ NOT NULL,
+    resolution TEXT NOT NULL CHECK (resolution IN ('hour', 'day', 'month')),
+    count BIGINT NOT NULL,
+    PRIMARY KEY (server, author, bucket, resolution)
+);
+
+CREATE INDEX word_track_author_usage_bucket_idx ON word_track_author_usage (server, bucket) INCLUDE (author, count);
@@ -0,0 +1,10 @@
+-- periodic snapshots of the in memory heavy hitter sketches, see discord_chan.heavy_hitters
+-- scope_id is a channel or server id, 0 for the sketch over every server
+CREATE TABLE word_track_heavy_hitters (
+    scope TEXT NOT NULL CHECK (scope IN ('channel', 'server', 'all')),
+    scope_id BIGINT NOT NULL,
+    data JSONB NOT NULL,
+    -- NULL never expires
+    expires TIMESTAMPTZ,
+    PRIMARY KEY (scope, scope_id)
+);
@@ -0,0 +1,4 @@
+-- a word's top members are read straight off the index, in order and without
+-- visiting the table
+DROP INDEX word_track_server_word_idx;
+CREATE INDEX word_track_server_word_idx ON word_track (server, word_id, count DESC) INCLUDE (author);
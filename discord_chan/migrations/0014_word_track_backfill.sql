@@ -0,0 +1,13 @@
+-- per channel progress of seeding word track from message history, see
+-- discord_chan.word_track.WordTrackBackfill
+-- history is walked newest to oldest starting from when word track was enabled,
+-- so nothing counted live is counted again
+CREATE TABLE word_track_backfill (
+    server BIGINT NOT NULL,
+    channel BIGINT NOT NULL,
+    -- messages older than this are still to be counted
+    before BIGINT NOT NULL,
+    messages BIGINT NOT NULL DEFAULT 0,
+    done BOOLEAN NOT NULL DEFAULT false,
+    PRIMARY KEY (server, channel)
+);
@@ -0,0 +1,31 @@
+-- a month's partition can't be created while the default partition holds rows
+-- for that month, they're moved out of it into the new partition instead
+CREATE OR REPLACE FUNCTION create_snipe_partition(month_start TIMESTAMPTZ) RETURNS TEXT AS $$
+DECLARE
+    start_month TIMESTAMPTZ := date_trunc('month', month_start, 'UTC');
+    start_time FLOAT := extract(epoch FROM start_month);
+    end_time FLOAT := extract(epoch FROM start_month + interval '1 month');
+    partition_name TEXT := 'snipes_p' || to_char(start_month AT TIME ZONE 'UTC', 'YYYYMM');
+BEGIN
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN partition_name;
+    END IF;
+
+    CREATE TEMP TABLE snipes_moved_from_default ON COMMIT DROP AS
+    SELECT * FROM snipes_default WHERE time >= start_time AND time < end_time;
+
+    DELETE FROM snipes_default WHERE time >= start_time AND time < end_time;
+
+    EXECUTE format(
+        'CREATE TABLE %I PARTITION OF snipes FOR VALUES FROM (%s) TO (%s)',
+        partition_name,
+        start_time,
+        end_time
+    );
+
+    INSERT INTO snipes OVERRIDING SYSTEM VALUE SELECT * FROM snipes_moved_from_default;
+    DROP TABLE snipes_moved_from_default;
+
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,9 @@
+-- progress of Database.rewrite_snipe_content, a single row; once done the
+-- rewrite isn't run again, new snipes are stored the right way when written
+CREATE TABLE snipe_content_rewrite (
+    id BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+    last_snipe_id BIGINT NOT NULL DEFAULT 0,
+    done BOOLEAN NOT NULL DEFAULT false
+);
+
+INSERT INTO snipe_content_rewrite DEFAULT VALUES;
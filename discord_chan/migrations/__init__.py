@@ -0,0 +1,79 @@
+import pathlib
+from typing import NamedTuple
+
+import asyncpg
+from loguru import logger
+
+MIGRATIONS_PATH = pathlib.Path(__file__).parent
+# arbitrary key so only one process migrates at a time
+MIGRATION_LOCK_ID = 0xD15C0C4A
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    path: pathlib.Path
+
+
+def get_migrations() -> list[Migration]:
+    """
+    Get the migration files in this directory sorted by version,
+    files are named like 0001_some_name.sql
+    """
+    migrations: list[Migration] = []
+
+    for path in MIGRATIONS_PATH.glob("[0-9]*.sql"):
+        version, _, name = path.stem.partition("_")
+        migrations.append(Migration(int(version), name, path))
+
+    migrations.sort(key=lambda migration: migration.version)
+
+    versions = [migration.version for migration in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Duplicate migration versions found: {versions}")
+
+    return migrations
+
+
+async def apply_migrations(connection: asyncpg.Connection) -> int:
+    """
+    Apply every migration not yet recorded in schema_version
+
+    :return: Number of migrations applied
+    """
+    applied = 0
+
+    await connection.execute("SELECT pg_advisory_lock($1);", MIGRATION_LOCK_ID)
+
+    try:
+        await connection.execute(
+            "CREATE TABLE IF NOT EXISTS schema_version ("
+            "version INT PRIMARY KEY, "
+            "name TEXT NOT NULL, "
+            "applied_at TIMESTAMPTZ NOT NULL DEFAULT now());"
+        )
+
+        applied_versions = {
+            record["version"]
+            for record in await connection.fetch("SELECT version FROM schema_version;")
+        }
+
+        for migration in get_migrations():
+            if migration.version in applied_versions:
+                continue
+
+            logger.info(f"Applying migration {migration.version} ({migration.name})")
+
+            async with connection.transaction():
+                await connection.execute(migration.path.read_text())
+                await connection.execute(
+                    "INSERT INTO schema_version (version, name) VALUES ($1, $2);",
+                    migration.version,
+                    migration.name,
+                )
+
+            applied += 1
+    finally:
+        await connection.execute("SELECT pg_advisory_unlock($1);", MIGRATION_LOCK_ID)
+
+    return applied
@@ -0,0 +1,586 @@
+import time
+from typing import Any, NamedTuple
+
+import asyncpg
+from loguru import logger
+
+from . import metrics
+from .utils import LRU
+
+
+class Query(NamedTuple):
+    name: str
+    sql: str
+
+
+_registry: dict[str, Query] = {}
+
+hits = metrics.counter("queries.hits")
+prepares = metrics.counter("queries.prepares")
+reprepares = metrics.counter("queries.reprepares")
+# queries run with no arguments, asyncpg sends these as plain text without preparing
+unprepared = metrics.counter("queries.unprepared")
+
+# asyncpg's own default, used until the pool's init hook sets the real size
+DEFAULT_STATEMENT_CACHE_SIZE = 100
+
+
+def register(name: str, sql: str) -> Query:
+    """
+    Register a named statement, registering the same name and sql again is a no-op
+    """
+    if (existing := _registry.get(name)) is not None:
+        if existing.sql != sql:
+            raise ValueError(f"Query {name} is already registered with different sql")
+
+        return existing
+
+    query = _registry[name] = Query(name, sql)
+    return query
+
+
+def get_queries() -> list[Query]:
+    return list(_registry.values())
+
+
+class QueryConnection(asyncpg.Connection):
+    """
+    Connection that runs registered queries through asyncpg's statement cache
+
+    every registered query has one fixed text so each is parsed and planned once
+    per connection, as long as statement_cache_size covers the registry
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # sql of the registered queries in asyncpg's statement cache, kept in the
+        # same lru order so evicted statements are counted as prepares again
+        self._cached_statements: LRU = LRU(maxsize=DEFAULT_STATEMENT_CACHE_SIZE)
+
+    def set_statement_cache_size(self, size: int):
+        """
+        Match the statement_cache_size the connection was made with
+        """
+        self._cached_statements.maxsize = size
+
+        while len(self._cached_statements) > size:
+            self._cached_statements.popitem(last=False)
+
+    def _count_statement(self, query: Query):
+        if query.sql in self._cached_statements:
+            self._cached_statements.move_to_end(query.sql)
+            hits.inc()
+        else:
+            self._cached_statements[query.sql] = None
+            prepares.inc()
+
+    async def _run_query(self, query: Query, method: str, *args: Any) -> Any:
+        start = time.perf_counter()
+
+        try:
+            return await self._run_statement(query, method, *args)
+        finally:
+            metrics.histogram(f"queries.latency.{query.name}").observe(
+                time.perf_counter() - start
+            )
+
+    async def _run_statement(self, query: Query, method: str, *args: Any) -> Any:
+        if method == "execute" and not args:
+            unprepared.inc()
+            return await self.execute(query.sql)
+
+        self._count_statement(query)
+
+        try:
+            return await getattr(self, method)(query.sql, *args)
+        except (
+            asyncpg.InvalidCachedStatementError,
+            asyncpg.exceptions.OutdatedSchemaCacheError,
+        ):
+            # asyncpg empties its statement cache on these
+            self._cached_statements.clear()
+
+            # the schema changed under the statement, inside a transaction
+            # the error has already aborted it so it can't be retried here
+            if self.is_in_transaction():
+                raise
+
+            logger.debug(f"Re-preparing query {query.name}")
+            self._cached_statements[query.sql] = None
+            reprepares.inc()
+            return await getattr(self, method)(query.sql, *args)
+
+    async def fetch_query(self, query: Query, *args: Any) -> list[asyncpg.Record]:
+        return await self._run_query(query, "fetch", *args)
+
+    async def fetchrow_query(self, query: Query, *args: Any) -> asyncpg.Record | None:
+        return await self._run_query(query, "fetchrow", *args)
+
+    async def fetchval_query(self, query: Query, *args: Any) -> Any:
+        return await self._run_query(query, "fetchval", *args)
+
+    async def execute_query(self, query: Query, *args: Any):
+        await self._run_query(query, "execute", *args)
+
+
+# minecraft
+UPDATE_DEFAULT_MINECRAFT_SERVER = register(
+    "minecraft.update_default_server",
+    "INSERT INTO minecraft_default_servers (guild_id, server_id) VALUES ($1, $2) "
+    "ON CONFLICT (guild_id) DO UPDATE SET server_id = EXCLUDED.server_id;",
+)
+GET_DEFAULT_MINECRAFT_SERVER = register(
+    "minecraft.get_default_server",
+    "SELECT guild_id, server_id FROM minecraft_default_servers WHERE guild_id = $1;",
+)
+UPDATE_MINECRAFT_USERNAME = register(
+    "minecraft.update_username",
+    "INSERT INTO minecraft_usernames (user_id, username) VALUES ($1, $2) "
+    "ON CONFLICT (user_id) DO UPDATE SET username = EXCLUDED.username;",
+)
+GET_MINECRAFT_USERNAMES = register(
+    "minecraft.get_usernames",
+    "SELECT user_id, username FROM minecraft_usernames;",
+)
+GET_MINECRAFT_USERNAME = register(
+    "minecraft.get_username",
+    "SELECT user_id, username FROM minecraft_usernames WHERE user_id = $1;",
+)
+
+# word track
+# words are interned in the words table, see Database.get_word_ids
+# only words that are missing are inserted so conflicts don't burn ids, the
+# ON CONFLICT covers another process inserting the same word at the same time
+GET_OR_CREATE_WORD_IDS = register(
+    "word_track.get_or_create_word_ids",
+    "WITH input (text) AS ("
+    "SELECT DISTINCT unnest($1::TEXT[])"
+    "), inserted AS ("
+    "INSERT INTO words (text) "
+    "SELECT text FROM input WHERE NOT EXISTS (SELECT 1 FROM words WHERE words.text = input.text) "
+    "ON CONFLICT (text) DO NOTHING RETURNING id, text"
+    ") SELECT id, text FROM inserted "
+    "UNION ALL SELECT words.id, words.text FROM words JOIN input USING (text);",
+)
+# the aggregate tables are updated in the same statement as word_track so they can't drift
+UPDATE_WORD_TRACK_WORDS = register(
+    "word_track.update_words",
+    "WITH input (server, author, word_id, amount) AS ("
+    "SELECT * FROM unnest($1::BIGINT[], $2::BIGINT[], $3::INT[], $4::INT[])"
+    "), upserted AS ("
+    "INSERT INTO word_track (server, author, word_id, count) "
+    "SELECT server, author, word_id, amount FROM input "
+    "ON CONFLICT (server, author, word_id) DO UPDATE SET count = EXCLUDED.count + word_track.count "
+    "RETURNING server, author, (xmax = 0) AS inserted"
+    "), server_words AS ("
+    "INSERT INTO word_track_server_words (server, word_id, count) "
+    "SELECT server, word_id, sum(amount) FROM input GROUP BY server, word_id "
+    "ON CONFLICT (server, word_id) DO UPDATE SET count = word_track_server_words.count + EXCLUDED.count"
+    "), word_usage AS ("
+    "INSERT INTO word_track_word_usage (server, word_id, bucket, resolution, count) "
+    "SELECT server, word_id, date_trunc('hour', now(), 'UTC'), 'hour', sum(amount) "
+    "FROM input GROUP BY server, word_id "
+    "ON CONFLICT (server, word_id, bucket, resolution) "
+    "DO UPDATE SET count = word_track_word_usage.count + EXCLUDED.count"
+    "), author_totals AS ("
+    "SELECT server, author, sum(amount) AS total_words FROM input GROUP BY server, author"
+    "), author_usage AS ("
+    "INSERT INTO word_track_author_usage (server, author, bucket, resolution, count) "
+    "SELECT server, author, date_trunc('hour', now(), 'UTC'), 'hour', total_words "
+    "FROM author_totals "
+    "ON CONFLICT (server, author, bucket, resolution) "
+    "DO UPDATE SET count = word_track_author_usage.count + EXCLUDED.count"
+    "), author_new_words AS ("
+    "SELECT server, author, count(*) FILTER (WHERE inserted) AS unique_words "
+    "FROM upserted GROUP BY server, author"
+    ") INSERT INTO word_track_server_authors (server, author, unique_words, total_words) "
+    "SELECT server, author, unique_words, total_words "
+    "FROM author_totals JOIN author_new_words USING (server, author) "
+    "ON CONFLICT (server, author) DO UPDATE SET "
+    "unique_words = word_track_server_authors.unique_words + EXCLUDED.unique_words, "
+    "total_words = word_track_server_authors.total_words + EXCLUDED.total_words;",
+)
+GET_SERVER_WORD_LEADERBOARD = register(
+    "word_track.server_leaderboard",
+    "SELECT words.text AS word, count FROM word_track_server_words "
+    "JOIN words ON words.id = word_track_server_words.word_id WHERE server = $1 "
+    "ORDER BY count DESC;",
+)
+GET_MEMBER_WORD_LEADERBOARD = register(
+    "word_track.member_leaderboard",
+    "SELECT words.text AS word, count FROM word_track "
+    "JOIN words ON words.id = word_track.word_id WHERE server = $1 AND author = $2 "
+    "ORDER BY count DESC;",
+)
+# the member's counts of only the given words, straight off word_track's primary key
+GET_MEMBER_WORD_COUNTS = register(
+    "word_track.member_word_counts",
+    "SELECT words.text AS word, count FROM word_track "
+    "JOIN words ON words.id = word_track.word_id "
+    "WHERE server = $1 AND author = $2 "
+    "AND word_id = ANY(SELECT id FROM words WHERE text = ANY($3::TEXT[])) "
+    "ORDER BY count DESC;",
+)
+GET_MEMBER_WORD_STATS = register(
+    "word_track.member_stats",
+    "SELECT unique_words, total_words FROM word_track_server_authors "
+    "WHERE server = $1 AND author = $2;",
+)
+# a word's server count and rank with its top members, no rows if it was never used
+# the rank is what RANK() OVER (ORDER BY count DESC) would give, counted off the
+# (server, count DESC) index rather than ranking every word in the server
+GET_WORD_RANK = register(
+    "word_track.word_rank",
+    "SELECT server_word.count AS server_count, ("
+    "SELECT count(*) FROM word_track_server_words AS other "
+    "WHERE other.server = server_word.server AND other.count > server_word.count"
+    ") + 1 AS server_rank, top.author, top.count "
+    "FROM word_track_server_words AS server_word "
+    "LEFT JOIN LATERAL (SELECT author, count FROM word_track "
+    "WHERE server = server_word.server AND word_id = server_word.word_id "
+    "ORDER BY count DESC LIMIT $3) AS top ON true "
+    "WHERE server_word.server = $1 "
+    "AND server_word.word_id = (SELECT id FROM words WHERE text = $2) "
+    "ORDER BY top.count DESC;",
+)
+# the paged leaderboards return one row per entry, each carrying the total number
+# of entries; an empty page comes back as a single row with a NULL key
+GET_SERVER_WORD_LEADERBOARD_PAGE = register(
+    "word_track.server_leaderboard_page",
+    "SELECT total.count AS total, page.key, page.count "
+    "FROM (SELECT count(*) FROM word_track_server_words WHERE server = $1) AS total "
+    "LEFT JOIN LATERAL (SELECT words.text AS key, top.count "
+    "FROM (SELECT word_id, count FROM word_track_server_words WHERE server = $1 "
+    "ORDER BY count DESC, word_id LIMIT $2 OFFSET $3) AS top "
+    "JOIN words ON words.id = top.word_id "
+    "ORDER BY top.count DESC, top.word_id) AS page ON true;",
+)
+GET_UNIQUE_WORD_LEADERBOARD_PAGE = register(
+    "word_track.unique_word_leaderboard_page",
+    "SELECT total.count AS total, page.key, page.count "
+    "FROM (SELECT count(DISTINCT author) FROM word_track_server_authors) AS total "
+    "LEFT JOIN LATERAL (SELECT author AS key, sum(unique_words)::BIGINT AS count "
+    "FROM word_track_server_authors GROUP BY author "
+    "ORDER BY count DESC, author LIMIT $1 OFFSET $2) AS page ON true;",
+)
+GET_SERVER_UNIQUE_WORD_LEADERBOARD_PAGE = register(
+    "word_track.server_unique_word_leaderboard_page",
+    "SELECT total.count AS total, page.key, page.count "
+    "FROM (SELECT count(*) FROM word_track_server_authors WHERE server = $1) AS total "
+    "LEFT JOIN LATERAL (SELECT author AS key, unique_words AS count "
+    "FROM word_track_server_authors WHERE server = $1 "
+    "ORDER BY unique_words DESC, author LIMIT $2 OFFSET $3) AS page ON true;",
+)
+GET_TOTAL_WORD_LEADERBOARD_PAGE = register(
+    "word_track.total_word_leaderboard_page",
+    "SELECT total.count AS total, page.key, page.count "
+    "FROM (SELECT count(DISTINCT author) FROM word_track_server_authors) AS total "
+    "LEFT JOIN LATERAL (SELECT author AS key, sum(total_words)::BIGINT AS count "
+    "FROM word_track_server_authors GROUP BY author "
+    "ORDER BY count DESC, author LIMIT $1 OFFSET $2) AS page ON true;",
+)
+GET_SERVER_TOTAL_WORD_LEADERBOARD_PAGE = register(
+    "word_track.server_total_word_leaderboard_page",
+    "SELECT total.count AS total, page.key, page.count "
+    "FROM (SELECT count(*) FROM word_track_server_authors WHERE server = $1) AS total "
+    "LEFT JOIN LATERAL (SELECT author AS key, total_words AS count "
+    "FROM word_track_server_authors WHERE server = $1 "
+    "ORDER BY total_words DESC, author LIMIT $2 OFFSET $3) AS page ON true;",
+)
+# usage over time, the since bound is moved back to the start of the bucket it
+# falls in so the bucket it's in is counted whole rather than left out
+GET_WORD_USAGE = register(
+    "word_track.word_usage",
+    "SELECT bucket, resolution, count FROM word_track_word_usage "
+    "WHERE server = $1 AND word_id = (SELECT id FROM words WHERE text = $2) "
+    "AND bucket >= $3 ORDER BY bucket;",
+)
+GET_WORD_USAGE_LEADERBOARD_PAGE = register(
+    "word_track.word_usage_leaderboard_page",
+    "SELECT total.count AS total, page.key, page.count "
+    "FROM (SELECT count(DISTINCT word_id) FROM word_track_word_usage "
+    "WHERE server = $1 AND bucket >= $2) AS total "
+    "LEFT JOIN LATERAL (SELECT words.text AS key, top.count "
+    "FROM (SELECT word_id, sum(count)::BIGINT AS count FROM word_track_word_usage "
+    "WHERE server = $1 AND bucket >= $2 GROUP BY word_id "
+    "ORDER BY count DESC, word_id LIMIT $3 OFFSET $4) AS top "
+    "JOIN words ON words.id = top.word_id "
+    "ORDER BY top.count DESC, top.word_id) AS page ON true;",
+)
+GET_AUTHOR_USAGE_LEADERBOARD_PAGE = register(
+    "word_track.author_usage_leaderboard_page",
+    "SELECT total.count AS total, page.key, page.count "
+    "FROM (SELECT count(DISTINCT author) FROM word_track_author_usage "
+    "WHERE server = $1 AND bucket >= $2) AS total "
+    "LEFT JOIN LATERAL (SELECT author AS key, sum(count)::BIGINT AS count "
+    "FROM word_track_author_usage WHERE server = $1 AND bucket >= $2 GROUP BY author "
+    "ORDER BY count DESC, author LIMIT $3 OFFSET $4) AS page ON true;",
+)
+# moves the buckets of resolution $1 older than $3 into buckets of resolution $2,
+# $3 is always the start of a $2 bucket so no bucket is ever compacted in parts
+COMPACT_WORD_USAGE = register(
+    "word_track.compact_word_usage",
+    "WITH moved AS ("
+    "DELETE FROM word_track_word_usage WHERE resolution = $1 AND bucket < $3 "
+    "RETURNING server, word_id, date_trunc($2, bucket, 'UTC') AS bucket, count"
+    ") INSERT INTO word_track_word_usage (server, word_id, bucket, resolution, count) "
+    "SELECT server, word_id, bucket, $2, sum(count) FROM moved GROUP BY server, word_id, bucket "
+    "ON CONFLICT (server, word_id, bucket, resolution) "
+    "DO UPDATE SET count = word_track_word_usage.count + EXCLUDED.count;",
+)
+COMPACT_AUTHOR_USAGE = register(
+    "word_track.compact_author_usage",
+    "WITH moved AS ("
+    "DELETE FROM word_track_author_usage WHERE resolution = $1 AND bucket < $3 "
+    "RETURNING server, author, date_trunc($2, bucket, 'UTC') AS bucket, count"
+    ") INSERT INTO word_track_author_usage (server, author, bucket, resolution, count) "
+    "SELECT server, author, bucket, $2, sum(count) FROM moved GROUP BY server, author, bucket "
+    "ON CONFLICT (server, author, bucket, resolution) "
+    "DO UPDATE SET count = word_track_author_usage.count + EXCLUDED.count;",
+)
+
+# exports are run through COPY which can't use prepared statements, see Database._copy_export
+EXPORT_WORD_TRACK = (
+    "SELECT author, words.text AS word, count FROM word_track "
+    "JOIN words ON words.id = word_track.word_id WHERE server = $1"
+)
+# backfilled counts are copied into a temp table and added from there, the usage
+# tables are left alone since their buckets are for when words were counted
+CREATE_WORD_TRACK_BACKFILL_INPUT = (
+    "CREATE TEMP TABLE IF NOT EXISTS word_track_backfill_input "
+    "(server BIGINT, author BIGINT, word_id INT, amount INT) ON COMMIT DELETE ROWS;"
+)
+BACKFILL_WORD_TRACK_WORDS = register(
+    "word_track.backfill_words",
+    "WITH input AS ("
+    "SELECT server, author, word_id, amount FROM word_track_backfill_input"
+    "), upserted AS ("
+    "INSERT INTO word_track (server, author, word_id, count) "
+    "SELECT server, author, word_id, amount FROM input "
+    "ON CONFLICT (server, author, word_id) DO UPDATE SET count = EXCLUDED.count + word_track.count "
+    "RETURNING server, author, (xmax = 0) AS inserted"
+    "), server_words AS ("
+    "INSERT INTO word_track_server_words (server, word_id, count) "
+    "SELECT server, word_id, sum(amount) FROM input GROUP BY server, word_id "
+    "ON CONFLICT (server, word_id) DO UPDATE SET count = word_track_server_words.count + EXCLUDED.count"
+    "), author_totals AS ("
+    "SELECT server, author, sum(amount) AS total_words FROM input GROUP BY server, author"
+    "), author_new_words AS ("
+    "SELECT server, author, count(*) FILTER (WHERE inserted) AS unique_words "
+    "FROM upserted GROUP BY server, author"
+    ") INSERT INTO word_track_server_authors (server, author, unique_words, total_words) "
+    "SELECT server, author, unique_words, total_words "
+    "FROM author_totals JOIN author_new_words USING (server, author) "
+    "ON CONFLICT (server, author) DO UPDATE SET "
+    "unique_words = word_track_server_authors.unique_words + EXCLUDED.unique_words, "
+    "total_words = word_track_server_authors.total_words + EXCLUDED.total_words;",
+)
+CREATE_WORD_TRACK_BACKFILL = register(
+    "word_track.create_backfill",
+    "INSERT INTO word_track_backfill (server, channel, before) "
+    "SELECT $1, unnest($2::BIGINT[]), $3 ON CONFLICT (server, channel) DO NOTHING;",
+)
+GET_WORD_TRACK_BACKFILL = register(
+    "word_track.get_backfill",
+    "SELECT server, channel, before, messages, done FROM word_track_backfill "
+    "WHERE server = $1;",
+)
+GET_UNFINISHED_WORD_TRACK_BACKFILLS = register(
+    "word_track.get_unfinished_backfills",
+    "SELECT server, channel, before, messages, done FROM word_track_backfill "
+    "WHERE NOT done;",
+)
+UPDATE_WORD_TRACK_BACKFILL = register(
+    "word_track.update_backfill",
+    "UPDATE word_track_backfill SET before = $3, messages = $4, done = $5 "
+    "WHERE server = $1 AND channel = $2;",
+)
+# heavy hitter snapshots, see discord_chan.heavy_hitters
+GET_HEAVY_HITTER_SNAPSHOTS = register(
+    "word_track.get_heavy_hitter_snapshots",
+    "SELECT scope, scope_id, data::TEXT AS data, "
+    "extract(epoch FROM expires)::FLOAT AS expires FROM word_track_heavy_hitters "
+    "WHERE expires IS NULL OR expires > now();",
+)
+SAVE_HEAVY_HITTER_SNAPSHOTS = register(
+    "word_track.save_heavy_hitter_snapshots",
+    "INSERT INTO word_track_heavy_hitters (scope, scope_id, data, expires) "
+    "SELECT scope, scope_id, data, to_timestamp(expires) "
+    "FROM unnest($1::TEXT[], $2::BIGINT[], $3::JSONB[], $4::FLOAT[]) "
+    "AS input (scope, scope_id, data, expires) "
+    "ON CONFLICT (scope, scope_id) DO UPDATE SET "
+    "data = EXCLUDED.data, expires = EXCLUDED.expires;",
+)
+DELETE_EXPIRED_HEAVY_HITTER_SNAPSHOTS = register(
+    "word_track.delete_expired_heavy_hitter_snapshots",
+    "DELETE FROM word_track_heavy_hitters WHERE expires <= now();",
+)
+
+# features
+GET_ALL_ENABLED_FEATURES = register(
+    "features.get_all_enabled",
+    "SELECT guild_id, feature_name FROM enabled_features;",
+)
+GET_GUILD_ENABLED_FEATURES = register(
+    "features.get_guild_enabled",
+    "SELECT feature_name FROM enabled_features WHERE guild_id = $1;",
+)
+ENABLE_GUILD_FEATURE = register(
+    "features.enable",
+    "INSERT INTO enabled_features (guild_id, feature_name) VALUES ($1, $2);",
+)
+DISABLE_GUILD_FEATURE = register(
+    "features.disable",
+    "DELETE FROM enabled_features WHERE guild_id = $1 AND feature_name = $2;",
+)
+PURGE_FEATURE = register(
+    "features.purge",
+    "DELETE FROM enabled_features WHERE feature_name = $1;",
+)
+
+# coins
+DELETE_COIN_ACCOUNT = register(
+    "coins.delete_account",
+    "DELETE FROM coins WHERE user_id = $1;",
+)
+GET_COIN_BALANCE = register(
+    "coins.get_balance",
+    "SELECT amount FROM coins WHERE user_id = $1;",
+)
+GET_COIN_BALANCES_PAGE = register(
+    "coins.get_balances_page",
+    "SELECT total.count AS total, page.key, page.count "
+    "FROM (SELECT count(*) FROM coins) AS total "
+    "LEFT JOIN LATERAL (SELECT user_id AS key, amount AS count FROM coins "
+    "ORDER BY amount DESC, user_id LIMIT $1 OFFSET $2) AS page ON true;",
+)
+SET_COINS = register(
+    "coins.set",
+    "INSERT INTO coins (user_id, amount) VALUES ($1, $2) "
+    "ON CONFLICT (user_id) DO UPDATE SET amount = EXCLUDED.amount;",
+)
+ADD_COINS = register(
+    "coins.add",
+    "INSERT INTO coins (user_id, amount) VALUES ($1, $2) "
+    "ON CONFLICT (user_id) DO UPDATE SET amount = coins.amount + EXCLUDED.amount "
+    "RETURNING amount;",
+)
+ADD_COINS_IF_FUNDED = register(
+    "coins.add_if_funded",
+    "UPDATE coins SET amount = amount + $2 "
+    "WHERE user_id = $1 AND amount >= $3 RETURNING amount;",
+)
+TRANSFER_COINS = register(
+    "coins.transfer",
+    "WITH debit AS ("
+    "UPDATE coins SET amount = amount - $3 "
+    "WHERE user_id = $1 AND amount >= $3 RETURNING amount"
+    "), credit AS ("
+    "INSERT INTO coins (user_id, amount) SELECT $2, $3 FROM debit "
+    "ON CONFLICT (user_id) DO UPDATE SET amount = coins.amount + EXCLUDED.amount"
+    ") SELECT amount FROM debit;",
+)
+GET_COIN_STAKE = register(
+    "coins.get_stake",
+    "SELECT amount, bitcoin_price FROM stakes WHERE user_id = $1;",
+)
+SET_COIN_STAKE = register(
+    "coins.set_stake",
+    "INSERT INTO stakes (user_id, amount, bitcoin_price) VALUES ($1, $2, $3) "
+    "ON CONFLICT (user_id) DO UPDATE SET amount = EXCLUDED.amount, bitcoin_price = EXCLUDED.bitcoin_price;",
+)
+STAKE_COINS = register(
+    "coins.stake",
+    "WITH debit AS ("
+    "UPDATE coins SET amount = amount - $2 "
+    "WHERE user_id = $1 AND amount >= $2 RETURNING user_id"
+    ") INSERT INTO stakes (user_id, amount, bitcoin_price) "
+    "SELECT user_id, $2, $3 FROM debit "
+    "ON CONFLICT (user_id) DO UPDATE SET "
+    "amount = stakes.amount * (EXCLUDED.bitcoin_price / stakes.bitcoin_price) + EXCLUDED.amount, "
+    "bitcoin_price = EXCLUDED.bitcoin_price "
+    "RETURNING amount, (xmax = 0) AS created;",
+)
+EXIT_COIN_STAKE = register(
+    "coins.exit_stake",
+    "WITH stake AS ("
+    "DELETE FROM stakes WHERE user_id = $1 RETURNING amount, bitcoin_price"
+    "), payout AS ("
+    "SELECT amount AS staked, floor(amount * ($2 / bitcoin_price))::BIGINT AS payout FROM stake"
+    "), credit AS ("
+    "INSERT INTO coins (user_id, amount) SELECT $1, payout FROM payout "
+    "ON CONFLICT (user_id) DO UPDATE SET amount = coins.amount + EXCLUDED.amount"
+    ") SELECT staked, payout FROM payout;",
+)
+
+# snipes, the filtered snipe queries are registered per filter shape in Database
+GET_SNIPE_LEADERBOARD_PAGE = register(
+    "snipes.leaderboard_page",
+    "SELECT total.count AS total, page.key, page.count "
+    "FROM (SELECT count(DISTINCT author) FROM snipes) AS total "
+    "LEFT JOIN LATERAL (SELECT author AS key, count(*) FROM snipes GROUP BY author "
+    "ORDER BY count DESC, author LIMIT $1 OFFSET $2) AS page ON true;",
+)
+GET_SERVER_SNIPE_LEADERBOARD_PAGE = register(
+    "snipes.server_leaderboard_page",
+    "SELECT total.count AS total, page.key, page.count "
+    "FROM (SELECT count(DISTINCT author) FROM snipes WHERE server = $1) AS total "
+    "LEFT JOIN LATERAL (SELECT author AS key, count(*) FROM snipes WHERE server = $1 "
+    "GROUP BY author ORDER BY count DESC, author LIMIT $2 OFFSET $3) AS page ON true;",
+)
+GET_SNIPE_CONTENT_REWRITE = register(
+    "snipes.get_content_rewrite",
+    "SELECT last_snipe_id, done FROM snipe_content_rewrite;",
+)
+SET_SNIPE_CONTENT_REWRITE = register(
+    "snipes.set_content_rewrite",
+    "UPDATE snipe_content_rewrite SET last_snipe_id = $1, done = $2;",
+)
+# keyset on snipe_id so each batch doesn't rescan the ones before it,
+# compressed rows are all returned since they may be under the threshold now
+GET_SNIPES_TO_REWRITE = register(
+    "snipes.get_to_rewrite",
+    "SELECT snipe_id, time, content, content_compressed FROM snipes "
+    "WHERE snipe_id > $1 AND (content_compressed IS NOT NULL OR octet_length(content) >= $2) "
+    "ORDER BY snipe_id LIMIT $3;",
+)
+SET_SNIPE_CONTENT = register(
+    "snipes.set_content",
+    "UPDATE snipes SET content = input.content, content_compressed = input.content_compressed "
+    "FROM unnest($1::BIGINT[], $2::FLOAT[], $3::TEXT[], $4::BYTEA[]) "
+    "AS input (snipe_id, time, content, content_compressed) "
+    "WHERE snipes.snipe_id = input.snipe_id AND snipes.time = input.time;",
+)
+# there's no zlib in postgres, compressed content is left for the reader to inflate
+EXPORT_SNIPES = (
+    "SELECT id, mode, author, channel, to_timestamp(time) AS time, content, "
+    "encode(content_compressed, 'base64') AS content_compressed "
+    "FROM snipes WHERE server = $1"
+)
+GET_SNIPE_RETENTIONS = register(
+    "snipes.get_retentions",
+    "SELECT guild_id, days FROM snipe_retention;",
+)
+SET_SNIPE_RETENTION = register(
+    "snipes.set_retention",
+    "INSERT INTO snipe_retention (guild_id, days) VALUES ($1, $2) "
+    "ON CONFLICT (guild_id) DO UPDATE SET days = EXCLUDED.days;",
+)
+DELETE_SNIPE_RETENTION = register(
+    "snipes.delete_retention",
+    "DELETE FROM snipe_retention WHERE guild_id = $1;",
+)
+GET_SHORTEST_SNIPE_RETENTION = register(
+    "snipes.shortest_retention",
+    "SELECT min(days) FROM snipe_retention;",
+)
+CREATE_SNIPE_PARTITION = register(
+    "snipes.create_partition",
+    "SELECT create_snipe_partition($1);",
+)
+GET_SNIPE_PARTITIONS = register(
+    "snipes.get_partitions",
+    "SELECT child.relname FROM pg_inherits "
+    "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+    "WHERE pg_inherits.inhparent = 'snipes'::regclass;",
+)
@@ -1,11 +1,26 @@
+import asyncio
+import time
 from dataclasses import dataclass
 from enum import Enum
+from typing import TYPE_CHECKING
 
 from discord.ext import commands
+from loguru import logger
 from pendulum.datetime import DateTime
 
+from discord_chan import metrics
 from discord_chan.utils import to_discord_timestamp
 
+if TYPE_CHECKING:
+    from discord_chan.storage import Storage
+
+# max number of snipes waiting to be written before producers have to wait
+DEFAULT_MAX_QUEUED_SNIPES = 10_000
+# max number of snipes written per COPY
+DEFAULT_SNIPE_BATCH_SIZE = 500
+# number of seconds between timed flushes
+DEFAULT_SNIPE_FLUSH_INTERVAL = 2
+
 
 class SnipeMode(Enum):
     edited = 1
@@ -36,3 +51,101 @@ class Snipe:
     @property
     def discord_timestamp(self) -> str:
         return to_discord_timestamp(self.time)
+
+
+class SnipeWriter:
+    """
+    Bounded queue of snipes drained in the background with batched COPYs
+    """
+
+    def __init__(
+        self,
+        database: "Storage",
+        *,
+        max_queued: int = DEFAULT_MAX_QUEUED_SNIPES,
+        batch_size: int = DEFAULT_SNIPE_BATCH_SIZE,
+        flush_interval: float = DEFAULT_SNIPE_FLUSH_INTERVAL,
+    ):
+        self.database = database
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self.queue: asyncio.Queue[Snipe] = asyncio.Queue(maxsize=max_queued)
+        # batches that failed to write, retried before anything in the queue
+        self._retry: list[Snipe] = []
+        self._batch_ready = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._writer_task: asyncio.Task | None = None
+
+        self.flush_latency = metrics.histogram("snipes.flush_latency")
+        self.written = metrics.counter("snipes.written")
+        self.failed_flushes = metrics.counter("snipes.failed_flushes")
+        metrics.gauge("snipes.queued", lambda: self.queued)
+
+    @property
+    def queued(self) -> int:
+        return self.queue.qsize() + len(self._retry)
+
+    async def put(self, snipe: Snipe):
+        # waits if the queue is full so a stalled database applies backpressure
+        await self.queue.put(snipe)
+
+        if self.queue.qsize() >= self.batch_size:
+            self._batch_ready.set()
+
+    def _take_batch(self) -> list[Snipe]:
+        batch = self._retry[: self.batch_size]
+        del self._retry[: self.batch_size]
+
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+
+        return batch
+
+    async def flush(self):
+        """
+        Write everything currently queued
+        """
+        async with self._flush_lock:
+            while batch := self._take_batch():
+                start = time.perf_counter()
+                try:
+                    await self.database.add_snipes(batch)
+                except Exception:
+                    self.failed_flushes.inc()
+                    self._retry = batch + self._retry
+                    logger.exception(f"Failed to write {len(batch)} snipes")
+                    return
+
+                self.flush_latency.observe(time.perf_counter() - start)
+                self.written.inc(len(batch))
+
+    async def _writer_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(
+                    self._batch_ready.wait(), timeout=self.flush_interval
+                )
+            except asyncio.TimeoutError:
+                pass
+
+            self._batch_ready.clear()
+            # shielded so cancelling the loop can't drop a batch mid-write
+            await asyncio.shield(self.flush())
+
+    def start(self):
+        if self._writer_task is None:
+            self._writer_task = asyncio.create_task(self._writer_loop())
+
+    async def close(self):
+        """
+        Stop the background writer and drain the queue
+        """
+        if self._writer_task is not None:
+            self._writer_task.cancel()
+            self._writer_task = None
+
+        await self.flush()
@@ -0,0 +1,570 @@
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Sequence
+from datetime import datetime
+from enum import Enum
+from typing import NamedTuple
+
+import pendulum
+
+from discord_chan.export import ExportFormat, ExportOutput
+from discord_chan.heavy_hitters import HeavyHitterSnapshot
+from discord_chan.snipe import Snipe, SnipeMode
+
+COIN_OVERFLOW_MESSAGE = (
+    "New balance would be over int64, are you sure you need that many coins?"
+)
+
+# word usage is counted in hour buckets, hours older than this many days are
+# compacted into day buckets and days older than this many months into months
+WORD_USAGE_HOURLY_DAYS = 2
+WORD_USAGE_DAILY_MONTHS = 3
+
+
+class StorageBackend(Enum):
+    postgres = "postgres"
+    # nothing is persisted, for load testing the bot without a database
+    memory = "memory"
+
+
+class CacheOperation(Enum):
+    insert = "I"
+    update = "U"
+    delete = "D"
+    # notifications may have been missed, everything cached from the table is stale
+    reset = "R"
+
+
+class CacheEvent(NamedTuple):
+    table: str
+    operation: CacheOperation
+    # the row's key column, None for resets
+    key: int | None
+    value: str | None
+
+
+class LeaderboardEntry(NamedTuple):
+    key: int | str
+    count: int
+
+
+class CoinStake(NamedTuple):
+    bitcoin_price: float
+    coins: float
+
+
+class StakeUpdate(NamedTuple):
+    coins: float
+    created: bool
+
+
+class StakeExit(NamedTuple):
+    staked: float
+    coins: int
+
+
+class SnipePartition(NamedTuple):
+    name: str
+    start: pendulum.DateTime
+    end: pendulum.DateTime
+
+
+class WordTrackStats(NamedTuple):
+    unique_words: int
+    total_words: int
+
+
+class WordRank(NamedTuple):
+    server_count: int
+    # ties share a rank
+    server_rank: int
+    # the members who used the word most
+    top_authors: list[LeaderboardEntry]
+
+
+class BackfillCheckpoint(NamedTuple):
+    server_id: int
+    channel_id: int
+    # id of the oldest message counted so far, or where counting started
+    before: int
+    messages: int
+    done: bool
+
+
+class WordTrackUpdate(NamedTuple):
+    server_id: int
+    author_id: int
+    word: str
+    amount: int
+
+
+class UsageResolution(Enum):
+    hour = "hour"
+    day = "day"
+    month = "month"
+
+
+class WordUsage(NamedTuple):
+    bucket: datetime
+    resolution: UsageResolution
+    count: int
+
+
+def word_usage_cutoffs(now: datetime) -> tuple[pendulum.DateTime, pendulum.DateTime]:
+    """
+    :return: The starts of the oldest hour bucket and of the oldest day bucket
+    """
+    now = pendulum.instance(now).in_timezone("UTC")
+    return (
+        now.start_of("day").subtract(days=WORD_USAGE_HOURLY_DAYS),
+        now.start_of("month").subtract(months=WORD_USAGE_DAILY_MONTHS),
+    )
+
+
+def word_usage_bucket(time: datetime, now: datetime) -> pendulum.DateTime:
+    """
+    Get the start of the usage bucket time falls in once buckets up to now are compacted
+    """
+    time = pendulum.instance(time).in_timezone("UTC")
+    hourly_cutoff, daily_cutoff = word_usage_cutoffs(now)
+
+    if time >= hourly_cutoff:
+        return time.start_of("hour")
+
+    if time >= daily_cutoff:
+        return time.start_of("day")
+
+    return time.start_of("month")
+
+
+class Storage(ABC):
+    """
+    Everything the bot reads and writes, see Database and MemoryStorage
+    """
+
+    @abstractmethod
+    async def close(self): ...
+
+    def add_cache_listener(self, table: str, callback: Callable[[CacheEvent], None]):
+        """
+        Call callback when a row of table is written by any process
+
+        storage that can't be shared between processes has nothing to listen to,
+        callers already keep their own caches current after their own writes
+        """
+
+    @abstractmethod
+    async def update_guild_default_minecraft_server(
+        self, *, guild_id: int, server_id: str
+    ): ...
+
+    @abstractmethod
+    async def get_guild_default_minecraft_server(
+        self, *, guild_id: int
+    ) -> str | None: ...
+
+    @abstractmethod
+    async def update_minecraft_username(self, *, user_id: int, username: str): ...
+
+    @abstractmethod
+    async def get_minecraft_usernames(self) -> dict[int, str]: ...
+
+    @abstractmethod
+    async def get_minecraft_username(self, user_id: int) -> str | None: ...
+
+    @abstractmethod
+    async def update_word_track_words(self, updates: Sequence[WordTrackUpdate]):
+        """
+        Add to the counts of many (server, author, word) rows
+
+        updates should not contain the same (server, author, word) twice
+        """
+
+    @abstractmethod
+    async def get_server_word_track_leaderboard(
+        self, *, server_id: int, author_id: int | None = None
+    ) -> dict[str, int]: ...
+
+    @abstractmethod
+    async def get_member_word_track_stats(
+        self, *, server_id: int, author_id: int
+    ) -> WordTrackStats | None: ...
+
+    @abstractmethod
+    async def get_member_word_counts(
+        self, *, server_id: int, author_id: int, words: Sequence[str]
+    ) -> dict[str, int]:
+        """
+        :return: word: count of the words the member used, most used first
+        """
+
+    @abstractmethod
+    async def get_word_rank(
+        self, *, server_id: int, word: str, limit: int
+    ) -> WordRank | None:
+        """
+        :return: The word's rank in the server and its top limit members, None if it wasn't used
+        """
+
+    @abstractmethod
+    async def get_server_word_leaderboard_page(
+        self, *, server_id: int, limit: int, offset: int = 0
+    ) -> tuple[list[LeaderboardEntry], int]:
+        """
+        :return: A page of word: count and the number of words used in the server
+        """
+
+    @abstractmethod
+    async def get_word_track_unique_word_leaderboard(
+        self, *, server_id: int | None = None, limit: int, offset: int = 0
+    ) -> tuple[list[LeaderboardEntry], int]:
+        """
+        :return: A page of user_id: unique words and the number of users
+        """
+
+    @abstractmethod
+    async def get_word_track_total_word_leaderboard(
+        self, *, server_id: int | None = None, limit: int, offset: int = 0
+    ) -> tuple[list[LeaderboardEntry], int]:
+        """
+        :return: A page of user_id: total words and the number of users
+        """
+
+    @abstractmethod
+    async def get_word_usage(
+        self, *, server_id: int, word: str, since: datetime
+    ) -> list[WordUsage]:
+        """
+        Get how often a word was used in each bucket since a time, oldest first
+
+        since is moved back to the start of its bucket, see word_usage_bucket
+        """
+
+    @abstractmethod
+    async def get_word_usage_leaderboard(
+        self, *, server_id: int, since: datetime, limit: int, offset: int = 0
+    ) -> tuple[list[LeaderboardEntry], int]:
+        """
+        :return: A page of word: count since a time and the number of words used
+        """
+
+    @abstractmethod
+    async def get_author_usage_leaderboard(
+        self, *, server_id: int, since: datetime, limit: int, offset: int = 0
+    ) -> tuple[list[LeaderboardEntry], int]:
+        """
+        :return: A page of user_id: words since a time and the number of users
+        """
+
+    @abstractmethod
+    async def compact_word_usage(self):
+        """
+        Compact old hour usage buckets into days and old day buckets into months
+        """
+
+    @abstractmethod
+    async def create_word_track_backfill(
+        self, *, server_id: int, channel_ids: Sequence[int], before: int
+    ):
+        """
+        Start backfilling channels from before, channels with a checkpoint already are left alone
+        """
+
+    @abstractmethod
+    async def get_word_track_backfill(
+        self, *, server_id: int | None = None
+    ) -> list[BackfillCheckpoint]:
+        """
+        :return: The server's checkpoints, or every unfinished one if server_id is None
+        """
+
+    @abstractmethod
+    async def backfill_word_track(
+        self, updates: Sequence[WordTrackUpdate], checkpoint: BackfillCheckpoint
+    ):
+        """
+        Add backfilled counts and move the channel's checkpoint in one transaction
+
+        updates should not contain the same (server, author, word) twice
+        """
+
+    @abstractmethod
+    async def get_heavy_hitter_snapshots(self) -> list[HeavyHitterSnapshot]:
+        """
+        :return: Every snapshot that hasn't expired
+        """
+
+    @abstractmethod
+    async def save_heavy_hitter_snapshots(
+        self, snapshots: Sequence[HeavyHitterSnapshot]
+    ):
+        """
+        Replace the stored snapshots of the same scopes and drop expired ones
+        """
+
+    @abstractmethod
+    async def export_word_track(
+        self, *, server_id: int, export_format: ExportFormat, output: ExportOutput
+    ):
+        """
+        Stream a server's word track rows to output without loading them all
+
+        output can be given chunks that end partway through a row
+        """
+
+    @abstractmethod
+    async def get_guild_enabled_features(self, guild_id: int) -> list[str]: ...
+
+    @abstractmethod
+    async def get_all_enabled_features(self) -> dict[int, list[str]]:
+        """
+        :return: guild_id: enabled feature names, for every guild with any enabled
+        """
+
+    @abstractmethod
+    async def enable_guild_enabled_feature(self, guild_id: int, feature_name: str): ...
+
+    @abstractmethod
+    async def disable_guild_enabled_feature(self, guild_id: int, feature_name: str): ...
+
+    @abstractmethod
+    async def purge_feature(self, feature_name: str): ...
+
+    @abstractmethod
+    async def delete_coin_account(self, user_id: int): ...
+
+    @abstractmethod
+    async def get_coin_balance(self, user_id: int) -> int: ...
+
+    @abstractmethod
+    async def get_coin_balances(
+        self, *, limit: int, offset: int = 0
+    ) -> tuple[list[LeaderboardEntry], int]:
+        """
+        Get a page of balances sorted by amount
+
+        :return: A page of user_id: coins and the number of accounts
+        """
+
+    @abstractmethod
+    async def set_coins(self, user_id: int, amount: int): ...
+
+    @abstractmethod
+    async def add_coins(self, user_id: int, amount: int) -> int: ...
+
+    async def remove_coins(self, user_id: int, amount: int) -> int:
+        return await self.add_coins(user_id, -amount)
+
+    @abstractmethod
+    async def add_coins_if_funded(
+        self, user_id: int, amount: int, *, required: int
+    ) -> int | None:
+        """
+        Add amount (which can be negative) only if the balance is at least required
+
+        returns the new balance or None if the account didn't have enough
+        """
+
+    async def debit_coins(self, user_id: int, amount: int) -> int | None:
+        """
+        Remove coins only if the account has enough of them
+
+        returns the new balance or None if the account didn't have enough
+        """
+        return await self.add_coins_if_funded(user_id, -amount, required=amount)
+
+    @abstractmethod
+    async def transfer_coins(self, from_id: int, to_id: int, amount: int) -> int | None:
+        """
+        Move coins between accounts atomically
+
+        returns the sender's new balance or None if they didn't have enough
+        """
+
+    @abstractmethod
+    async def get_coin_stake(self, user_id: int) -> CoinStake | None: ...
+
+    @abstractmethod
+    async def set_coin_stake(
+        self, user_id: int, amount: float, bitcoin_price: float
+    ): ...
+
+    @abstractmethod
+    async def stake_coins(
+        self, user_id: int, amount: int, bitcoin_price: float
+    ) -> StakeUpdate | None:
+        """
+        Move coins from a balance into a stake atomically
+
+        an existing stake is adjusted to the new price before adding to it
+        returns None if the account didn't have enough coins
+        """
+
+    @abstractmethod
+    async def exit_coin_stake(
+        self, user_id: int, bitcoin_price: float
+    ) -> StakeExit | None:
+        """
+        Remove a stake and pay it out at bitcoin_price atomically
+
+        returns None if there was no stake
+        """
+
+    @abstractmethod
+    async def add_snipes(self, snipes: Sequence[Snipe]): ...
+
+    @abstractmethod
+    async def get_snipe(
+        self,
+        *,
+        index: int,
+        server: int | None = None,
+        author: int | None = None,
+        channel: int | None = None,
+        contains: str | None = None,
+        regex: str | None = None,
+        mode: SnipeMode | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> tuple[Snipe | None, int]:
+        """
+        Get a single snipe by index along with the total matching the filters
+
+        index 0 is the newest snipe and -1 is the oldest
+
+        :return: The snipe, or None if index is out of range, and the total
+        """
+
+    @abstractmethod
+    async def get_snipes(
+        self,
+        *,
+        server: int | None = None,
+        author: int | None = None,
+        channel: int | None = None,
+        contains: str | None = None,
+        regex: str | None = None,
+        mode: SnipeMode | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        limit: int | None = None,
+        negative: bool = False,
+    ) -> tuple[list[Snipe], int]: ...
+
+    @abstractmethod
+    async def get_snipes_before(
+        self,
+        *,
+        before: Snipe | None = None,
+        limit: int,
+        server: int | None = None,
+        author: int | None = None,
+        channel: int | None = None,
+        contains: str | None = None,
+        regex: str | None = None,
+        mode: SnipeMode | None = None,
+        since: datetime | None = None,
+    ) -> list[Snipe]:
+        """
+        Get up to limit snipes older than before, newest first
+
+        snipes are ordered by (time, id) so paging with the last snipe
+        of the previous page never skips or repeats one
+        """
+
+    async def rewrite_snipe_content(self) -> int:
+        """
+        Store existing snipes the way they'd be stored now, compressed or not
+
+        storage that doesn't compress snipes has nothing to do
+
+        :return: Number of snipes rewritten
+        """
+        return 0
+
+    @abstractmethod
+    async def search_snipes(
+        self,
+        *,
+        server: int,
+        query: str,
+        regex: bool = False,
+        channels: Sequence[int] | None = None,
+        since: datetime | None = None,
+        limit: int = 10,
+        offset: int = 0,
+    ) -> tuple[list[Snipe], int]:
+        """
+        Search a server's snipes, best matches first
+
+        query is matched case-insensitively, as a regex if regex is True
+        and as a substring otherwise
+
+        :return: The requested page of matches and the total number of matches
+        """
+
+    @abstractmethod
+    async def get_snipe_leaderboard(
+        self, server_id: int | None = None, *, limit: int, offset: int = 0
+    ) -> tuple[list[LeaderboardEntry], int]:
+        """
+        :return: A page of author_id: snipe count and the number of authors
+        """
+
+    @abstractmethod
+    async def count_snipes(
+        self,
+        *,
+        server: int | None = None,
+        author: int | None = None,
+        channel: int | None = None,
+        mode: SnipeMode | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> int: ...
+
+    @abstractmethod
+    async def export_snipes(
+        self, *, server_id: int, export_format: ExportFormat, output: ExportOutput
+    ):
+        """
+        Stream a server's snipes to output without loading them all
+
+        content over the compression threshold is exported zlib compressed
+        and base64 encoded in content_compressed
+        """
+
+    @abstractmethod
+    async def get_snipe_retentions(self) -> dict[int, int]:
+        """
+        :return: guild_id: number of days snipes are kept
+        """
+
+    @abstractmethod
+    async def set_snipe_retention(self, guild_id: int, days: int | None):
+        """
+        Set how many days of snipes a guild keeps, None keeps them forever
+        """
+
+    @abstractmethod
+    async def create_snipe_partitions(self, *, months_ahead: int = 2) -> list[str]:
+        """
+        Make sure the partitions for this month and the next months_ahead exist
+
+        :return: Names of the partitions
+        """
+
+    @abstractmethod
+    async def get_snipe_partitions(self) -> list[SnipePartition]: ...
+
+    @abstractmethod
+    async def drop_expired_snipe_partitions(
+        self, *, default_retention_days: int | None = None
+    ) -> list[str]:
+        """
+        Drop snipes that are past their guild's retention
+
+        Guilds without a retention use default_retention_days,
+        None means they keep snipes forever
+
+        :return: Names of the dropped partitions
+        """
@@ -0,0 +1,103 @@
+import re
+import unicodedata
+from collections.abc import Iterable
+from enum import Enum
+
+
+class TokenizerMode(Enum):
+    # ascii letters, underscores and apostrophes, anything else separates words
+    ascii = "ascii"
+    # letters of any script after NFKC normalization and casefolding
+    unicode = "unicode"
+
+
+# separates messages tokenized together, see tokenize_many
+BULK_SEPARATOR = "\x00"
+
+
+def _ascii_table(*, keep_separator: bool) -> bytes:
+    table = bytearray(b" " * 256)
+
+    for character in b"abcdefghijklmnopqrstuvwxyz_'":
+        table[character] = character
+
+    for character in b"ABCDEFGHIJKLMNOPQRSTUVWXYZ":
+        table[character] = character + 32
+
+    if keep_separator:
+        table[ord(BULK_SEPARATOR)] = ord(BULK_SEPARATOR)
+
+    return bytes(table)
+
+
+# lowercases ascii letters and turns everything but underscores and apostrophes into spaces,
+# the same words word track has always counted
+ASCII_TABLE = _ascii_table(keep_separator=False)
+# the same but keeps the separator, only for messages joined by tokenize_many
+BULK_ASCII_TABLE = _ascii_table(keep_separator=True)
+
+# chinese and japanese aren't written with spaces so each of their characters is a word
+CJK_CHARACTERS = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+# otherwise words are runs of letters, apostrophes are only kept between letters
+UNICODE_WORD_REGEX = re.compile(
+    rf"[{CJK_CHARACTERS}]|[^\W\d_{CJK_CHARACTERS}]+(?:'[^\W\d_{CJK_CHARACTERS}]+)*"
+)
+
+
+def _ascii_translate(text: str, table: bytes = ASCII_TABLE) -> str:
+    # a few non-ascii characters lowercase to ascii ones (the kelvin sign to k)
+    if not text.isascii():
+        text = text.lower()
+
+    # non-ascii characters become ? which the table turns into a space
+    return text.encode("ascii", "replace").translate(table).decode("ascii")
+
+
+def _unicode_normalize(text: str) -> str:
+    # NFKC leaves curly apostrophes alone so they're straightened by hand
+    return unicodedata.normalize("NFKC", text).replace("\u2019", "'").casefold()
+
+
+def tokenize(text: str, mode: TokenizerMode = TokenizerMode.ascii) -> list[str]:
+    """
+    Split a message into lowercase words, repeats are kept
+    """
+    match mode:
+        case TokenizerMode.ascii:
+            return _ascii_translate(text).split()
+        case TokenizerMode.unicode:
+            return UNICODE_WORD_REGEX.findall(_unicode_normalize(text))
+
+
+def tokenize_many(
+    texts: Iterable[str], mode: TokenizerMode = TokenizerMode.ascii
+) -> list[list[str]]:
+    """
+    Tokenize many messages at once, for backfills
+
+    the messages are joined so translating or normalizing is done in one pass
+    """
+    texts = list(texts)
+
+    if not texts:
+        return []
+
+    joined = BULK_SEPARATOR.join(texts)
+
+    # a message containing the separator would be split in two
+    if joined.count(BULK_SEPARATOR) != len(texts) - 1:
+        return [tokenize(text, mode) for text in texts]
+
+    match mode:
+        case TokenizerMode.ascii:
+            return [
+                part.split()
+                for part in _ascii_translate(joined, BULK_ASCII_TABLE).split(
+                    BULK_SEPARATOR
+                )
+            ]
+        case TokenizerMode.unicode:
+            return [
+                UNICODE_WORD_REGEX.findall(part)
+                for part in _unicode_normalize(joined).split(BULK_SEPARATOR)
+            ]
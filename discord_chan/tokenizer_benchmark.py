@@ -0,0 +1,92 @@
+"""
+Compare tokenizer modes on a recorded corpus
+
+the corpus is a text file with a message per line, or a snipe export
+(see the export command) in ndjson, optionally gzipped
+
+python -m discord_chan.tokenizer_benchmark snipes-1.ndjson.gz
+"""
+
+import gzip
+import json
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import NamedTuple
+
+import click
+
+from discord_chan.tokenizer import TokenizerMode, tokenize, tokenize_many
+
+
+class BenchmarkResult(NamedTuple):
+    name: str
+    # best of the runs
+    seconds: float
+    words: int
+
+
+def load_corpus(path: Path) -> list[str]:
+    opener = gzip.open if path.suffix == ".gz" else open
+
+    with opener(path, "rt", encoding="utf-8") as fp:
+        lines = fp.read().splitlines()
+
+    if ".ndjson" in path.suffixes:
+        # compressed snipes have no content and are left out
+        return [
+            content
+            for line in lines
+            if (content := json.loads(line).get("content")) is not None
+        ]
+
+    return lines
+
+
+def time_best(
+    function: Callable[[], list[list[str]]], repeat: int
+) -> tuple[float, int]:
+    best = float("inf")
+    words = 0
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+        words = sum(map(len, result))
+
+    return best, words
+
+
+def benchmark(corpus: list[str], *, repeat: int = 5) -> list[BenchmarkResult]:
+    results: list[BenchmarkResult] = []
+
+    for mode in TokenizerMode:
+        seconds, words = time_best(
+            lambda: [tokenize(message, mode) for message in corpus], repeat
+        )
+        results.append(BenchmarkResult(f"{mode.value}", seconds, words))
+
+        seconds, words = time_best(lambda: tokenize_many(corpus, mode), repeat)
+        results.append(BenchmarkResult(f"{mode.value} bulk", seconds, words))
+
+    return results
+
+
+@click.command()
+@click.argument("corpus", type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.option("--repeat", type=click.IntRange(min=1), default=5, show_default=True)
+def main(corpus: Path, repeat: int):
+    messages = load_corpus(corpus)
+    size = sum(map(len, messages))
+    click.echo(f"{len(messages)} messages, {size} characters, best of {repeat}")
+
+    for name, seconds, words in benchmark(messages, repeat=repeat):
+        click.echo(
+            f"{name:<14} {seconds * 1000:9.2f}ms "
+            f"{len(messages) / seconds:12.0f} messages/s {words:10} words"
+        )
+
+
+if __name__ == "__main__":
+    main()
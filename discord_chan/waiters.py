@@ -0,0 +1,99 @@
+import asyncio
+from collections.abc import Callable, Coroutine, Hashable
+from typing import Any, NamedTuple
+
+# how to find the key in each event's arguments, only these events can be waited on by key
+EVENT_KEYS: dict[str, Callable[..., Hashable]] = {
+    # (channel id, author id)
+    "message": lambda message: (message.channel.id, message.author.id),
+    "message_edit": lambda before, after: after.id,
+    "raw_reaction_add": lambda payload: payload.message_id,
+    "raw_reaction_remove": lambda payload: payload.message_id,
+}
+
+
+class Waiter(NamedTuple):
+    future: asyncio.Future
+    check: Callable[..., bool] | None
+
+
+class WaiterRegistry:
+    """
+    Futures waiting on events, found by key so a dispatch only checks the waiters it can resolve
+
+    discord.py's wait_for checks every waiter of an event on every dispatch of it
+    """
+
+    def __init__(self):
+        # event: key: waiters
+        self.waiters: dict[str, dict[Hashable, list[Waiter]]] = {}
+
+    def __len__(self) -> int:
+        return sum(
+            len(waiters)
+            for event_waiters in self.waiters.values()
+            for waiters in event_waiters.values()
+        )
+
+    def wait_for(
+        self,
+        event: str,
+        key: Hashable,
+        *,
+        check: Callable[..., bool] | None = None,
+        timeout: float | None = None,
+    ) -> Coroutine[Any, Any, Any]:
+        """
+        Wait for an event with key, see EVENT_KEYS for what the key of each event is
+
+        resolves to the event's arguments the same way Client.wait_for does
+        """
+        if event not in EVENT_KEYS:
+            raise ValueError(f"{event} events can't be waited on by key")
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = Waiter(future, check)
+        self.waiters.setdefault(event, {}).setdefault(key, []).append(waiter)
+
+        # resolved, timed out or cancelled the waiter is removed
+        future.add_done_callback(lambda _: self._remove(event, key, waiter))
+
+        return asyncio.wait_for(future, timeout)
+
+    def _remove(self, event: str, key: Hashable, waiter: Waiter):
+        event_waiters = self.waiters[event]
+        waiters = event_waiters[key]
+        waiters.remove(waiter)
+
+        if not waiters:
+            del event_waiters[key]
+
+    def dispatch(self, event: str, *args: Any):
+        event_waiters = self.waiters.get(event)
+
+        if not event_waiters:
+            return
+
+        waiters = event_waiters.get(EVENT_KEYS[event](*args))
+
+        if not waiters:
+            return
+
+        for future, check in waiters:
+            # finished waiters are removed soon after by their done callback
+            if future.done():
+                continue
+
+            try:
+                result = check is None or check(*args)
+            except Exception as exc:
+                future.set_exception(exc)
+                continue
+
+            if not result:
+                continue
+
+            if len(args) == 1:
+                future.set_result(args[0])
+            else:
+                future.set_result(args)
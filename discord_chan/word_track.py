@@ -0,0 +1,360 @@
+import asyncio
+import math
+import time
+from collections import Counter
+from collections.abc import Callable, Iterable
+from typing import NamedTuple
+
+import discord
+from loguru import logger
+
+from . import metrics
+from .storage import BackfillCheckpoint, Storage, WordTrackUpdate
+
+# number of distinct (server, author, word) rows to hold before flushing early
+DEFAULT_MAX_BUFFERED_ROWS = 5_000
+# number of seconds between timed flushes
+DEFAULT_FLUSH_INTERVAL = 30
+# number of seconds between releases of pending messages whose grace time is up
+DEFAULT_EDIT_WINDOW_TICK = 1
+# number of channels backfilled at once
+DEFAULT_BACKFILL_CONCURRENCY = 4
+# number of messages read between checkpoints, history is fetched 100 at a time
+DEFAULT_BACKFILL_BATCH_SIZE = 1_000
+
+
+class WordTrackKey(NamedTuple):
+    server_id: int
+    author_id: int
+    word: str
+
+
+class WordTrackBuffer:
+    """
+    Write-behind buffer that aggregates word counts in memory
+    and writes them out as one batched upsert
+    """
+
+    def __init__(
+        self,
+        database: Storage,
+        *,
+        max_rows: int = DEFAULT_MAX_BUFFERED_ROWS,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+    ):
+        self.database = database
+        self.max_rows = max_rows
+        self.flush_interval = flush_interval
+
+        self._pending: Counter[WordTrackKey] = Counter()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: asyncio.Task | None = None
+        self._early_flush_task: asyncio.Task | None = None
+
+        self.flush_latency = metrics.histogram("word_track.flush_latency")
+        self.flushed_rows = metrics.counter("word_track.flushed_rows")
+        self.failed_flushes = metrics.counter("word_track.failed_flushes")
+        metrics.gauge("word_track.buffered_rows", lambda: self.buffered_rows)
+
+    @property
+    def buffered_rows(self) -> int:
+        return len(self._pending)
+
+    def add(self, server_id: int, author_id: int, words: Iterable[str]):
+        for word in words:
+            self._pending[WordTrackKey(server_id, author_id, word)] += 1
+
+        if len(self._pending) >= self.max_rows and self._early_flush_task is None:
+            self._early_flush_task = asyncio.create_task(self._early_flush())
+
+    async def _early_flush(self):
+        try:
+            await self.flush()
+        finally:
+            self._early_flush_task = None
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._pending:
+                return
+
+            batch, self._pending = self._pending, Counter()
+            updates = [
+                WordTrackUpdate(key.server_id, key.author_id, key.word, amount)
+                for key, amount in batch.items()
+            ]
+
+            start = time.perf_counter()
+            try:
+                await self.database.update_word_track_words(updates)
+            except Exception:
+                self.failed_flushes.inc()
+                # put the batch back so the next flush can retry it
+                self._pending.update(batch)
+                logger.exception(f"Failed to flush {len(updates)} word track rows")
+                return
+
+            self.flush_latency.observe(time.perf_counter() - start)
+            self.flushed_rows.inc(len(updates))
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            # shielded so cancelling the loop can't drop a batch mid-write
+            await asyncio.shield(self.flush())
+
+    def start(self):
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        """
+        Stop the timed flushes and write out anything still buffered
+        """
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+
+        await self.flush()
+
+
+class PendingMessage(NamedTuple):
+    server_id: int
+    channel_id: int
+    author_id: int
+    content: str
+
+
+class EditWindow:
+    """
+    Holds messages for a grace time so edits made in it replace what gets released
+    and deletes made in it mean nothing is
+
+    release times are kept in a timer wheel with a slot per tick, every
+    message added in a tick is released together grace_time later
+    """
+
+    def __init__(
+        self,
+        grace_time: float,
+        on_release: Callable[[PendingMessage], None],
+        *,
+        tick: float = DEFAULT_EDIT_WINDOW_TICK,
+    ):
+        self.on_release = on_release
+        self.tick = tick
+        # message id: latest version
+        self.pending: dict[int, PendingMessage] = {}
+
+        self._ticks = math.ceil(grace_time / tick)
+        # one extra slot so a message is never added to the slot being released
+        self._slots: list[list[int]] = [[] for _ in range(self._ticks + 1)]
+        self._position = 0
+        self._task: asyncio.Task | None = None
+
+        self.released = metrics.counter("word_track.edit_window.released")
+        self.dropped = metrics.counter("word_track.edit_window.dropped")
+        metrics.gauge("word_track.edit_window.pending", lambda: len(self.pending))
+
+    def add(self, message_id: int, message: PendingMessage):
+        self.pending[message_id] = message
+        self._slots[(self._position + self._ticks) % len(self._slots)].append(
+            message_id
+        )
+
+    def edit(self, message_id: int, content: str):
+        message = self.pending.get(message_id)
+
+        if message is not None:
+            self.pending[message_id] = message._replace(content=content)
+
+    def remove(self, message_id: int):
+        # its slot entry is skipped when released
+        if self.pending.pop(message_id, None) is not None:
+            self.dropped.inc()
+
+    def advance(self):
+        """
+        Release the messages in the current slot and move to the next one
+        """
+        slot = self._slots[self._position]
+        self._slots[self._position] = []
+        self._position = (self._position + 1) % len(self._slots)
+
+        for message_id in slot:
+            message = self.pending.pop(message_id, None)
+
+            if message is None:
+                continue
+
+            self.released.inc()
+
+            try:
+                self.on_release(message)
+            except Exception:
+                logger.exception(f"Releasing message {message_id} failed")
+
+    async def _advance_loop(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            self.advance()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._advance_loop())
+
+    def close(self):
+        """
+        Stop the timer and release everything still pending
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+        for _ in range(len(self._slots)):
+            self.advance()
+
+
+class WordTrackBackfill:
+    """
+    Seeds word counts from channel history, walking each channel from newest to oldest
+
+    progress is checkpointed per channel in the same transaction as the counts
+    so a restart picks up where it left off without counting anything twice
+    """
+
+    def __init__(
+        self,
+        database: Storage,
+        get_channel: Callable[[int], discord.abc.Messageable | None],
+        split_messages: Callable[[list[str]], list[list[str]]],
+        *,
+        is_enabled: Callable[[int], bool],
+        concurrency: int = DEFAULT_BACKFILL_CONCURRENCY,
+        batch_size: int = DEFAULT_BACKFILL_BATCH_SIZE,
+    ):
+        self.database = database
+        self.get_channel = get_channel
+        # message contents to the words to count for each
+        self.split_messages = split_messages
+        # servers that turn word track off stop being backfilled until it's back on
+        self.is_enabled = is_enabled
+        self.batch_size = batch_size
+
+        self._semaphore = asyncio.Semaphore(concurrency)
+        # (server id, channel id): task
+        self._tasks: dict[tuple[int, int], asyncio.Task] = {}
+
+        self.backfilled_messages = metrics.counter("word_track.backfill.messages")
+        self.failed_channels = metrics.counter("word_track.backfill.failed_channels")
+        metrics.gauge("word_track.backfill.channels", lambda: len(self._tasks))
+
+    def running(self, server_id: int) -> int:
+        """
+        Number of the server's channels being backfilled or waiting for a turn
+        """
+        return sum(key[0] == server_id for key in self._tasks)
+
+    async def start(self, server_id: int, channel_ids: list[int], before: int):
+        """
+        Backfill channels from before, channels backfilled already are only resumed
+        """
+        await self.database.create_word_track_backfill(
+            server_id=server_id, channel_ids=channel_ids, before=before
+        )
+        self.resume(await self.database.get_word_track_backfill(server_id=server_id))
+
+    def resume(self, checkpoints: Iterable[BackfillCheckpoint]):
+        for checkpoint in checkpoints:
+            key = (checkpoint.server_id, checkpoint.channel_id)
+
+            if checkpoint.done or key in self._tasks:
+                continue
+
+            task = self._tasks[key] = asyncio.create_task(
+                self._backfill_channel(checkpoint)
+            )
+            task.add_done_callback(lambda _, key=key: self._tasks.pop(key, None))
+
+    async def _backfill_channel(self, checkpoint: BackfillCheckpoint):
+        async with self._semaphore:
+            channel = self.get_channel(checkpoint.channel_id)
+
+            try:
+                # deleted since the backfill started
+                if channel is None:
+                    checkpoint = checkpoint._replace(done=True)
+                    await self.database.backfill_word_track([], checkpoint)
+
+                while not checkpoint.done:
+                    if not self.is_enabled(checkpoint.server_id):
+                        return
+
+                    checkpoint = await self._backfill_batch(channel, checkpoint)
+            except discord.Forbidden:
+                logger.warning(
+                    f"Lost access to channel {checkpoint.channel_id} while backfilling, "
+                    f"stopping after {checkpoint.messages} messages"
+                )
+                await self.database.backfill_word_track(
+                    [], checkpoint._replace(done=True)
+                )
+                return
+            except Exception:
+                # left unfinished to be resumed on the next start
+                self.failed_channels.inc()
+                logger.exception(f"Backfilling channel {checkpoint.channel_id} failed")
+                return
+
+        logger.info(
+            f"Backfilled {checkpoint.messages} messages "
+            f"in channel {checkpoint.channel_id} of server {checkpoint.server_id}"
+        )
+
+    async def _backfill_batch(
+        self, channel: discord.abc.Messageable, checkpoint: BackfillCheckpoint
+    ) -> BackfillCheckpoint:
+        # discord.py waits out rate limits itself, the semaphore keeps the number of
+        # channels sharing them down
+        messages = [
+            message
+            async for message in channel.history(
+                limit=self.batch_size, before=discord.Object(id=checkpoint.before)
+            )
+        ]
+        counted = [message for message in messages if not message.author.bot]
+
+        counts: Counter[WordTrackKey] = Counter()
+        for message, words in zip(
+            counted, self.split_messages([message.content for message in counted])
+        ):
+            for word in words:
+                counts[WordTrackKey(checkpoint.server_id, message.author.id, word)] += 1
+
+        checkpoint = checkpoint._replace(
+            # newest first so the last message is the oldest
+            before=messages[-1].id if messages else checkpoint.before,
+            messages=checkpoint.messages + len(messages),
+            done=len(messages) < self.batch_size,
+        )
+        await self.database.backfill_word_track(
+            [
+                WordTrackUpdate(key.server_id, key.author_id, key.word, amount)
+                for key, amount in counts.items()
+            ],
+            checkpoint,
+        )
+
+        self.backfilled_messages.inc(len(messages))
+        return checkpoint
+
+    async def close(self):
+        """
+        Stop every backfill, each resumes from its last checkpoint on the next start
+        """
+        tasks = list(self._tasks.values())
+
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+from discord_chan import queries
+from discord_chan.database import Database, PoolConfig
+from discord_chan.queries import Query
+
+
+def run_with_database(test, pool_config: PoolConfig):
+    async def run():
+        try:
+            database = await Database.create(pool_config=pool_config)
+        except OSError as exc:
+            pytest.skip(f"no database to test against: {exc}")
+
+        try:
+            await test(database)
+        finally:
+            await database.close()
+
+    asyncio.run(run())
+
+
+def test_statement_counts_follow_cache_evictions():
+    # not registered so they don't end up in the real registry
+    first = Query("test.first", "SELECT $1::INT AS first;")
+    second = Query("test.second", "SELECT $1::INT AS second;")
+    third = Query("test.third", "SELECT $1::INT AS third;")
+    no_args = Query("test.no_args", "SELECT 1;")
+
+    async def test(database: Database):
+        hits, prepares = queries.hits.value, queries.prepares.value
+        unprepared = queries.unprepared.value
+
+        async with database.acquire() as connection:
+            for query in (first, first, second, third, first):
+                assert await connection.fetchval_query(query, 1) == 1
+
+            await connection.execute_query(no_args)
+
+        # third pushes first out of a cache of two, so first is prepared again
+        assert queries.hits.value - hits == 1
+        assert queries.prepares.value - prepares == 4
+        assert queries.unprepared.value - unprepared == 1
+
+    run_with_database(test, PoolConfig(min_size=1, max_size=1, statement_cache_size=2))
@@ -0,0 +1,67 @@
+import asyncio
+
+import pendulum
+import pytest
+
+from discord_chan.database import Database
+
+
+def run_with_database(test):
+    async def run():
+        try:
+            database = await Database.create()
+        except OSError as exc:
+            pytest.skip(f"no database to test against: {exc}")
+
+        try:
+            await test(database)
+        finally:
+            await database.close()
+
+    asyncio.run(run())
+
+
+async def add_snipe(database: Database, server: int, time: pendulum.DateTime):
+    async with database.acquire() as connection:
+        await connection.execute(
+            "INSERT INTO snipes (id, mode, server, author, channel, time, content) "
+            "VALUES (0, 1, $1, 0, 0, $2, 'snipe');",
+            server,
+            time.timestamp(),
+        )
+
+
+def test_drop_expired_snipe_partitions():
+    async def test(database: Database):
+        # far enough back that no other snipes can be in these months
+        expired = pendulum.datetime(2001, 1, 15, tz="UTC")
+        kept = pendulum.datetime(2001, 2, 15, tz="UTC")
+        server = 0xC0FFEE
+
+        async with database.acquire() as connection:
+            for month in (expired, kept):
+                await connection.execute("SELECT create_snipe_partition($1);", month)
+
+            await connection.execute(
+                "DELETE FROM snipe_retention WHERE guild_id = $1;", server
+            )
+
+        await add_snipe(database, server, expired)
+        # a guild keeping snipes forever blocks its partition from being dropped
+        await add_snipe(database, server + 1, kept)
+
+        dropped = await database.drop_expired_snipe_partitions(
+            default_retention_days=None
+        )
+        assert "snipes_p200101" not in dropped
+
+        await database.set_snipe_retention(server, 30)
+        await database.set_snipe_retention(server + 1, None)
+        dropped = await database.drop_expired_snipe_partitions(
+            default_retention_days=None
+        )
+
+        assert "snipes_p200101" in dropped
+        assert "snipes_p200102" not in dropped
+
+    run_with_database(test)
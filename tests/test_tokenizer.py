@@ -0,0 +1,68 @@
+import random
+import re
+
+from discord_chan.tokenizer import TokenizerMode, tokenize, tokenize_many
+
+
+def split_words(entry: str) -> list[str]:
+    # word track's splitting before the tokenizer module, ascii mode has to match it
+    # or new counts drift from the ones already stored
+    entry = re.sub(r"[^a-zA-Z _']", " ", entry.lower())
+    return [e for e in entry.split(" ") if len(e) > 0]
+
+
+MESSAGES = [
+    "Hello World",
+    "snake_case_word and __dunder__",
+    "it's can't won't 'quoted'",
+    "a\x00b",
+    "tabs\tand\nnewlines\r\nand  double  spaces",
+    "numbers 123 and l33t",
+    'punctuation!?.,;:-()[]{}<>/\\|@#$%^&*+=~`"',
+    "ÜNÏCÖDÉ café naïve straße",
+    "K kelvin and İstanbul",
+    "emoji 🎉 party 🎉",
+    "日本語のテキスト",
+    "",
+    "   ",
+]
+
+
+def random_message(rng: random.Random) -> str:
+    alphabet = "aZ_' \x00\t\n1!éKİß🎉"
+    return "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 30)))
+
+
+def test_ascii_matches_old_splitting():
+    for message in MESSAGES:
+        assert tokenize(message, TokenizerMode.ascii) == split_words(message), message
+
+
+def test_ascii_matches_old_splitting_random():
+    rng = random.Random(0)
+
+    for _ in range(2_000):
+        message = random_message(rng)
+        assert tokenize(message, TokenizerMode.ascii) == split_words(message), message
+
+
+def test_tokenize_many_matches_tokenize():
+    rng = random.Random(1)
+    # with and without a separator in a message, which takes the fallback
+    batches = [
+        [message for message in MESSAGES if "\x00" not in message],
+        MESSAGES,
+        [random_message(rng) for _ in range(200)],
+    ]
+
+    for mode in TokenizerMode:
+        for batch in batches:
+            assert tokenize_many(batch, mode) == [
+                tokenize(message, mode) for message in batch
+            ]
+
+
+def test_no_nul_in_tokens():
+    for mode in TokenizerMode:
+        for words in tokenize_many(MESSAGES, mode):
+            assert not any("\x00" in word for word in words)